@@ -0,0 +1,6 @@
+"""Benchmarks for the galatea commands.
+
+Run them from the root of the repository with ``python -m benchmarks``.
+The inputs are generated with :py:mod:`benchmarks.synthetic`, so no data
+or network access is needed.
+"""
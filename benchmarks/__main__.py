@@ -0,0 +1,6 @@
+"""Run the benchmarks with ``python -m benchmarks``."""
+
+from benchmarks import run
+
+if __name__ == "__main__":
+    run.main()
@@ -0,0 +1,334 @@
+"""Measure the throughput and peak memory of galatea commands.
+
+Each command is run on synthetic tables of increasing size. Its speed is
+the best of a number of timed runs measured with time.perf_counter, and its
+peak memory is measured with tracemalloc in a separate run, so the cost of
+tracing memory does not slow down the timed runs. The results are written
+as JSON.
+"""
+
+import argparse
+import contextlib
+import dataclasses
+import datetime
+import gc
+import importlib.metadata
+import json
+import logging
+import pathlib
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Sequence
+
+from galatea import clean_tsv, marc_files, merge_data
+from galatea import resolve_authorized_terms
+
+from benchmarks import synthetic
+
+__all__ = [
+    "BENCHMARKS",
+    "BenchmarkInputs",
+    "BenchmarkResult",
+    "main",
+    "measure",
+    "run_benchmarks",
+]
+
+DEFAULT_ROW_COUNTS = [1_000, 100_000, 1_000_000]
+
+
+@dataclasses.dataclass
+class BenchmarkInputs:
+    """Files a benchmark runs on, all in the same working folder."""
+
+    table: synthetic.SyntheticTable
+    folder: pathlib.Path
+
+    @property
+    def tsv_file(self) -> pathlib.Path:
+        """Synthetic table."""
+        return self.folder / "table.tsv"
+
+    @property
+    def records_file(self) -> pathlib.Path:
+        """MARCXML records for the rows of the table."""
+        return self.folder / "records.xml"
+
+    @property
+    def mapping_file(self) -> pathlib.Path:
+        """Mapping file for merge-data."""
+        return self.folder / "mapping.toml"
+
+    @property
+    def transformation_file(self) -> pathlib.Path:
+        """Transformation file for resolve-authorized-terms."""
+        return self.folder / "transformations.tsv"
+
+    @property
+    def output_file(self) -> pathlib.Path:
+        """File the commands write to."""
+        return self.folder / "output.tsv"
+
+    def create(self) -> None:
+        """Write the input files."""
+        self.folder.mkdir(parents=True, exist_ok=True)
+        synthetic.write_tsv(self.tsv_file, self.table)
+        synthetic.write_marcxml(
+            self.records_file, self.table.mmsids(), seed=self.table.seed
+        )
+        synthetic.write_mapping_file(self.mapping_file)
+        synthetic.write_transformation_file(
+            self.transformation_file, self.table
+        )
+        # Index the records ahead, so merges only measure the lookups.
+        with marc_files.MarcXmlRecordFile(self.records_file):
+            pass
+
+
+def _clean_tsv(inputs: BenchmarkInputs) -> None:
+    clean_tsv.clean_tsv(inputs.tsv_file, inputs.output_file)
+
+
+def _resolve_authorized_terms(inputs: BenchmarkInputs) -> None:
+    resolve_authorized_terms.resolve_authorized_terms(
+        inputs.tsv_file, inputs.transformation_file, inputs.output_file
+    )
+
+
+def _merge_data(inputs: BenchmarkInputs) -> None:
+    merge_data.merge_from_record_file(
+        inputs.tsv_file,
+        inputs.output_file,
+        inputs.mapping_file,
+        marc_files.MarcXmlRecordFile(inputs.records_file),
+    )
+
+
+BENCHMARKS: Dict[str, Callable[[BenchmarkInputs], None]] = {
+    "clean_tsv": _clean_tsv,
+    "resolve_authorized_terms": _resolve_authorized_terms,
+    "merge_data": _merge_data,
+}
+
+
+@dataclasses.dataclass
+class BenchmarkResult:
+    """Measurements of a command on a table."""
+
+    command: str
+    rows: int
+    seconds: float
+    rows_per_second: float
+    peak_memory_bytes: Optional[int]
+
+
+def measure(
+    func: Callable[[], None], repeat: int = 1, trace_memory: bool = True
+) -> tuple[float, Optional[int]]:
+    """Measure the time and peak memory of a function.
+
+    Args:
+        func: function to measure
+        repeat: number of timed runs. The fastest one is kept, as slower
+            runs are slowed down by other processes, not by the function.
+        trace_memory: also run the function once under tracemalloc
+
+    Returns: seconds taken by the fastest run, and the peak memory in bytes
+        allocated by the function or None if it was not traced
+
+    """
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    peak = None
+    if trace_memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return min(timings), peak
+
+
+def run_benchmarks(
+    row_counts: Sequence[int],
+    commands: Sequence[str],
+    folder: pathlib.Path,
+    repeat: int = 1,
+    trace_memory: bool = True,
+    table: Optional[synthetic.SyntheticTable] = None,
+) -> List[BenchmarkResult]:
+    """Run benchmarks on synthetic tables of each size.
+
+    Args:
+        row_counts: number of rows of each table
+        commands: names of the benchmarks to run, from BENCHMARKS
+        folder: working folder for the generated files
+        repeat: number of timed runs of each command
+        trace_memory: also measure the peak memory of each command
+        table: settings of the synthetic tables other than their number of
+            rows. Defaults to the default settings.
+
+    Returns: result of each command on each table
+
+    """
+    table = table or synthetic.SyntheticTable(0)
+    results = []
+    for rows in row_counts:
+        inputs = BenchmarkInputs(
+            dataclasses.replace(table, rows=rows), folder / f"{rows}_rows"
+        )
+        logging.info("Generating %d row(s) in %s", rows, inputs.folder)
+        inputs.create()
+        for command in commands:
+            benchmark = BENCHMARKS[command]
+            seconds, peak = measure(
+                lambda: benchmark(inputs),
+                repeat=repeat,
+                trace_memory=trace_memory,
+            )
+            result = BenchmarkResult(
+                command=command,
+                rows=rows,
+                seconds=seconds,
+                rows_per_second=rows / seconds if seconds else 0.0,
+                peak_memory_bytes=peak,
+            )
+            logging.info(
+                "%s on %d row(s): %.0f rows/s, peak memory %s",
+                command,
+                rows,
+                result.rows_per_second,
+                "not measured" if peak is None else f"{peak / 2**20:.1f} MiB",
+            )
+            results.append(result)
+    return results
+
+
+def get_arg_parser() -> argparse.ArgumentParser:
+    """Get the parser of the command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description=__doc__
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=DEFAULT_ROW_COUNTS,
+        help="number of rows of each table. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--commands",
+        nargs="+",
+        choices=list(BENCHMARKS),
+        default=list(BENCHMARKS),
+        help="commands to benchmark. Default: all of them",
+    )
+    parser.add_argument(
+        "--output",
+        type=pathlib.Path,
+        help="JSON file to write the results to. Default: standard output",
+    )
+    parser.add_argument(
+        "--workdir",
+        type=pathlib.Path,
+        help="folder for the generated files. Default: a temporary folder",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="number of timed runs of each command. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--no-memory",
+        dest="trace_memory",
+        action="store_false",
+        help="do not measure peak memory",
+    )
+    parser.add_argument(
+        "--columns",
+        type=int,
+        default=len(synthetic.MARC_COLUMNS),
+        help="number of MARC columns of the tables. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--repetition",
+        type=float,
+        default=0.5,
+        help="chance that a cell reuses a value already in its column. "
+        "Default: %(default)s",
+    )
+    parser.add_argument(
+        "--cardinality",
+        type=int,
+        default=3,
+        help='largest number of "||" separated values in a cell. '
+        "Default: %(default)s",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="random seed. Default: 0"
+    )
+    return parser
+
+
+def _get_galatea_version() -> str:
+    try:
+        return importlib.metadata.version("galatea")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Run the benchmarks from the command line."""
+    args = get_arg_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # The commands log every row, which would drown out the results.
+    for module in (clean_tsv, resolve_authorized_terms, merge_data):
+        module.logger.setLevel(logging.WARNING)
+    table = synthetic.SyntheticTable(
+        0,
+        columns=args.columns,
+        repetition=args.repetition,
+        cardinality=args.cardinality,
+        seed=args.seed,
+    )
+    # Some commands print their progress, which would end up in the JSON.
+    with (
+        tempfile.TemporaryDirectory(prefix="galatea-benchmarks-") as temp,
+        contextlib.redirect_stdout(sys.stderr),
+    ):
+        results = run_benchmarks(
+            args.rows,
+            args.commands,
+            args.workdir or pathlib.Path(temp),
+            repeat=args.repeat,
+            trace_memory=args.trace_memory,
+            table=table,
+        )
+    report = {
+        "galatea_version": _get_galatea_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "table": {
+            name: value
+            for name, value in dataclasses.asdict(table).items()
+            if name != "rows"
+        },
+        "results": [dataclasses.asdict(result) for result in results],
+    }
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=4)
+        sys.stdout.write("\n")
+    else:
+        args.output.write_text(json.dumps(report, indent=4), encoding="utf-8")
+        logging.info("Wrote results to %s", args.output)
@@ -0,0 +1,291 @@
+"""Generate synthetic MARC tsv files and matching MARCXML records.
+
+The tables look like the exports galatea works on. They have a
+Bibliographic Identifier column followed by MARC field columns, with cells
+holding one or more ``||`` separated values carrying the punctuation that
+clean-tsv removes. Values are drawn from a seeded random generator, so the
+same settings always give the same files.
+"""
+
+import csv
+import dataclasses
+import pathlib
+import random
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+from xml.sax.saxutils import escape
+
+__all__ = [
+    "IDENTIFIER_COLUMN",
+    "MARC_COLUMNS",
+    "SyntheticTable",
+    "write_mapping_file",
+    "write_marcxml",
+    "write_transformation_file",
+    "write_tsv",
+]
+
+IDENTIFIER_COLUMN = "Bibliographic Identifier"
+MARC_COLUMNS = [
+    "245$a",
+    "260$a",
+    "260$b",
+    "260$c",
+    "264$a",
+    "300$ab",
+    "500",
+    "600",
+    "650",
+    "700",
+    "710",
+]
+MARC_SLIM_XML_NAMESPACE = "http://www.loc.gov/MARC21/slim"
+
+_PLACES = [
+    "Chicago",
+    "Urbana",
+    "New York",
+    "London",
+    "Paris",
+    "Berlin",
+    "Tokyo",
+    "Boston",
+]
+_WORDS = [
+    "history",
+    "bacon",
+    "eggs",
+    "spam",
+    "cooking",
+    "railroads",
+    "maps",
+    "music",
+    "letters",
+    "farming",
+    "poetry",
+    "science",
+]
+_NAMES = ["Twain, Mark", "Austen, Jane", "Lincoln, Abraham", "Cather, Willa"]
+_PUBLISHERS = ["Spam Press", "Illini Books", "Prairie House", "Bacon & Sons"]
+
+
+def _mmsid(number: int) -> str:
+    return f"99{number:011d}12205899"
+
+
+@dataclasses.dataclass
+class SyntheticTable:
+    """Settings of a synthetic MARC tsv table.
+
+    Attributes:
+        rows: number of rows, not counting the header
+        columns: number of MARC field columns after the identifier. Columns
+            past the realistic ones are named 900, 901 and so on.
+        repetition: chance, between 0 and 1, that a cell reuses a value
+            already used in its column instead of a new one
+        cardinality: largest number of ``||`` separated values in a cell
+        seed: seed of the random generator
+    """
+
+    rows: int
+    columns: int = len(MARC_COLUMNS)
+    repetition: float = 0.5
+    cardinality: int = 3
+    seed: int = 0
+
+    def __post_init__(self) -> None:
+        """Check the settings."""
+        if self.rows < 0 or self.columns < 1 or self.cardinality < 1:
+            raise ValueError("rows, columns and cardinality are too small")
+        if not 0 <= self.repetition <= 1:
+            raise ValueError("repetition must be between 0 and 1")
+
+    @property
+    def field_names(self) -> List[str]:
+        """Names of the columns of the table."""
+        extra = [
+            str(900 + index)
+            for index in range(self.columns - len(MARC_COLUMNS))
+        ]
+        return [IDENTIFIER_COLUMN, *(MARC_COLUMNS + extra)[: self.columns]]
+
+    def mmsids(self) -> Iterator[str]:
+        """Iterate over the identifier of each row."""
+        return (_mmsid(number) for number in range(self.rows))
+
+    def iter_rows(self) -> Iterator[Dict[str, str]]:
+        """Iterate over the rows of the table.
+
+        Yields: each row, by column name
+
+        """
+        generator = random.Random(self.seed)
+        columns = self.field_names[1:]
+        used: Dict[str, List[str]] = {column: [] for column in columns}
+        for mmsid in self.mmsids():
+            row = {IDENTIFIER_COLUMN: mmsid}
+            for column in columns:
+                values = []
+                for _ in range(generator.randint(1, self.cardinality)):
+                    pool = used[column]
+                    if pool and generator.random() < self.repetition:
+                        values.append(generator.choice(pool))
+                        continue
+                    value = _new_value(column, generator, len(pool))
+                    if len(pool) < 10_000:
+                        pool.append(value)
+                    values.append(value)
+                row[column] = "||".join(values)
+            yield row
+
+
+def _new_value(column: str, generator: random.Random, serial: int) -> str:
+    word = generator.choice(_WORDS)
+    if column in ("260$a", "264$a"):
+        return f"[{generator.choice(_PLACES)} {serial}?] :"
+    if column == "260$b":
+        return f"{generator.choice(_PUBLISHERS)} {serial},"
+    if column == "260$c":
+        return f"[{1800 + serial % 220}?]."
+    if column == "300$ab":
+        return f"{serial % 900 + 10} pages : illustrations ;"
+    if column == "500":
+        return f'Includes ""{word}"" index {serial}.'
+    if column in ("600", "700"):
+        return f"{generator.choice(_NAMES)} {serial}, author."
+    if column == "710":
+        return f"Spam Society.Bacon Division--{word.title()} {serial}."
+    return f"{word.title()} {serial} -- {generator.choice(_WORDS)}."
+
+
+def write_tsv(path: pathlib.Path, table: SyntheticTable) -> pathlib.Path:
+    """Write a synthetic table to a tsv file.
+
+    Args:
+        path: file to write
+        table: settings of the table
+
+    Returns: path of the file written
+
+    """
+    with path.open("w", newline="", encoding="utf-8") as fp:
+        write_tsv_fp(fp, table)
+    return path
+
+
+def write_tsv_fp(fp: TextIO, table: SyntheticTable) -> None:
+    """Write a synthetic table to a file opened with newline=""."""
+    writer = csv.DictWriter(
+        fp, fieldnames=table.field_names, dialect="excel-tab"
+    )
+    writer.writeheader()
+    writer.writerows(table.iter_rows())
+
+
+def write_marcxml(
+    path: pathlib.Path,
+    mmsids: Iterable[str],
+    seed: int = 0,
+) -> pathlib.Path:
+    """Write a MARCXML collection with a record for each MMS ID.
+
+    Each record has a 001 control field with its MMS ID and 245, 260 and
+    650 data fields.
+
+    Args:
+        path: file to write
+        mmsids: MMS IDs of the records
+        seed: seed of the random generator
+
+    Returns: path of the file written
+
+    """
+    generator = random.Random(seed)
+    with path.open("w", encoding="utf-8") as fp:
+        fp.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        fp.write(f'<collection xmlns="{MARC_SLIM_XML_NAMESPACE}">\n')
+        for serial, mmsid in enumerate(mmsids):
+            fp.write(_marc_record(mmsid, serial, generator))
+        fp.write("</collection>\n")
+    return path
+
+
+def _marc_record(mmsid: str, serial: int, generator: random.Random) -> str:
+    title = f"{generator.choice(_WORDS).title()} and {serial}"
+    subjects = "".join(
+        f'<datafield ind1=" " ind2="0" tag="650">'
+        f'<subfield code="a">{generator.choice(_WORDS).title()}</subfield>'
+        f"</datafield>"
+        for _ in range(generator.randint(1, 3))
+    )
+    return (
+        f"<record>"
+        f"<leader>00000nam a2200000 a 4500</leader>"
+        f'<controlfield tag="001">{mmsid}</controlfield>'
+        f'<datafield ind1="1" ind2="0" tag="245">'
+        f'<subfield code="a">{escape(title)} /</subfield>'
+        f"</datafield>"
+        f'<datafield ind1=" " ind2=" " tag="260">'
+        f'<subfield code="a">{generator.choice(_PLACES)} :</subfield>'
+        f'<subfield code="b">{escape(generator.choice(_PUBLISHERS))},'
+        f"</subfield>"
+        f"</datafield>"
+        f"{subjects}"
+        f"</record>\n"
+    )
+
+
+def write_mapping_file(path: pathlib.Path) -> pathlib.Path:
+    """Write a mapping file filling the 245$a and 650 columns from records.
+
+    Args:
+        path: file to write
+
+    Returns: path of the file written
+
+    """
+    path.write_text(
+        "[mappings]\n"
+        f'identifier_key = "{IDENTIFIER_COLUMN}"\n'
+        "\n"
+        "[[mapping]]\n"
+        'key = "245$a"\n'
+        'matching_marc_fields = ["245$a"]\n'
+        'delimiter = "||"\n'
+        'existing_data = "replace"\n'
+        "\n"
+        "[[mapping]]\n"
+        'key = "650"\n'
+        'matching_marc_fields = ["650$a"]\n'
+        'delimiter = "||"\n'
+        'existing_data = "append"\n',
+        encoding="utf-8",
+    )
+    return path
+
+
+def write_transformation_file(
+    path: pathlib.Path, table: SyntheticTable, terms: Optional[int] = 100
+) -> pathlib.Path:
+    """Write a transformation file for the place names of a table.
+
+    Args:
+        path: file to write
+        table: table the place names come from
+        terms: number of place names to resolve. None resolves every
+            place name of the table.
+
+    Returns: path of the file written
+
+    """
+    seen: Dict[str, None] = {}
+    for row in table.iter_rows():
+        for value in row.get("260$a", "").split("||"):
+            seen.setdefault(value.strip())
+        if terms is not None and len(seen) >= terms:
+            break
+    with path.open("w", newline="", encoding="utf-8") as fp:
+        writer = csv.writer(fp, dialect="excel-tab")
+        writer.writerow(["unauthorized term", "resolving authorized term"])
+        for term in list(seen)[:terms]:
+            writer.writerow([term, term.strip("[]?: ") + " (Ill.)"])
+    return path
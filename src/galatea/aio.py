@@ -0,0 +1,173 @@
+"""Building blocks for the asyncio API.
+
+The asyncio entry points, such as merge_data.amerge_from_getmarc and
+validate_authorized_terms.avalidate, fetch their data with async strategies.
+Any coroutine function taking a key can be used, such as one built on an
+async HTTP client. Blocking strategies can be adapted with to_async_strategy.
+
+Added in version 0.7.0.
+
+"""
+
+import asyncio
+import collections
+import time
+from typing import (
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+__all__ = [
+    "AsyncRateLimiter",
+    "AsyncStrategy",
+    "aiter_with_prefetched",
+    "to_async_strategy",
+]
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+AsyncStrategy = Callable[[str], Awaitable[R]]
+"""Coroutine function getting the data for a key, such as an MMS ID."""
+
+
+def to_async_strategy(strategy: Callable[[str], R]) -> AsyncStrategy[R]:
+    """Adapt a blocking strategy to be awaited from an event loop.
+
+    Each call runs in the default executor of the running loop, so a
+    blocking client shared by every call, such as getmarc.GetMarcClient,
+    also shares its connection pool between them.
+
+    Args:
+        strategy: blocking function getting the data for a key
+
+    Returns: coroutine function getting the data for a key
+
+    """
+
+    async def run_in_thread(key: str) -> R:
+        return await asyncio.to_thread(strategy, key)
+
+    return run_in_thread
+
+
+class AsyncRateLimiter:
+    """Space out the start of requests by a minimum interval.
+
+    Shared by every task using it, so tasks running at the same time take
+    turns instead of all sending their requests at once.
+    """
+
+    def __init__(
+        self,
+        min_interval: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create a new rate limiter.
+
+        Args:
+            min_interval: seconds between the start of two requests
+            clock: clock used to measure the time between requests
+        """
+        self.min_interval = min_interval
+        self._clock = clock
+        self._lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    async def wait(self) -> None:
+        """Wait until the next request can start."""
+        async with self._lock:
+            delay = self._next_start - self._clock()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_start = self._clock() + self.min_interval
+
+
+async def aiter_with_prefetched(
+    items: Iterable[T],
+    key: Callable[[T], Optional[str]],
+    fetch: AsyncStrategy[R],
+    max_concurrency: int,
+    key_counts: Optional[Mapping[str, int]] = None,
+) -> AsyncGenerator[Tuple[T, "Optional[asyncio.Future[R]]"], None]:
+    """Iterate over items along with their data, fetching it ahead.
+
+    The asyncio counterpart of merge_data.iter_with_prefetched_records.
+    The data of the items ahead is fetched as tasks on the running loop,
+    with no more than max_concurrency keys fetched at the same time. Items
+    are always yielded in the order they came in, once their data has been
+    fetched.
+
+    Each key is only fetched once. If the number of items using each key is
+    known ahead of time, the data is let go of once its last item is
+    yielded. Otherwise, it is kept until the iteration is finished.
+
+    Args:
+        items: items to iterate over, such as tsv rows
+        key: gets the key of the data needed for an item or None if the item
+            does not need any
+        fetch: coroutine function getting the data for a key
+        max_concurrency: maximum number of keys fetched at the same time
+        key_counts: optional number of items using each key
+
+    Yields: each item and a finished future holding its data or the error
+        fetching it, or None if the item does not need any
+
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+    semaphore = asyncio.Semaphore(max_concurrency)
+    memo: Dict[str, asyncio.Future[R]] = {}
+    remaining = dict(key_counts) if key_counts is not None else None
+    tasks: Set[asyncio.Future[R]] = set()
+
+    async def _fetch(item_key: str) -> R:
+        async with semaphore:
+            return await fetch(item_key)
+
+    def _release(item_key: Optional[str]) -> None:
+        if item_key is None or remaining is None or item_key not in remaining:
+            return
+        remaining[item_key] -= 1
+        if remaining[item_key] <= 0:
+            del remaining[item_key]
+            memo.pop(item_key, None)
+
+    window: collections.deque[
+        Tuple[T, Optional[str], Optional[asyncio.Future[R]]]
+    ] = collections.deque()
+
+    async def _next_ready() -> Tuple[T, Optional[asyncio.Future[R]]]:
+        ready_item, ready_key, ready_future = window.popleft()
+        if ready_future is not None:
+            await asyncio.wait((ready_future,))
+        _release(ready_key)
+        return ready_item, ready_future
+
+    try:
+        for item in items:
+            item_key = key(item)
+            future = None
+            if item_key is not None:
+                if item_key not in memo:
+                    task = asyncio.ensure_future(_fetch(item_key))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    memo[item_key] = task
+                future = memo[item_key]
+            window.append((item, item_key, future))
+            while len(window) >= max_concurrency * 2:
+                yield await _next_ready()
+        while window:
+            yield await _next_ready()
+    finally:
+        for pending in list(tasks):
+            pending.cancel()
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import csv
 import functools
 import logging
 import pathlib
@@ -11,11 +12,14 @@ from typing import (
     Callable,
     Union,
     Optional,
+    Iterator,
+    TextIO,
     Tuple,
+    Type,
     TypeVar,
 )
 import galatea
-from galatea import modifiers
+from galatea import delta, modifiers
 from galatea.marc import MarcEntryDataTypes, Marc_Entry
 from galatea.tsv import TableRow, write_tsv_file, get_tsv_dialect, iter_tsv_fp
 
@@ -186,10 +190,36 @@ def transform_row_and_merge(
     return merged
 
 
+def _iter_cleaned_rows(
+    source: pathlib.Path,
+    tsv_file: TextIO,
+    dialect: Union[Type[csv.Dialect], csv.Dialect],
+    row_diff_report_generator: Optional[RowDiffReportGeneratorCallback],
+) -> Iterator[Tuple[TableRow[Marc_Entry], Marc_Entry]]:
+    field_names = galatea.tsv.get_field_names(source)
+    row: TableRow[Marc_Entry]
+    for row in iter_tsv_fp(tsv_file, dialect):
+        transformed_row = transform_row_and_merge(
+            row.entry,
+            row_transformation_strategy=functools.partial(
+                row_modifier, transformer=default_row_modifier()
+            ),
+        )
+        if row_diff_report_generator is not None:
+            if diff_report := row_diff_report_generator(
+                row,
+                TableRow(line_number=row.line_number, entry=transformed_row),
+                field_names,
+            ):
+                logger.log(galatea.VERBOSE_LEVEL_NUM, msg=diff_report)
+        yield row, transformed_row
+
+
 def clean_tsv(
     source: pathlib.Path,
     dest: pathlib.Path,
     row_diff_report_generator: Optional[RowDiffReportGeneratorCallback] = None,
+    delta_output: bool = False,
 ) -> None:
     """Clean tsv file high level function.
 
@@ -200,31 +230,38 @@ def clean_tsv(
             When not provided, no report is generated.
 
             See :py:data:`RowDiffReportGeneratorCallback` for details.
+        delta_output: write only the cells changed by cleaning to dest, as a
+            delta that can be applied with galatea.delta.apply_delta,
+            instead of the whole table. Rows are identified by their first
+            column.
 
     """
     logger.debug("Reading %s", source)
     with open(source, newline="", encoding="utf-8") as tsv_file:
-        modified_data = []
         dialect = get_tsv_dialect(tsv_file)
-        field_names = galatea.tsv.get_field_names(source)
-        row: TableRow[Marc_Entry]
-        for row in iter_tsv_fp(tsv_file, dialect):
-            transformed_row = transform_row_and_merge(
-                row.entry,
-                row_transformation_strategy=functools.partial(
-                    row_modifier, transformer=default_row_modifier()
-                ),
-            )
-            if row_diff_report_generator is not None:
-                if diff_report := row_diff_report_generator(
-                    row,
-                    TableRow(
-                        line_number=row.line_number, entry=transformed_row
+        cleaned_rows = _iter_cleaned_rows(
+            source, tsv_file, dialect, row_diff_report_generator
+        )
+        if delta_output:
+            with open(dest, "w", newline="", encoding="utf-8") as delta_fp:
+                changed = delta.write_changes_fp(
+                    delta_fp,
+                    (
+                        change
+                        for row, transformed_row in cleaned_rows
+                        for change in delta.iter_cell_changes(
+                            row.line_number, row.entry, transformed_row
+                        )
                     ),
-                    field_names,
-                ):
-                    logger.log(galatea.VERBOSE_LEVEL_NUM, msg=diff_report)
-            modified_data.append(transformed_row)
+                )
+            logger.info(
+                f'Wrote {changed} changed cell(s) to "{dest.absolute()}"'
+            )
+            print("Done.")
+            return
+        modified_data = [
+            transformed_row for _, transformed_row in cleaned_rows
+        ]
 
     write_tsv_file(dest, modified_data, dialect)
     logger.info(f'Modified tsv wrote to "{dest.absolute()}"')
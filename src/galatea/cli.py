@@ -4,10 +4,11 @@
 import argparse
 import contextlib
 import dataclasses
+import datetime
 import pathlib
 import sys
 import logging
-from typing import Optional, List, Callable
+from typing import Optional, List, Callable, Type
 import typing
 
 import galatea
@@ -15,10 +16,21 @@ import galatea.config
 from galatea import command_descriptions
 
 from galatea import clean_tsv
+from galatea import delta
 from galatea import validate_authorized_terms
 from galatea import resolve_authorized_terms
+from galatea import getmarc
+from galatea import lookup_table
+from galatea import marc_files
 from galatea import merge_data
-from galatea.utils import CommandFinishedWithException, get_version
+from galatea import merge_journal
+from galatea import record_cache
+from galatea import remote
+from galatea.utils import (
+    CommandFinishedWithException,
+    GalateaException,
+    get_version,
+)
 
 import argcomplete
 
@@ -29,6 +41,10 @@ __all__ = ["main"]
 logger = logging.getLogger(__name__)
 
 
+class InvalidArgumentsError(GalateaException):
+    """Command line arguments cannot be used together."""
+
+
 class ValidateFilePath(argparse.Action):
     """Custom action to validate file paths."""
 
@@ -42,6 +58,75 @@ class ValidateFilePath(argparse.Action):
         setattr(namespace, self.dest, values.resolve())
 
 
+def positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(
+            f"expected a whole number, got {value!r}"
+        ) from error
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def non_negative_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(
+            f"expected a whole number, got {value!r}"
+        ) from error
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"cannot be negative, got {number}")
+    return number
+
+
+def positive_float(value: str) -> float:
+    try:
+        number = float(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(
+            f"expected a number, got {value!r}"
+        ) from error
+    if number <= 0:
+        raise argparse.ArgumentTypeError(
+            f"must be greater than 0, got {number}"
+        )
+    return number
+
+
+def sample_size_type(value: str) -> validate_authorized_terms.SampleSize:
+    try:
+        return validate_authorized_terms.parse_sample_size(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error)) from error
+
+
+def add_merge_output_arguments(parser: argparse.ArgumentParser) -> None:
+    output_group = parser.add_mutually_exclusive_group()
+    output_group.add_argument(
+        "--output-tsv-file",
+        type=pathlib.Path,
+        help="write changes to another file instead of inplace",
+    )
+    output_group.add_argument(
+        "--delta",
+        type=pathlib.Path,
+        metavar="PATH",
+        help="write only the changed cells to a delta file instead of "
+        "changing the tsv file. Apply it later with apply-delta",
+    )
+
+
+def get_merge_output_file(args: argparse.Namespace) -> pathlib.Path:
+    return (
+        getattr(args, "delta", None)
+        or args.output_tsv_file
+        or args.metadata_tsv_file
+    )
+
+
 def get_arg_parser() -> argparse.ArgumentParser:
     """Argument parser for galatea cli."""
     parser = argparse.ArgumentParser(description=__doc__)
@@ -84,12 +169,45 @@ def get_arg_parser() -> argparse.ArgumentParser:
         "source_tsv", type=pathlib.Path, help="Source tsv file"
     )
 
-    clean_tsv_cmd.add_argument(
+    clean_tsv_output_group = clean_tsv_cmd.add_mutually_exclusive_group()
+    clean_tsv_output_group.add_argument(
         "--output",
         dest="output_tsv",
         type=pathlib.Path,
         help="Output tsv file",
     )
+    clean_tsv_output_group.add_argument(
+        "--delta",
+        type=pathlib.Path,
+        metavar="PATH",
+        help="write only the changed cells to a delta file instead of "
+        "changing the tsv file. Apply it later with apply-delta",
+    )
+
+    # --------------------------------------------------------------------------
+    #  apply-delta command
+    # --------------------------------------------------------------------------
+    apply_delta_cmd = subparsers.add_parser(
+        "apply-delta", help=command_descriptions.APPLY_DELTA_DESC
+    )
+    apply_delta_cmd.add_argument(
+        "source_tsv",
+        type=pathlib.Path,
+        action=ValidateFilePath,
+        help="tsv file the delta was made from",
+    )
+    apply_delta_cmd.add_argument(
+        "delta_file",
+        type=pathlib.Path,
+        action=ValidateFilePath,
+        help="delta file written with --delta",
+    )
+    apply_delta_cmd.add_argument(
+        "--output",
+        dest="output_tsv",
+        type=pathlib.Path,
+        help="write the changed tsv file to another file instead of inplace",
+    )
     # --------------------------------------------------------------------------
     #  Authority check command
     # --------------------------------------------------------------------------
@@ -142,6 +260,30 @@ def get_arg_parser() -> argparse.ArgumentParser:
         dest="verbosity",
     )
 
+    authorized_terms_check_cmd.add_argument(
+        "--sample",
+        type=sample_size_type,
+        metavar="N|PCT%",
+        help="only check a random sample of the distinct terms, either a "
+        'number of terms such as "500" or a percentage such as "5%%", and '
+        "report an estimated invalid rate",
+    )
+
+    authorized_terms_check_cmd.add_argument(
+        "--report",
+        type=pathlib.Path,
+        help="write the result of every term checked to a report file. "
+        "Files ending with .jsonl are written as JSON Lines, otherwise tsv",
+    )
+
+    authorized_terms_check_cmd.add_argument(
+        "--seed",
+        type=int,
+        default=validate_authorized_terms.DEFAULT_SAMPLE_SEED,
+        help="seed used to pick the sample when using --sample. "
+        "Default: %(default)s",
+    )
+
     # --------------------------------------------------------------------------
     # authorized-terms new-transformation-file command
     # --------------------------------------------------------------------------
@@ -251,11 +393,7 @@ def get_arg_parser() -> argparse.ArgumentParser:
     merge_merge_from_get_marc_cmd.add_argument(
         "metadata_tsv_file", type=pathlib.Path, help="tsv file with metadata"
     )
-    merge_merge_from_get_marc_cmd.add_argument(
-        "--output-tsv-file",
-        type=pathlib.Path,
-        help="write changes to another file instead of inplace",
-    )
+    add_merge_output_arguments(merge_merge_from_get_marc_cmd)
     merge_merge_from_get_marc_cmd.add_argument(
         "mapping_file", type=pathlib.Path, help="Mapping file"
     )
@@ -265,17 +403,200 @@ def get_arg_parser() -> argparse.ArgumentParser:
         )
     except FileNotFoundError:
         default_get_marc_server = None
+    if isinstance(default_get_marc_server, list):
+        default_get_marc_server = ",".join(default_get_marc_server)
 
+    get_marc_server_help = (
+        "get-marc server url, or a comma separated list of the urls of "
+        "replicas of the server to spread the requests between."
+    )
     merge_merge_from_get_marc_cmd.add_argument(
         "--getmarc-server",
         type=str,
-        help=f'get-marc server url. Default: "{default_get_marc_server}"'
+        help=f'{get_marc_server_help} Default: "{default_get_marc_server}"'
         if default_get_marc_server
-        else "get-marc server url.",
+        else get_marc_server_help,
         default=default_get_marc_server,
     )
 
     merge_merge_from_get_marc_cmd.add_argument(
+        "--max-concurrency",
+        type=positive_int,
+        default=merge_data.DEFAULT_MAX_CONCURRENCY,
+        help="maximum number of records requested from the get-marc server "
+        "at the same time. Default: %(default)s",
+    )
+
+    merge_merge_from_get_marc_cmd.add_argument(
+        "--batch-size",
+        type=positive_int,
+        default=1,
+        help="number of records requested from the get-marc server with a "
+        "single request. Requires a get-marc server that accepts a comma "
+        "separated list of MMS IDs. Default: %(default)s",
+    )
+
+    merge_merge_from_get_marc_cmd.add_argument(
+        "--timeout",
+        type=positive_float,
+        metavar="SECONDS",
+        default=getmarc.DEFAULT_READ_TIMEOUT,
+        help="number of seconds to wait for the get-marc server to respond "
+        "to a request. Default: %(default)s",
+    )
+
+    merge_merge_from_get_marc_cmd.add_argument(
+        "--retries",
+        type=non_negative_int,
+        default=getmarc.DEFAULT_MAX_RETRIES,
+        help="number of times a request is retried when the get-marc server "
+        "cannot be reached or has an error. Default: %(default)s",
+    )
+
+    merge_merge_from_get_marc_cmd.add_argument(
+        "--retry-failed",
+        type=non_negative_int,
+        metavar="ROUNDS",
+        default=merge_data.DEFAULT_RETRY_ROUNDS,
+        help="number of times records that could not be retrieved are tried "
+        "again after every row has been merged. Default: %(default)s",
+    )
+
+    merge_merge_from_get_marc_cmd.add_argument(
+        "--cache-dir",
+        type=pathlib.Path,
+        help="keep a local copy of the records retrieved from the get-marc "
+        "server in this folder and reuse them on later runs",
+    )
+
+    merge_merge_from_get_marc_cmd.add_argument(
+        "--cache-ttl",
+        type=positive_float,
+        metavar="DAYS",
+        default=record_cache.DEFAULT_CACHE_TTL.days,
+        help="number of days a cached record can be reused. "
+        "Default: %(default)s",
+    )
+
+    cache_mode_group = (
+        merge_merge_from_get_marc_cmd.add_mutually_exclusive_group()
+    )
+    cache_mode_group.add_argument(
+        "--refresh",
+        action="store_true",
+        default=False,
+        help="ignore cached records and request them again. "
+        "Requires --cache-dir",
+    )
+    cache_mode_group.add_argument(
+        "--offline",
+        action="store_true",
+        default=False,
+        help="only use cached records, never contact the get-marc server. "
+        "Requires --cache-dir",
+    )
+
+    merge_merge_from_get_marc_cmd.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="continue an interrupted merge from where it stopped",
+    )
+
+    merge_merge_from_get_marc_cmd.add_argument(
+        "--enable-experimental-features",
+        action="store_true",
+        default=False,
+        help="enable experimental features",
+    )
+
+    # --------------------------------------------------------------------------
+    #  merge-data.from-marcxml and merge-data.from-mrc commands
+    # --------------------------------------------------------------------------
+    for record_file_command, description, file_help in [
+        (
+            "from-marcxml",
+            command_descriptions.MERGE_DATA_FROM_MARCXML_DESC,
+            "MARCXML collection file with the records",
+        ),
+        (
+            "from-mrc",
+            command_descriptions.MERGE_DATA_FROM_MRC_DESC,
+            "binary MARC (ISO 2709) file with the records",
+        ),
+    ]:
+        merge_from_record_file_cmd = merge_data_parser.add_parser(
+            record_file_command, help=description, allow_abbrev=False
+        )
+        merge_from_record_file_cmd.add_argument(
+            "metadata_tsv_file",
+            type=pathlib.Path,
+            help="tsv file with metadata",
+        )
+        merge_from_record_file_cmd.add_argument(
+            "mapping_file", type=pathlib.Path, help="Mapping file"
+        )
+        merge_from_record_file_cmd.add_argument(
+            "record_file",
+            type=pathlib.Path,
+            action=ValidateFilePath,
+            help=file_help,
+        )
+        add_merge_output_arguments(merge_from_record_file_cmd)
+        merge_from_record_file_cmd.add_argument(
+            "--index-file",
+            type=pathlib.Path,
+            help="where the index of the records file is kept. Default: next "
+            "to the records file",
+        )
+        merge_from_record_file_cmd.add_argument(
+            "--resume",
+            action="store_true",
+            default=False,
+            help="continue an interrupted merge from where it stopped",
+        )
+        merge_from_record_file_cmd.add_argument(
+            "--enable-experimental-features",
+            action="store_true",
+            default=False,
+            help="enable experimental features",
+        )
+
+    # --------------------------------------------------------------------------
+    #  merge-data.from-tsv command
+    # --------------------------------------------------------------------------
+    merge_from_tsv_cmd = merge_data_parser.add_parser(
+        "from-tsv",
+        help=command_descriptions.MERGE_DATA_FROM_TSV_DESC,
+        allow_abbrev=False,
+    )
+    merge_from_tsv_cmd.add_argument(
+        "metadata_tsv_file", type=pathlib.Path, help="tsv file with metadata"
+    )
+    merge_from_tsv_cmd.add_argument(
+        "mapping_file", type=pathlib.Path, help="Mapping file"
+    )
+    merge_from_tsv_cmd.add_argument(
+        "lookup_file",
+        type=pathlib.Path,
+        action=ValidateFilePath,
+        help="tsv or csv file with the data to merge",
+    )
+    add_merge_output_arguments(merge_from_tsv_cmd)
+    merge_from_tsv_cmd.add_argument(
+        "--max-rows-in-memory",
+        type=positive_int,
+        default=lookup_table.DEFAULT_MAX_ROWS_IN_MEMORY,
+        help="number of rows of the lookup file kept in memory before using "
+        "a database on disk instead. Default: %(default)s",
+    )
+    merge_from_tsv_cmd.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="continue an interrupted merge from where it stopped",
+    )
+    merge_from_tsv_cmd.add_argument(
         "--enable-experimental-features",
         action="store_true",
         default=False,
@@ -345,7 +666,8 @@ def clean_tsv_command(args: argparse.Namespace) -> None:
     # if no output is explicitly selected, the changes are handled
     # inplace instead of creating a new file
 
-    output: pathlib.Path = args.output_tsv or args.source_tsv
+    delta_file: Optional[pathlib.Path] = getattr(args, "delta", None)
+    output: pathlib.Path = delta_file or args.output_tsv or args.source_tsv
 
     with manage_module_logs(
         clean_tsv.logger, verbosity=get_logger_level_from_args(args)
@@ -354,15 +676,54 @@ def clean_tsv_command(args: argparse.Namespace) -> None:
             typing.cast(pathlib.Path, args.source_tsv),
             output,
             row_diff_report_generator=clean_tsv.create_diff_report,
+            delta_output=delta_file is not None,
         )
 
 
+def apply_delta_command(
+    args: argparse.Namespace,
+    exit_strategy: Callable[[int], None] = sys.exit,
+) -> None:
+    with manage_module_logs(
+        delta.logger, verbosity=get_logger_level_from_args(args)
+    ):
+        try:
+            delta.apply_delta(
+                args.source_tsv,
+                args.delta_file,
+                output_file=args.output_tsv,
+            )
+        except (delta.BadDeltaFileError, delta.DeltaConflictError) as e:
+            print(str(e), file=sys.stderr)
+            exit_strategy(1)
+
+
 def authority_check_command(args: argparse.Namespace) -> None:
     with manage_module_logs(
         validate_authorized_terms.logger,
         verbosity=get_logger_level_from_args(args),
     ):
-        validate_authorized_terms.validate_authorized_terms(args.source_tsv)
+        sample_size = getattr(args, "sample", None)
+        report = getattr(args, "report", None)
+        try:
+            if sample_size is not None:
+                validate_authorized_terms.sample_authorized_terms(
+                    args.source_tsv,
+                    sample_size,
+                    seed=getattr(
+                        args,
+                        "seed",
+                        validate_authorized_terms.DEFAULT_SAMPLE_SEED,
+                    ),
+                    report=report,
+                )
+                return
+            validate_authorized_terms.validate_authorized_terms(
+                args.source_tsv, report=report
+            )
+        except remote.CircuitOpenError as e:
+            print(str(e), file=sys.stderr)
+            sys.exit(1)
 
 
 def resolve_authorized_terms_command(args: argparse.Namespace) -> None:
@@ -399,6 +760,10 @@ def merge_data_command(args: argparse.Namespace):
     match args.merge_data_command:
         case "from-getmarc":
             merge_get_marc_data_command(args)
+        case "from-marcxml" | "from-mrc":
+            merge_record_file_data_command(args)
+        case "from-tsv":
+            merge_tsv_data_command(args)
         case _:
             raise ValueError(f"unknown command: {args.merge_data_command}")
 
@@ -410,6 +775,15 @@ def merge_from_getmarc(
     getmarc_server,
     enable_experimental_features: bool,
     exit_strategy: Callable[[int], None] = sys.exit,
+    max_concurrency: int = merge_data.DEFAULT_MAX_CONCURRENCY,
+    cache: Optional[record_cache.MarcRecordCache] = None,
+    refresh_cache: bool = False,
+    offline: bool = False,
+    resume: bool = False,
+    client: Optional[getmarc.GetMarcClient] = None,
+    retry_policy: Optional[merge_data.RetryPolicy] = None,
+    batch_size: int = 1,
+    delta_output: bool = False,
 ) -> None:
     try:
         merge_data.merge_from_getmarc(
@@ -418,6 +792,15 @@ def merge_from_getmarc(
             mapping_file=mapping_file,
             get_marc_server=getmarc_server,
             enable_experimental_features=enable_experimental_features,
+            max_concurrency=max_concurrency,
+            cache=cache,
+            refresh_cache=refresh_cache,
+            offline=offline,
+            resume=resume,
+            client=client,
+            retry_policy=retry_policy,
+            batch_size=batch_size,
+            delta_output=delta_output,
         )
     except CommandFinishedWithException as e:
         print(str(e), file=sys.stderr)
@@ -433,9 +816,65 @@ def merge_from_getmarc(
     except merge_data.BadMappingFileError as e:
         print(str(e), file=sys.stderr)
         exit_strategy(1)
+    except merge_journal.JournalMismatchError as e:
+        print(str(e), file=sys.stderr)
+        exit_strategy(1)
+    except remote.CircuitOpenError as e:
+        print(
+            f"{e} Use --resume to continue the merge once it is available.",
+            file=sys.stderr,
+        )
+        exit_strategy(1)
 
 
-def merge_get_marc_data_command(args: argparse.Namespace):
+def get_record_cache_from_args(
+    args: argparse.Namespace,
+) -> Optional[record_cache.MarcRecordCache]:
+    if args.cache_dir is None:
+        if args.refresh or args.offline:
+            raise InvalidArgumentsError(
+                "--refresh and --offline require --cache-dir"
+            )
+        return None
+    if args.getmarc_server is None:
+        raise InvalidArgumentsError(
+            "--cache-dir requires a get-marc server url to look up records"
+        )
+    # Replicas serve the same records, so they share the cache of the first.
+    return record_cache.MarcRecordCache(
+        args.cache_dir,
+        server=getmarc.parse_server_urls(args.getmarc_server)[0],
+        ttl=datetime.timedelta(days=args.cache_ttl),
+    )
+
+
+def get_marc_client_from_args(
+    args: argparse.Namespace,
+) -> getmarc.GetMarcClient:
+    if args.getmarc_server is None:
+        raise InvalidArgumentsError(
+            "a get-marc server url is required to merge data. Use "
+            "--getmarc-server or set get_marc_server_url in the config file"
+        )
+    return getmarc.GetMarcClient(
+        args.getmarc_server,
+        read_timeout=args.timeout,
+        max_retries=args.retries,
+        pool_size=max(getmarc.DEFAULT_POOL_SIZE, args.max_concurrency),
+        # The merge narrows the parser down to the mapped data fields.
+        # Records saved to the cache are parsed whole instead.
+        parse=(
+            getmarc.parse_record
+            if args.cache_dir is not None
+            else getmarc.RecordFieldParser()
+        ),
+    )
+
+
+def merge_get_marc_data_command(
+    args: argparse.Namespace,
+    exit_strategy: Callable[[int], None] = sys.exit,
+) -> None:
     with manage_module_logs(
         merge_data.logger, verbosity=get_logger_level_from_args(args)
     ):
@@ -445,14 +884,33 @@ def merge_get_marc_data_command(args: argparse.Namespace):
                     args.source_tsv_file, args.output_file
                 )
             case "merge":
+                try:
+                    cache = get_record_cache_from_args(args)
+                    client = get_marc_client_from_args(args)
+                except InvalidArgumentsError as e:
+                    print(f"Error: {e}", file=sys.stderr)
+                    exit_strategy(1)
+                    return
                 merge_from_getmarc(
                     metadata_tsv_file=args.metadata_tsv_file,
-                    output_tsv_file=args.output_tsv_file,
+                    output_tsv_file=get_merge_output_file(args),
                     mapping_file=args.mapping_file,
                     getmarc_server=args.getmarc_server,
                     enable_experimental_features=(
                         args.enable_experimental_features
                     ),
+                    max_concurrency=args.max_concurrency,
+                    exit_strategy=exit_strategy,
+                    cache=cache,
+                    refresh_cache=args.refresh,
+                    offline=args.offline,
+                    resume=args.resume,
+                    client=client,
+                    retry_policy=merge_data.RetryPolicy(
+                        rounds=args.retry_failed
+                    ),
+                    batch_size=args.batch_size,
+                    delta_output=args.delta is not None,
                 )
             case _:
                 raise ValueError(
@@ -460,6 +918,83 @@ def merge_get_marc_data_command(args: argparse.Namespace):
                 )
 
 
+def merge_record_file_data_command(
+    args: argparse.Namespace,
+    exit_strategy: Callable[[int], None] = sys.exit,
+) -> None:
+    record_file_class: Type[marc_files.IndexedRecordFile]
+    match args.merge_data_command:
+        case "from-marcxml":
+            record_file_class = marc_files.MarcXmlRecordFile
+        case "from-mrc":
+            record_file_class = marc_files.Iso2709RecordFile
+        case _:
+            raise ValueError(f"unknown command: {args.merge_data_command}")
+    with manage_module_logs(
+        merge_data.logger, verbosity=get_logger_level_from_args(args)
+    ):
+        try:
+            merge_data.merge_from_record_file(
+                input_metadata_tsv_file=args.metadata_tsv_file,
+                output_metadata_tsv_file=get_merge_output_file(args),
+                mapping_file=args.mapping_file,
+                record_file=record_file_class(
+                    args.record_file, index_file=args.index_file
+                ),
+                enable_experimental_features=(
+                    args.enable_experimental_features
+                ),
+                resume=args.resume,
+                delta_output=getattr(args, "delta", None) is not None,
+            )
+        except merge_data.ExperimentalFeatureError as e:
+            print(
+                "Error: attempting to use a feature that is listed as "
+                'Experimental without using "--enable-experimental-features" '
+                f"flag. {e}",
+                file=sys.stderr,
+            )
+            exit_strategy(1)
+        except (
+            CommandFinishedWithException,
+            merge_data.BadMappingFileError,
+            merge_journal.JournalMismatchError,
+            marc_files.BadRecordFileError,
+        ) as e:
+            print(str(e), file=sys.stderr)
+            exit_strategy(1)
+
+
+def merge_tsv_data_command(
+    args: argparse.Namespace,
+    exit_strategy: Callable[[int], None] = sys.exit,
+) -> None:
+    with manage_module_logs(
+        merge_data.logger, verbosity=get_logger_level_from_args(args)
+    ):
+        try:
+            merge_data.merge_from_tsv(
+                input_metadata_tsv_file=args.metadata_tsv_file,
+                output_metadata_tsv_file=get_merge_output_file(args),
+                mapping_file=args.mapping_file,
+                lookup_file=args.lookup_file,
+                enable_experimental_features=(
+                    args.enable_experimental_features
+                ),
+                resume=args.resume,
+                max_rows_in_memory=args.max_rows_in_memory,
+                delta_output=getattr(args, "delta", None) is not None,
+            )
+        except (
+            CommandFinishedWithException,
+            merge_data.BadMappingFileError,
+            merge_journal.JournalMismatchError,
+            lookup_table.MissingKeyColumnError,
+        ) as e:
+            print(str(e), file=sys.stderr)
+            exit_strategy(1)
+
+
 def config_command(args: argparse.Namespace) -> None:
     match args.config_command:
         case "set":
@@ -508,6 +1043,9 @@ def main(cli_args: Optional[List[str]] = None) -> None:
         case "clean-tsv":
             clean_tsv_command(args)
 
+        case "apply-delta":
+            apply_delta_command(args)
+
         case "authorized-terms":
             authorized_terms_command(args)
 
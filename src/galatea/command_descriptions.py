@@ -9,8 +9,18 @@ AUTHORIZED_TERMS_NEW_TRANSFORMATION_FILE_DESCRIPTION = (
 AUTHORIZED_TERMS_RESOLVE_DESCRIPTION = (
     "Resolve unauthorized terms to authorized terms in found tsv file"
 )
+APPLY_DELTA_DESC = "Apply a delta file of changed cells to a tsv file"
 CLEAN_TSV_DESC = "Clean tsv files"
 MERGE_DATA_FROM_GETMARC_INIT_MAPPER_DESC = "Create initial mapping file"
 MERGE_DATA_FROM_GETMARC_MERGE_DESC = (
     "merge data from get-marc server and map to tsv file"
 )
+MERGE_DATA_FROM_MARCXML_DESC = (
+    "merge data from a local MARCXML file and map to tsv file"
+)
+MERGE_DATA_FROM_MRC_DESC = (
+    "merge data from a local binary MARC (.mrc) file and map to tsv file"
+)
+MERGE_DATA_FROM_TSV_DESC = (
+    "merge data from a local tsv or csv file and map to tsv file"
+)
@@ -2,7 +2,7 @@
 
 import abc
 import pathlib
-from typing import Optional
+from typing import List, Optional, Union
 import dataclasses
 import platform
 import json
@@ -12,7 +12,7 @@ __all__ = ["get_config", "set_config", "get_default_config_file_path"]
 
 @dataclasses.dataclass
 class Config:
-    get_marc_server_url: Optional[str] = None
+    get_marc_server_url: Optional[Union[str, List[str]]] = None
 
 
 class ConfigFileFormatStrategy(abc.ABC):
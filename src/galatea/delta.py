@@ -0,0 +1,290 @@
+"""Deltas listing only the cells of a table that were changed.
+
+A delta is a tab separated file with one row per changed cell, giving the
+line of the row in the table, its identifier, the column and the value of
+the cell before and after the change. Rows are in the order of the table,
+so a delta can be applied to the table it was made from in a single pass.
+
+Added in version 0.7.0.
+
+"""
+
+import csv
+import logging
+import os
+import pathlib
+import tempfile
+import typing
+from typing import Dict, Iterable, Iterator, Mapping, Optional, TextIO
+
+from galatea import tsv
+from galatea.utils import GalateaException
+
+__all__ = [
+    "BadDeltaFileError",
+    "CellChange",
+    "DELTA_COLUMNS",
+    "DeltaConflictError",
+    "apply_delta",
+    "apply_delta_fp",
+    "iter_cell_changes",
+    "read_changes_fp",
+    "write_changes_fp",
+]
+
+DELTA_COLUMNS = ["line", "identifier", "column", "old", "new"]
+DELTA_DIALECT = csv.excel_tab
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class BadDeltaFileError(GalateaException):
+    """Delta file cannot be read."""
+
+    def __init__(self, source: str, reason: str, *args) -> None:
+        """Create a new exception for a delta file that cannot be used."""
+        super().__init__(*args)
+        self.source = source
+        self.reason = reason
+
+    def __str__(self) -> str:
+        """Print string."""
+        return f"Unable to use delta {self.source}. {self.reason}"
+
+
+class DeltaConflictError(GalateaException):
+    """Table does not match the table the delta was made from."""
+
+    def __init__(self, change: "CellChange", current: str, *args) -> None:
+        """Create a new exception for a cell that was changed since."""
+        super().__init__(*args)
+        self.change = change
+        self.current = current
+
+    def __str__(self) -> str:
+        """Print string."""
+        return (
+            f'Line {self.change.line_number}, column "{self.change.column}" '
+            f'is "{self.current}" but the delta expects '
+            f'"{self.change.old}". The delta was made from a different '
+            f"version of the table."
+        )
+
+
+class CellChange(typing.NamedTuple):
+    """Change to a single cell of a table."""
+
+    line_number: int
+    identifier: str
+    column: str
+    old: str
+    new: str
+
+    def as_row(self) -> Dict[str, str]:
+        """Get the change as a row of a delta file."""
+        return dict(zip(DELTA_COLUMNS, map(str, self)))
+
+
+def _cell_value(value: Optional[str]) -> str:
+    return value or ""
+
+
+def iter_cell_changes(
+    line_number: int,
+    original: Mapping[str, Optional[str]],
+    changed: Mapping[str, Optional[str]],
+    identifier_key: Optional[str] = None,
+) -> Iterator[CellChange]:
+    """Iterate over the cells of a row that were changed.
+
+    Empty cells and None are treated as the same value.
+
+    Args:
+        line_number: line number of the row in the table
+        original: row before the change
+        changed: row after the change
+        identifier_key: column identifying the row. Defaults to the first
+            column.
+
+    Yields: changed cells, in the order of the columns
+
+    """
+    if identifier_key is None:
+        identifier_key = next(iter(original), "")
+    identifier = _cell_value(original.get(identifier_key))
+    for column, old in original.items():
+        new = _cell_value(changed.get(column, old))
+        if _cell_value(old) != new:
+            yield CellChange(
+                line_number, identifier, column, _cell_value(old), new
+            )
+
+
+def write_changes_fp(
+    fp: TextIO, changes: Iterable[CellChange], write_header: bool = True
+) -> int:
+    """Write changes to a delta file.
+
+    Args:
+        fp: file opened in text mode with newline=""
+        changes: changes in the order of the table
+        write_header: write the column names first
+
+    Returns: number of changes written
+
+    """
+    writer = csv.DictWriter(
+        fp, fieldnames=DELTA_COLUMNS, dialect=DELTA_DIALECT
+    )
+    if write_header:
+        writer.writeheader()
+    written = 0
+    for change in changes:
+        writer.writerow(change.as_row())
+        written += 1
+    return written
+
+
+def read_changes_fp(fp: TextIO, source: str = "delta") -> Iterator[CellChange]:
+    """Read the changes of a delta file, checking that they are in order.
+
+    An empty file is a delta without changes.
+
+    Args:
+        fp: delta file opened in text mode with newline=""
+        source: name of the file, used for reporting errors
+
+    Yields: changes in the order of the table
+
+    """
+    reader = csv.DictReader(fp, dialect=DELTA_DIALECT)
+    if reader.fieldnames is None:
+        return
+    if list(reader.fieldnames) != DELTA_COLUMNS:
+        raise BadDeltaFileError(
+            source,
+            f"Expected the columns {', '.join(DELTA_COLUMNS)} but found "
+            f"{', '.join(reader.fieldnames)}.",
+        )
+    last_line_number = 0
+    for row in reader:
+        try:
+            line_number = int(row["line"])
+        except (TypeError, ValueError) as error:
+            raise BadDeltaFileError(
+                source, f'Line {reader.line_num} has an invalid "line" value.'
+            ) from error
+        if line_number < last_line_number:
+            raise BadDeltaFileError(
+                source,
+                f"Line {reader.line_num} is out of order. Changes must be "
+                f"sorted by line.",
+            )
+        last_line_number = line_number
+        yield CellChange(
+            line_number,
+            row["identifier"] or "",
+            row["column"] or "",
+            row["old"] or "",
+            row["new"] or "",
+        )
+
+
+def apply_delta_fp(
+    base_fp: TextIO,
+    delta_fp: TextIO,
+    output_fp: TextIO,
+    delta_source: str = "delta",
+) -> int:
+    """Apply a delta to a table, reading both in a single pass.
+
+    Before a cell is changed, its value is checked against the old value in
+    the delta, so a delta is never applied to a different version of the
+    table than the one it was made from.
+
+    Args:
+        base_fp: table the delta was made from, opened with newline=""
+        delta_fp: delta file, opened with newline=""
+        output_fp: file the patched table is written to
+        delta_source: name of the delta file, used for reporting errors
+
+    Returns: number of cells changed
+
+    """
+    dialect = tsv.get_tsv_dialect(base_fp)
+    reader = csv.DictReader(base_fp, dialect=dialect)
+    field_names = list(reader.fieldnames or [])
+    writer = csv.DictWriter(output_fp, fieldnames=field_names, dialect=dialect)
+    writer.writeheader()
+    changes = read_changes_fp(delta_fp, source=delta_source)
+    pending = next(changes, None)
+    applied = 0
+    for row in reader:
+        while pending is not None and pending.line_number <= reader.line_num:
+            if pending.line_number < reader.line_num:
+                raise BadDeltaFileError(
+                    delta_source,
+                    f"Line {pending.line_number} does not match a row of "
+                    f"the table.",
+                )
+            if pending.column not in row:
+                raise BadDeltaFileError(
+                    delta_source,
+                    f'The table has no "{pending.column}" column.',
+                )
+            current = _cell_value(row[pending.column])
+            if current != pending.old:
+                raise DeltaConflictError(pending, current)
+            row[pending.column] = pending.new
+            applied += 1
+            pending = next(changes, None)
+        writer.writerow(row)
+    if pending is not None:
+        raise BadDeltaFileError(
+            delta_source,
+            f"Line {pending.line_number} is past the end of the table.",
+        )
+    return applied
+
+
+def apply_delta(
+    base_file: pathlib.Path,
+    delta_file: pathlib.Path,
+    output_file: Optional[pathlib.Path] = None,
+) -> int:
+    """Apply a delta file to a table.
+
+    The patched table is written to a temporary file first, so the output
+    is only replaced once the whole delta has been applied.
+
+    Args:
+        base_file: table the delta was made from
+        delta_file: delta file
+        output_file: where the patched table is written. Defaults to
+            replacing the base file.
+
+    Returns: number of cells changed
+
+    """
+    output_file = output_file or base_file
+    fd, temp_name = tempfile.mkstemp(
+        dir=output_file.parent, prefix=f".{output_file.name}", suffix=".tmp"
+    )
+    try:
+        with (
+            base_file.open("r", newline="", encoding="utf-8") as base_fp,
+            delta_file.open("r", newline="", encoding="utf-8") as delta_fp,
+            os.fdopen(fd, "w", newline="", encoding="utf-8") as output_fp,
+        ):
+            applied = apply_delta_fp(
+                base_fp, delta_fp, output_fp, delta_source=str(delta_file)
+            )
+        os.replace(temp_name, output_file)
+    except BaseException:
+        pathlib.Path(temp_name).unlink(missing_ok=True)
+        raise
+    logger.info(
+        "Changed %d cell(s) of %s. Wrote %s.", applied, base_file, output_file
+    )
+    return applied
@@ -0,0 +1,581 @@
+"""Client for requesting MARC records from a GetMARC server.
+
+Added in version 0.7.0.
+
+"""
+
+import collections
+import concurrent.futures
+import logging
+import re
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Deque,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+from xml.etree import ElementTree as ET
+
+import requests
+import requests.adapters
+
+from galatea import marc, remote, xml_backend
+from galatea.utils import GalateaException
+
+__all__ = [
+    "BatchingRecordStrategy",
+    "GetMarcClient",
+    "GetMarcRetrievalError",
+    "InvalidAPIRequestError",
+    "RecordFieldParser",
+    "parse_record",
+    "parse_record_fields",
+    "parse_server_urls",
+    "split_collection",
+]
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_POOL_SIZE = 10
+RETRY_STATUS_CODES = frozenset({500, 502, 503, 504})
+MARC_RECORD_TAG = marc.MARC_RECORD_TAG
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class InvalidAPIRequestError(GalateaException):
+    """Request to the GetMARC server is not valid."""
+
+
+class GetMarcRetrievalError(GalateaException):
+    """Unable to access record from GetMarc Server."""
+
+    def __init__(self, mmsid=None, *args):
+        """Create a new exception for a record that could not be accessed."""
+        super().__init__(*args)
+        self.mmsid = mmsid
+
+    def __str__(self):
+        """Print string."""
+        if self.mmsid:
+            return f'GetMarcRetrievalError: Unable to get record "{self.mmsid}" record from getmarc server.'
+        return "GetMarcRetrievalError"
+
+
+def parse_record(mmsid: str, content: bytes) -> ET.Element:
+    """Parse the raw bytes of a record returned by the GetMARC server.
+
+    The bytes are given to the XML parser as is, so that the encoding
+    declared by the document is used instead of decoding it to a string
+    first. The default XML backend is used, which is lxml if it is
+    installed.
+
+    Args:
+        mmsid: MMS ID of the record, used for reporting errors
+        content: body of the response
+
+    Returns: record element
+
+    """
+    try:
+        return xml_backend.fromstring(content)
+    except ET.ParseError as e:
+        raise GetMarcRetrievalError(mmsid=mmsid) from e
+
+
+def parse_record_fields(
+    mmsid: str, content: bytes, tags: Optional[Collection[str]] = None
+) -> marc.MarcRecordIndex:
+    """Parse a record returned by the GetMARC server, keeping some fields.
+
+    The response is parsed incrementally and data fields with other tags
+    are thrown away while parsing, so they are never held in memory.
+
+    Args:
+        mmsid: MMS ID of the record, used for reporting errors
+        content: body of the response
+        tags: tags of the data fields to keep. If None, every data field is
+            kept.
+
+    Returns: index of the fields kept
+
+    """
+    try:
+        return marc.parse_marc_fields(content, tags)
+    except ET.ParseError as e:
+        raise GetMarcRetrievalError(mmsid=mmsid) from e
+
+
+class RecordFieldParser:
+    """Parser for GetMARC responses that only keeps some data fields.
+
+    The fields kept can be changed once the fields needed are known, such
+    as after reading a mapping file. Until then, every field is kept.
+    """
+
+    def __init__(self, tags: Optional[Collection[str]] = None) -> None:
+        """Create a new parser.
+
+        Args:
+            tags: tags of the data fields to keep. If None, every data
+                field is kept.
+        """
+        self.tags: Optional[FrozenSet[str]] = None
+        self.keep(tags)
+
+    def keep(self, tags: Optional[Collection[str]]) -> None:
+        """Set the tags of the data fields to keep, or None to keep all."""
+        self.tags = None if tags is None else frozenset(tags)
+
+    def __call__(self, mmsid: str, content: bytes) -> marc.MarcRecordIndex:
+        """Parse the response for a record."""
+        return parse_record_fields(mmsid, content, self.tags)
+
+    def parse_collection(
+        self, mmsids: str, content: bytes
+    ) -> Dict[str, marc.MarcRecordIndex]:
+        """Parse the response for several records, by MMS ID.
+
+        Args:
+            mmsids: MMS IDs of the records requested, used for reporting
+                errors
+            content: body of the response, a MARCXML collection
+
+        Returns: records by the value of their 001 control field
+
+        """
+        try:
+            records = marc.parse_marc_collection_fields(content, self.tags)
+        except ET.ParseError as e:
+            raise GetMarcRetrievalError(mmsid=mmsids) from e
+        split = {}
+        for record in records:
+            mmsid = record.controlfields.get("001", "").strip()
+            if mmsid:
+                split[mmsid] = record
+        return split
+
+
+def parse_server_urls(servers: Union[str, Sequence[str]]) -> List[str]:
+    """Get the urls of GetMARC servers given as a string or a list.
+
+    A string can hold several urls separated by commas or whitespace.
+    Duplicates are dropped and the order is kept.
+
+    Args:
+        servers: url, comma separated urls, or list of urls
+
+    Returns: urls without a trailing slash
+
+    """
+    if isinstance(servers, str):
+        servers = re.split(r"[,\s]+", servers)
+    urls: List[str] = []
+    for server in servers:
+        url = server.strip().rstrip("/")
+        if url and url not in urls:
+            urls.append(url)
+    if not urls:
+        raise ValueError("No GetMARC server url given")
+    return urls
+
+
+class GetMarcClient:
+    """Client for a GetMARC server that reuses its connections.
+
+    Requests are sent through a pooled session with keep-alive and gzip
+    compression. Each request has a connect and read timeout, and requests
+    that fail because of a connection error or a 5xx status are retried a
+    limited number of times with an exponential backoff.
+
+    Requests go through a circuit breaker, so that a server that stops
+    responding is detected quickly instead of timing out on every record.
+
+    When given the urls of several replicas of the server, requests are
+    spread between them by latency. A request that fails on one replica is
+    sent to another one right away, and replicas that fail are avoided for
+    a while.
+
+    The client can be used directly as a strategy for getting records by
+    MMS ID.
+    """
+
+    def __init__(
+        self,
+        server: Union[str, Sequence[str]],
+        session: Optional[requests.Session] = None,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        sleep: Callable[[float], None] = time.sleep,
+        guard: Optional[remote.HostGuard] = None,
+        parse: Callable[[str, bytes], Any] = parse_record,
+        unhealthy_cooldown: float = remote.DEFAULT_UNHEALTHY_COOLDOWN,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create a new client.
+
+        Args:
+            server: url of the GetMARC server, or the urls of replicas of
+                it, as a list or a comma separated string
+            session: session to send requests with. Defaults to a new
+                pooled session.
+            connect_timeout: seconds to wait for a connection
+            read_timeout: seconds to wait for the server to respond
+            max_retries: number of times a failed request is retried
+            backoff_factor: seconds to wait before the first retry. The
+                wait doubles after each retry.
+            pool_size: number of connections kept open to the server
+            sleep: function used to wait between retries
+            guard: circuit breaker and in-flight request limit for the
+                server. Defaults to a new one for this client.
+            parse: function used to parse the response for a single
+                record, given its MMS ID and the body of the response.
+                Defaults to parsing the whole record.
+            unhealthy_cooldown: seconds a replica is avoided after it fails
+                a request
+            clock: function used to measure the latency of replicas
+        """
+        if max_retries < 0:
+            raise ValueError("max_retries cannot be negative")
+        self.servers = parse_server_urls(server)
+        self.server = self.servers[0]
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=pool_size
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        session.headers["Accept-Encoding"] = "gzip, deflate"
+        self.session = session
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._sleep = sleep
+        self.guard = guard or remote.HostGuard()
+        self.endpoints = remote.EndpointBalancer(
+            self.servers,
+            self.guard,
+            cooldown=unhealthy_cooldown,
+            clock=clock,
+        )
+        self._clock = clock
+        self._parse = parse
+        self.attempts: collections.Counter[str] = collections.Counter()
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "GetMarcClient":
+        """Use the client as a context manager that closes it on exit."""
+        return self
+
+    def __exit__(self, *exc) -> None:
+        """Close the client."""
+        self.close()
+
+    def __call__(self, mmsid: str) -> Any:
+        """Get a record by its MMS ID."""
+        return self.get_record(mmsid)
+
+    def close(self) -> None:
+        """Close the connections to the server."""
+        self.session.close()
+
+    def record_url(self, mmsid: str, server: Optional[str] = None) -> str:
+        """Get the url of a record, on the first server by default."""
+        return f"{server or self.server}{self.record_path(mmsid)}"
+
+    @property
+    def parse(self) -> Callable[[str, bytes], Any]:
+        """Function used to parse the response for a single record."""
+        return self._parse
+
+    @staticmethod
+    def record_path(mmsid: str) -> str:
+        """Get the path of a record on a server."""
+        return f"/api/record?mms_id={mmsid}"
+
+    @property
+    def total_attempts(self) -> int:
+        """Number of requests sent to the server."""
+        return self.attempts.total()
+
+    def log_endpoint_usage(self) -> None:
+        """Log how many requests each server answered, if there are several."""
+        if len(self.endpoints.endpoints) < 2:
+            return
+        for endpoint in self.endpoints.endpoints:
+            logger.info(
+                "%s answered %d of %d request(s).",
+                endpoint.url,
+                endpoint.requests - endpoint.failures,
+                endpoint.requests,
+            )
+
+    def get_backoff(self, retry: int) -> float:
+        """Get the seconds to wait before a retry, starting from 1."""
+        return self.backoff_factor * (2 ** (retry - 1))
+
+    def _count_attempt(self, mmsids: Sequence[str]) -> None:
+        with self._lock:
+            self.attempts.update(mmsids)
+
+    def get_response(self, path: str, *mmsids: str) -> requests.Response:
+        """Request a path, retrying on connection errors and 5xx statuses.
+
+        With several servers, a failed request is first sent to each server
+        that has not failed it yet, without waiting. Once every server has
+        failed it, it is retried with backoff on the best server left.
+
+        Args:
+            path: path on the server, such as the one from record_path
+            *mmsids: MMS IDs the request is for, used to count attempts
+
+        Returns: successful response
+
+        """
+        label = ", ".join(mmsids)
+        last_error: Optional[Exception] = None
+        tried: Set[str] = set()
+        retry = 0
+        while True:
+            endpoint = self.endpoints.acquire(exclude=tried)
+            if endpoint.url in tried:
+                retry += 1
+                if retry > self.max_retries:
+                    self.endpoints.release(endpoint)
+                    raise GetMarcRetrievalError(mmsid=label) from last_error
+                backoff = self.get_backoff(retry)
+                logger.warning(
+                    "Retrying %s in %.1f second(s). Reason: %s",
+                    label,
+                    backoff,
+                    last_error,
+                )
+                self._sleep(backoff)
+            elif tried:
+                logger.warning(
+                    "Sending %s to %s instead. Reason: %s",
+                    label,
+                    endpoint.url,
+                    last_error,
+                )
+            tried.add(endpoint.url)
+            self._count_attempt(mmsids)
+            url = f"{endpoint.url}{path}"
+            started = self._clock()
+            try:
+                response = self.guard.call(
+                    url, self.session.get, url, timeout=self.timeout
+                )
+            except remote.CircuitOpenError as error:
+                self.endpoints.release(endpoint)
+                if self.endpoints.is_aborted():
+                    raise
+                last_error = error
+                continue
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as error:
+                self.endpoints.release(endpoint)
+                last_error = error
+                continue
+            except requests.exceptions.RequestException as error:
+                self.endpoints.release(endpoint, self._clock() - started)
+                raise GetMarcRetrievalError(mmsid=label) from error
+            if response.status_code in RETRY_STATUS_CODES:
+                self.endpoints.release(endpoint)
+                last_error = requests.exceptions.HTTPError(
+                    f"{response.status_code} server error", response=response
+                )
+                continue
+            self.endpoints.release(endpoint, self._clock() - started)
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as error:
+                raise GetMarcRetrievalError(mmsid=label) from error
+            return response
+
+    def get_record(self, mmsid: str) -> Any:
+        """Get a record by its MMS ID.
+
+        Args:
+            mmsid: MMS ID of the record
+
+        Returns: record, as returned by the parse function of the client.
+            By default, the record element.
+
+        """
+        if not mmsid.strip():
+            raise InvalidAPIRequestError("MMSId cannot be empty")
+        response = self.get_response(self.record_path(mmsid), mmsid)
+        if self.attempts[mmsid] > 1:
+            logger.info(
+                "Got record %s after %d attempt(s).",
+                mmsid,
+                self.attempts[mmsid],
+            )
+        return self._parse(mmsid, response.content)
+
+    def get_records(self, mmsids: Sequence[str]) -> Dict[str, Any]:
+        """Get several records with a single request.
+
+        The MMS IDs are sent as a comma separated list and the server
+        responds with a MARCXML collection. The records are matched back to
+        their MMS ID using their 001 control field.
+
+        If the client parses records with a RecordFieldParser, the collection
+        is parsed the same way, keeping only the data fields it keeps.
+
+        Args:
+            mmsids: MMS IDs of the records
+
+        Returns: records found, by MMS ID. Records missing from the response
+            are left out.
+
+        """
+        if not mmsids or not all(mmsid.strip() for mmsid in mmsids):
+            raise InvalidAPIRequestError("MMSId cannot be empty")
+        response = self.get_response(
+            self.record_path(",".join(mmsids)), *mmsids
+        )
+        if isinstance(self._parse, RecordFieldParser):
+            return self._parse.parse_collection(
+                ", ".join(mmsids), response.content
+            )
+        return split_collection(
+            parse_record(", ".join(mmsids), response.content)
+        )
+
+
+def split_collection(root: ET.Element) -> Dict[str, ET.Element]:
+    """Split a MARCXML collection into its records by MMS ID.
+
+    Args:
+        root: collection element, or a single record element
+
+    Returns: records by the value of their 001 control field
+
+    """
+    records = (
+        [root]
+        if root.tag == MARC_RECORD_TAG
+        else root.findall(MARC_RECORD_TAG)
+    )
+    split = {}
+    for record in records:
+        for controlfield in record.iter(marc.MARC_CONTROLFIELD_TAG):
+            if controlfield.get("tag") == "001" and controlfield.text:
+                split[controlfield.text.strip()] = record
+                break
+    return split
+
+
+class BatchingRecordStrategy:
+    """Record fetching strategy that requests records in batches.
+
+    When told which records are going to be needed, in the order they are
+    going to be needed, each request for a record that has not been fetched
+    yet also fetches the records needed next, up to the batch size. The
+    extra records are kept until they are asked for.
+    """
+
+    def __init__(
+        self,
+        fetch_batch: Callable[[Sequence[str]], Mapping[str, ET.Element]],
+        batch_size: int,
+        should_fetch: Callable[[str], bool] = lambda _: True,
+    ) -> None:
+        """Create a new batching strategy.
+
+        Args:
+            fetch_batch: function to get several records by MMS ID
+            batch_size: maximum number of records requested at once
+            should_fetch: checks if a record should be included in a batch
+                ahead of time, such as if it is not cached already
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self._fetch_batch = fetch_batch
+        self.batch_size = batch_size
+        self._should_fetch = should_fetch
+        self._planned: Deque[str] = collections.deque()
+        self._requested: Set[str] = set()
+        self._pending: Dict[str, concurrent.futures.Future[ET.Element]] = {}
+        self._lock = threading.Lock()
+        self.batches = 0
+
+    def expect(self, mmsids: Iterable[str]) -> None:
+        """Set the records that are going to be needed, in order."""
+        with self._lock:
+            self._planned = collections.deque(mmsids)
+            self._requested.clear()
+
+    def _next_batch(self, mmsid: str) -> List[str]:
+        batch = [mmsid]
+        self._requested.add(mmsid)
+        while self._planned and len(batch) < self.batch_size:
+            planned = self._planned.popleft()
+            if planned in self._requested or not self._should_fetch(planned):
+                continue
+            self._requested.add(planned)
+            batch.append(planned)
+        return batch
+
+    def __call__(self, mmsid: str) -> ET.Element:
+        """Get a record, fetching it along with the next ones if needed."""
+        futures: Dict[str, concurrent.futures.Future[ET.Element]] = {}
+        with self._lock:
+            future = self._pending.get(mmsid)
+            if future is None:
+                # Nobody is fetching this record yet, so this call fetches it
+                # along with the records needed next.
+                futures = {
+                    key: concurrent.futures.Future()
+                    for key in self._next_batch(mmsid)
+                }
+                self._pending.update(futures)
+                future = futures[mmsid]
+                self.batches += 1
+        if futures:
+            self._run_batch(futures)
+        try:
+            return future.result()
+        finally:
+            with self._lock:
+                if self._pending.get(mmsid) is future:
+                    del self._pending[mmsid]
+
+    def _run_batch(
+        self, futures: Dict[str, "concurrent.futures.Future[ET.Element]"]
+    ) -> None:
+        logger.debug("requesting %d record(s) in one batch", len(futures))
+        try:
+            records = self._fetch_batch(list(futures))
+        except Exception as error:
+            for future in futures.values():
+                future.set_exception(error)
+            return
+        for key, future in futures.items():
+            if key in records:
+                future.set_result(records[key])
+            else:
+                future.set_exception(GetMarcRetrievalError(mmsid=key))
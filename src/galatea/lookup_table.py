@@ -0,0 +1,280 @@
+"""Lookup tables of rows keyed by a column, used to join tables.
+
+Added in version 0.7.0.
+
+"""
+
+import abc
+import csv
+import json
+import logging
+import pathlib
+import sqlite3
+import tempfile
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Type,
+    TypeVar,
+    Union,
+)
+
+from galatea import tsv
+from galatea.utils import GalateaException
+
+__all__ = [
+    "DEFAULT_MAX_ROWS_IN_MEMORY",
+    "InMemoryLookupTable",
+    "LookupTable",
+    "MissingKeyColumnError",
+    "SqliteLookupTable",
+    "load_lookup_table",
+]
+
+DEFAULT_MAX_ROWS_IN_MEMORY = 200_000
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+L = TypeVar("L", bound="LookupTable")
+
+
+class MissingKeyColumnError(GalateaException):
+    """Lookup table does not have the column used to join it."""
+
+    def __init__(
+        self, source_file: pathlib.Path, key_column: str, *args
+    ) -> None:
+        """Create a new exception for a table missing its key column."""
+        super().__init__(*args)
+        self.source_file = source_file
+        self.key_column = key_column
+
+    def __str__(self) -> str:
+        """Print string."""
+        return (
+            f'{self.source_file} does not have a "{self.key_column}" column '
+            f"to look up rows with."
+        )
+
+
+class LookupTable(abc.ABC):
+    """Rows of a table that can be looked up by the value of a column.
+
+    When the same key is used by more than one row, the first row wins.
+    """
+
+    def __init__(self, key_column: str, columns: Iterable[str]) -> None:
+        """Create a new lookup table.
+
+        Args:
+            key_column: column the rows are looked up by
+            columns: columns of the table
+        """
+        self.key_column = key_column
+        self.columns: List[str] = list(columns)
+        self.duplicate_keys = 0
+
+    def __enter__(self: L) -> L:
+        """Use the table as a context manager that closes it on exit."""
+        return self
+
+    def __exit__(self, *exc) -> None:
+        """Close the table."""
+        self.close()
+
+    def close(self) -> None:
+        """Release the resources used by the table."""
+
+    def add_rows(self, rows: Iterable[Dict[str, str]]) -> None:
+        """Add rows to the table, keyed by their key column.
+
+        Rows with an empty key are left out.
+        """
+        for row in rows:
+            key = (row.get(self.key_column) or "").strip()
+            if not key:
+                continue
+            if not self.add(key, row):
+                self.duplicate_keys += 1
+
+    @abc.abstractmethod
+    def add(self, key: str, row: Dict[str, str]) -> bool:
+        """Add a row unless its key is already used.
+
+        Returns: True if the row was added
+        """
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        """Get the row with a key, or None if there is not one."""
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Get the number of rows in the table."""
+
+
+class InMemoryLookupTable(LookupTable):
+    """Lookup table kept in a dictionary."""
+
+    def __init__(self, key_column: str, columns: Iterable[str]) -> None:
+        """Create a new lookup table kept in memory."""
+        super().__init__(key_column, columns)
+        self._rows: Dict[str, Dict[str, str]] = {}
+
+    def add(self, key: str, row: Dict[str, str]) -> bool:
+        """Add a row unless its key is already used."""
+        if key in self._rows:
+            return False
+        self._rows[key] = row
+        return True
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        """Get the row with a key, or None if there is not one."""
+        return self._rows.get(key)
+
+    def __len__(self) -> int:
+        """Get the number of rows in the table."""
+        return len(self._rows)
+
+
+class SqliteLookupTable(LookupTable):
+    """Lookup table kept in a temporary SQLite database on disk.
+
+    Used for tables too big to keep in memory. Rows are stored as JSON in a
+    table with the key as its primary key, so each lookup is a single index
+    search.
+    """
+
+    def __init__(
+        self,
+        key_column: str,
+        columns: Iterable[str],
+        directory: Optional[pathlib.Path] = None,
+    ) -> None:
+        """Create a new lookup table kept on disk.
+
+        Args:
+            key_column: column the rows are looked up by
+            columns: columns of the table
+            directory: folder for the database. Defaults to the system
+                temporary folder.
+        """
+        super().__init__(key_column, columns)
+        self._temp_dir = tempfile.TemporaryDirectory(
+            prefix="galatea-lookup-", dir=directory
+        )
+        self.database_file = pathlib.Path(self._temp_dir.name) / "lookup.db"
+        # The table can be used by another thread than the one loading it.
+        self._connection = sqlite3.connect(
+            self.database_file, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+        self._connection.execute(
+            "CREATE TABLE rows (key TEXT PRIMARY KEY, row TEXT NOT NULL)"
+        )
+
+    def add_rows(self, rows: Iterable[Dict[str, str]]) -> None:
+        """Add rows to the table in a single transaction."""
+        with self._connection:
+            super().add_rows(rows)
+
+    def add(self, key: str, row: Dict[str, str]) -> bool:
+        """Add a row unless its key is already used."""
+        cursor = self._connection.execute(
+            "INSERT OR IGNORE INTO rows (key, row) VALUES (?, ?)",
+            (key, json.dumps(row)),
+        )
+        return cursor.rowcount == 1
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        """Get the row with a key, or None if there is not one."""
+        result = self._connection.execute(
+            "SELECT row FROM rows WHERE key = ?", (key,)
+        ).fetchone()
+        return None if result is None else json.loads(result[0])
+
+    def __len__(self) -> int:
+        """Get the number of rows in the table."""
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM rows"
+        ).fetchone()[0]
+
+    def close(self) -> None:
+        """Remove the database."""
+        self._connection.close()
+        self._temp_dir.cleanup()
+
+
+def _get_dialect(
+    source_file: pathlib.Path, fp
+) -> Union[Type[csv.Dialect], csv.Dialect]:
+    if source_file.suffix.lower() == ".csv":
+        return csv.excel
+    return tsv.get_tsv_dialect(fp)
+
+
+def load_lookup_table(
+    source_file: pathlib.Path,
+    key_column: str,
+    max_rows_in_memory: int = DEFAULT_MAX_ROWS_IN_MEMORY,
+    sqlite_directory: Optional[pathlib.Path] = None,
+) -> LookupTable:
+    """Load a TSV or CSV file into a lookup table, reading it once.
+
+    Rows are kept in memory until there are more than max_rows_in_memory of
+    them. The table is then moved to a SQLite database on disk and the rest
+    of the rows are added there.
+
+    Args:
+        source_file: TSV file, or CSV file if its name ends with .csv
+        key_column: column the rows are looked up by
+        max_rows_in_memory: number of rows kept in memory before using a
+            database on disk instead
+        sqlite_directory: folder for the database. Defaults to the system
+            temporary folder.
+
+    Returns: lookup table
+
+    """
+    with source_file.open("r", encoding="utf-8-sig", newline="") as fp:
+        reader = csv.DictReader(fp, dialect=_get_dialect(source_file, fp))
+        columns = reader.fieldnames or []
+        if key_column not in columns:
+            raise MissingKeyColumnError(source_file, key_column)
+        table: LookupTable = InMemoryLookupTable(key_column, columns)
+        try:
+            pending_rows: List[Dict[str, str]] = []
+            for row in reader:
+                pending_rows.append(row)
+                if len(pending_rows) <= max_rows_in_memory:
+                    continue
+                if isinstance(table, InMemoryLookupTable):
+                    logger.info(
+                        "%s has more than %d row(s). Using a database on "
+                        "disk to look them up.",
+                        source_file,
+                        max_rows_in_memory,
+                    )
+                    table = SqliteLookupTable(
+                        key_column, columns, directory=sqlite_directory
+                    )
+                table.add_rows(pending_rows)
+                pending_rows = []
+            table.add_rows(pending_rows)
+        except BaseException:
+            table.close()
+            raise
+    if table.duplicate_keys:
+        logger.warning(
+            '%d row(s) of %s use a "%s" already used by an earlier row. '
+            "Only the first row is used.",
+            table.duplicate_keys,
+            source_file,
+            key_column,
+        )
+    logger.info("Loaded %d row(s) from %s.", len(table), source_file)
+    return table
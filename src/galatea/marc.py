@@ -1,8 +1,311 @@
 """Marc module for Galatea."""
 
-from typing import Union, Dict
+import collections
+import dataclasses
+import typing
+from typing import (
+    Collection,
+    Iterator,
+    Union,
+    Dict,
+    DefaultDict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+from xml.etree import ElementTree as ET
 
-__all__ = ["MarcEntryDataTypes", "Marc_Entry"]
+from galatea import xml_backend
+
+__all__ = [
+    "MarcEntryDataTypes",
+    "Marc_Entry",
+    "MARC_SLIM_XML_NAMESPACE",
+    "DataField",
+    "MarcRecordIndex",
+    "as_record_index",
+    "parse_marc_collection_fields",
+    "parse_marc_fields",
+]
 
 MarcEntryDataTypes = Union[str, None]
 Marc_Entry = Dict[str, MarcEntryDataTypes]
+
+MARC_SLIM_XML_NAMESPACE = "http://www.loc.gov/MARC21/slim"  # NOSONAR
+MARC_CONTROLFIELD_TAG = f"{{{MARC_SLIM_XML_NAMESPACE}}}controlfield"
+MARC_DATAFIELD_TAG = f"{{{MARC_SLIM_XML_NAMESPACE}}}datafield"
+MARC_SUBFIELD_TAG = f"{{{MARC_SLIM_XML_NAMESPACE}}}subfield"
+MARC_RECORD_TAG = f"{{{MARC_SLIM_XML_NAMESPACE}}}record"
+PARSE_CHUNK_SIZE = 64 * 1024
+
+
+@dataclasses.dataclass(frozen=True)
+class DataField:
+    """MARC data field with its indicators and subfields in order."""
+
+    tag: str
+    ind1: str = " "
+    ind2: str = " "
+    subfields: Tuple[Tuple[str, Optional[str]], ...] = ()
+    text: Optional[str] = None
+
+    def get_values(self, code: str) -> List[Optional[str]]:
+        """Get the values of every subfield with a given code."""
+        return [
+            value for sub_code, value in self.subfields if sub_code == code
+        ]
+
+
+def _as_datafield(element: ET.Element) -> DataField:
+    return DataField(
+        tag=element.get("tag", ""),
+        ind1=element.get("ind1", " "),
+        ind2=element.get("ind2", " "),
+        subfields=tuple(
+            (sub_field.get("code", ""), sub_field.text)
+            for sub_field in element
+            if sub_field.tag == MARC_SUBFIELD_TAG
+        ),
+        text=element.text,
+    )
+
+
+class MarcRecordIndex:
+    """Index of a MARC record by tag, built with a single walk of the record.
+
+    The index is built the first time it is used, so wrapping a record is
+    cheap. Every lookup after that only touches the fields with the tag
+    requested instead of searching the whole record again.
+    """
+
+    def __init__(self, element: Optional[ET.Element] = None) -> None:
+        """Create an index for a MARC record.
+
+        Args:
+            element: MARCXML record element. The element stays available
+                to strategies that need the full tree.
+        """
+        self.element = element
+        self._datafields: Optional[Dict[str, List[DataField]]] = None
+        self._controlfields: Optional[Dict[str, str]] = None
+        self._code_and_value: Optional[
+            DefaultDict[str, List[List[Dict[str, Optional[str]]]]]
+        ] = None
+        self._one_code_per_subfield: Optional[
+            DefaultDict[str, List[Dict[str, Optional[str]]]]
+        ] = None
+
+    @classmethod
+    def from_fields(
+        cls,
+        datafields: Sequence[DataField],
+        controlfields: Optional[Dict[str, str]] = None,
+    ) -> "MarcRecordIndex":
+        """Create an index from fields that are already parsed."""
+        index = cls()
+        index._datafields = collections.defaultdict(list)
+        for datafield in datafields:
+            index._datafields[datafield.tag].append(datafield)
+        index._datafields = dict(index._datafields)
+        index._controlfields = dict(controlfields or {})
+        return index
+
+    def _build(self) -> None:
+        datafields: DefaultDict[str, List[DataField]] = (
+            collections.defaultdict(list)
+        )
+        controlfields: Dict[str, str] = {}
+        if self.element is not None:
+            fields = xml_backend.backend_for(self.element).iter_tags(
+                self.element, (MARC_DATAFIELD_TAG, MARC_CONTROLFIELD_TAG)
+            )
+            for element in fields:
+                if element.tag == MARC_DATAFIELD_TAG:
+                    datafield = _as_datafield(element)
+                    datafields[datafield.tag].append(datafield)
+                elif element.tag == MARC_CONTROLFIELD_TAG:
+                    controlfields[element.get("tag", "")] = element.text or ""
+        self._datafields = dict(datafields)
+        self._controlfields = controlfields
+
+    @property
+    def datafields(self) -> Dict[str, List[DataField]]:
+        """Data fields of the record grouped by tag."""
+        if self._datafields is None:
+            self._build()
+        return self._datafields  # type: ignore[return-value]
+
+    @property
+    def controlfields(self) -> Dict[str, str]:
+        """Control fields of the record by tag."""
+        if self._controlfields is None:
+            self._build()
+        return self._controlfields  # type: ignore[return-value]
+
+    def get_datafields(self, tag: str) -> List[DataField]:
+        """Get every data field with a given tag."""
+        return self.datafields.get(tag, [])
+
+    def get_values(self, tag: str, code: Optional[str] = None) -> List[str]:
+        """Get the non-empty values of a field or subfield, stripped.
+
+        Args:
+            tag: field tag, such as "245"
+            code: subfield code. If None, the text of the field is used.
+
+        Returns: values in the order they appear in the record
+
+        """
+        raw_values: List[Optional[str]] = []
+        for datafield in self.get_datafields(tag):
+            if code is None:
+                raw_values.append(datafield.text)
+            else:
+                raw_values += datafield.get_values(code)
+        stripped_values = (value.strip() for value in raw_values if value)
+        return [value for value in stripped_values if value]
+
+    def organize_with_code_and_value(
+        self,
+    ) -> DefaultDict[str, List[List[Dict[str, Optional[str]]]]]:
+        """Group the subfields of every field as code and value pairs."""
+        if self._code_and_value is None:
+            fields: DefaultDict[str, List[List[Dict[str, Optional[str]]]]] = (
+                collections.defaultdict(list)
+            )
+            for tag, datafields in self.datafields.items():
+                for datafield in datafields:
+                    fields[tag].append([
+                        {"code": code, "value": value}
+                        for code, value in datafield.subfields
+                    ])
+            self._code_and_value = fields
+        return self._code_and_value
+
+    def organize_one_code_per_subfield(
+        self,
+    ) -> DefaultDict[str, List[Dict[str, Optional[str]]]]:
+        """Group the subfields of every field by code, last one wins."""
+        if self._one_code_per_subfield is None:
+            fields: DefaultDict[str, List[Dict[str, Optional[str]]]] = (
+                collections.defaultdict(list)
+            )
+            for tag, datafields in self.datafields.items():
+                for datafield in datafields:
+                    fields[tag].append(dict(datafield.subfields))
+            self._one_code_per_subfield = fields
+        return self._one_code_per_subfield
+
+
+def as_record_index(
+    record: Union[ET.Element, MarcRecordIndex],
+) -> MarcRecordIndex:
+    """Get an index for a record, reusing it if it is already indexed."""
+    if isinstance(record, MarcRecordIndex):
+        return record
+    return MarcRecordIndex(record)
+
+
+def _iter_parsed_fields(
+    content: bytes,
+    tags: Optional[Collection[str]],
+    chunk_size: int,
+    record_tag: Optional[str],
+) -> Iterator[MarcRecordIndex]:
+    wanted = None if tags is None else frozenset(tags)
+    datafields: List[DataField] = []
+    controlfields: Dict[str, str] = {}
+    parser: ET.XMLPullParser = ET.XMLPullParser(events=("start", "end"))
+    open_elements: List[ET.Element] = []
+
+    def _read_events() -> Iterator[MarcRecordIndex]:
+        nonlocal datafields, controlfields
+        events = typing.cast(
+            Iterator[Tuple[str, ET.Element]], parser.read_events()
+        )
+        for event, element in events:
+            if event == "start":
+                open_elements.append(element)
+                continue
+            open_elements.pop()
+            if element.tag == MARC_DATAFIELD_TAG:
+                if wanted is None or element.get("tag") in wanted:
+                    datafields.append(_as_datafield(element))
+            elif element.tag == MARC_CONTROLFIELD_TAG:
+                controlfields[element.get("tag", "")] = element.text or ""
+            elif element.tag == record_tag:
+                yield MarcRecordIndex.from_fields(datafields, controlfields)
+                datafields, controlfields = [], {}
+            else:
+                continue
+            if open_elements:
+                open_elements[-1].remove(element)
+
+    for offset in range(0, len(content), chunk_size):
+        parser.feed(content[offset : offset + chunk_size])
+        yield from _read_events()
+    parser.close()
+    yield from _read_events()
+    if record_tag is None:
+        yield MarcRecordIndex.from_fields(datafields, controlfields)
+
+
+def parse_marc_fields(
+    content: bytes,
+    tags: Optional[Collection[str]] = None,
+    chunk_size: int = PARSE_CHUNK_SIZE,
+) -> MarcRecordIndex:
+    """Parse a MARCXML record incrementally, keeping only some data fields.
+
+    The document is fed to a pull parser a chunk at a time. Each field is
+    indexed as soon as it has been parsed and then removed from the tree,
+    so the tree only holds the fields of the chunk being parsed. Data fields
+    with other tags, such as long 505 or 520 notes, are thrown away as they
+    are read. Control fields are always kept.
+
+    Args:
+        content: raw bytes of a MARCXML record
+        tags: tags of the data fields to keep. If None, every data field is
+            kept.
+        chunk_size: number of bytes given to the parser at a time
+
+    Returns: index of the fields kept. It has no element.
+
+    Raises:
+        xml.etree.ElementTree.ParseError: if the document is not valid
+
+    """
+    return next(
+        _iter_parsed_fields(content, tags, chunk_size, record_tag=None)
+    )
+
+
+def parse_marc_collection_fields(
+    content: bytes,
+    tags: Optional[Collection[str]] = None,
+    chunk_size: int = PARSE_CHUNK_SIZE,
+) -> List[MarcRecordIndex]:
+    """Parse every record of a MARCXML collection, keeping only some fields.
+
+    The collection counterpart of parse_marc_fields. Each record is indexed
+    once it has been parsed and then removed from the tree, so only one
+    record is held in memory at a time.
+
+    Args:
+        content: raw bytes of a MARCXML collection, or of a single record
+        tags: tags of the data fields to keep. If None, every data field is
+            kept.
+        chunk_size: number of bytes given to the parser at a time
+
+    Returns: index of the fields kept for each record, in document order
+
+    Raises:
+        xml.etree.ElementTree.ParseError: if the document is not valid
+
+    """
+    return list(
+        _iter_parsed_fields(
+            content, tags, chunk_size, record_tag=MARC_RECORD_TAG
+        )
+    )
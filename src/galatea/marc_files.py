@@ -0,0 +1,823 @@
+"""Local files of MARC records used in place of a GetMARC server.
+
+Added in version 0.7.0.
+
+"""
+
+import abc
+import json
+import logging
+import mmap
+import os
+import pathlib
+import sqlite3
+import tempfile
+import threading
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+from xml.etree import ElementTree as ET
+from xml.parsers import expat
+from xml.sax.saxutils import quoteattr
+
+from galatea import marc, xml_backend
+from galatea.utils import GalateaException
+
+__all__ = [
+    "BadRecordFileError",
+    "IndexedRecordFile",
+    "Iso2709RecordFile",
+    "MarcXmlRecordFile",
+    "RecordFileIndex",
+    "RecordLocation",
+    "RecordNotInFileError",
+    "build_iso2709_index",
+    "build_marcxml_index",
+    "parse_iso2709_record",
+]
+
+INDEX_FORMAT_VERSION = 2
+MARCXML_FORMAT = "marcxml"
+ISO2709_FORMAT = "iso2709"
+PARSE_CHUNK_SIZE = 1024 * 1024
+
+_RECORD_NAME = f"{marc.MARC_SLIM_XML_NAMESPACE} record"
+_CONTROLFIELD_NAME = f"{marc.MARC_SLIM_XML_NAMESPACE} controlfield"
+_WRAPPER_TAG = "galatea-record-wrapper"
+
+ISO2709_LEADER_LENGTH = 24
+ISO2709_DIRECTORY_ENTRY_LENGTH = 12
+ISO2709_FIELD_TERMINATOR = b"\x1e"
+ISO2709_RECORD_TERMINATOR = b"\x1d"
+ISO2709_SUBFIELD_DELIMITER = b"\x1f"
+
+MarcRecord = Union[ET.Element, marc.MarcRecordIndex]
+F = TypeVar("F", bound="IndexedRecordFile")
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class RecordNotInFileError(GalateaException):
+    """Record is not in the file of records used for a merge."""
+
+    def __init__(self, mmsid: str, source_file: pathlib.Path, *args) -> None:
+        """Create a new exception for a record missing from a file."""
+        super().__init__(*args)
+        self.mmsid = mmsid
+        self.source_file = source_file
+
+    def __str__(self) -> str:
+        """Print string."""
+        return f'Record "{self.mmsid}" is not in {self.source_file}.'
+
+
+class BadRecordFileError(GalateaException):
+    """File of records cannot be read."""
+
+    def __init__(self, source_file: pathlib.Path, reason: str, *args) -> None:
+        """Create a new exception for a file that cannot be read."""
+        super().__init__(*args)
+        self.source_file = source_file
+        self.reason = reason
+
+    def __str__(self) -> str:
+        """Print string."""
+        return f"Unable to read records from {self.source_file}. {self.reason}"
+
+
+class RecordLocation(NamedTuple):
+    """Where a record is in a file."""
+
+    start: int
+    end: int
+    namespaces: int = 0
+
+
+class RecordFileIndex:
+    """Byte offsets of the records in a file, keyed by MMS ID.
+
+    The offsets are kept in a SQLite database saved next to the file they
+    were built for, with the size and modification time of that file, so
+    the index is only rebuilt when the file changes. Offsets are looked up
+    in the database one record at a time, so the index of a large export
+    is never loaded into memory.
+    """
+
+    def __init__(
+        self, connection: sqlite3.Connection, metadata: Dict[str, Any]
+    ) -> None:
+        """Create an index of records kept in an open database.
+
+        Use RecordFileIndex.load to open a saved index.
+        """
+        self._connection = connection
+        self._lock = threading.Lock()
+        self.file_format: str = metadata["format"]
+        self.source_size: int = metadata["source_size"]
+        self.source_mtime_ns: int = metadata["source_mtime_ns"]
+        self.extra: dict = metadata.get("extra") or {}
+
+    def __contains__(self, mmsid: str) -> bool:
+        """Check if a record is in the index."""
+        return self.get(mmsid) is not None
+
+    def __len__(self) -> int:
+        """Get the number of records in the index."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM records"
+            ).fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the MMS IDs in the order of the file."""
+        with self._lock:
+            mmsids = self._connection.execute(
+                "SELECT mmsid FROM records ORDER BY start"
+            ).fetchall()
+        return (mmsid for (mmsid,) in mmsids)
+
+    def get(self, mmsid: str) -> Optional[RecordLocation]:
+        """Get where a record is, or None if it is not in the index."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT start, end, namespaces FROM records WHERE mmsid = ?",
+                (mmsid,),
+            ).fetchone()
+        return None if row is None else RecordLocation(*row)
+
+    def matches(self, source_file: pathlib.Path) -> bool:
+        """Check if the index was built for the current source file."""
+        stat = source_file.stat()
+        return (
+            self.source_size == stat.st_size
+            and self.source_mtime_ns == stat.st_mtime_ns
+        )
+
+    def close(self) -> None:
+        """Close the database."""
+        self._connection.close()
+
+    @classmethod
+    def load(
+        cls, index_file: pathlib.Path, file_format: str
+    ) -> Optional["RecordFileIndex"]:
+        """Open a saved index.
+
+        Args:
+            index_file: database the index was saved to
+            file_format: format of the file the index must be built for
+
+        Returns: index, or None if there is no usable index for the format
+
+        """
+        if not index_file.exists():
+            return None
+        try:
+            connection = sqlite3.connect(
+                f"{index_file.resolve().as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+            )
+        except sqlite3.Error as error:
+            logger.warning(
+                "Ignoring unreadable index %s: %s", index_file, error
+            )
+            return None
+        try:
+            metadata = {
+                key: json.loads(value)
+                for key, value in connection.execute(
+                    "SELECT key, value FROM metadata"
+                )
+            }
+        except (sqlite3.Error, ValueError) as error:
+            connection.close()
+            logger.warning(
+                "Ignoring unreadable index %s: %s", index_file, error
+            )
+            return None
+        if (
+            metadata.get("version") != INDEX_FORMAT_VERSION
+            or metadata.get("format") != file_format
+        ):
+            connection.close()
+            return None
+        return cls(connection, metadata)
+
+
+class _RecordFileIndexWriter:
+    """Write the offsets of records to a new index as they are found.
+
+    The index is written to a temporary file next to index_file, which only
+    replaces index_file once every record has been added.
+    """
+
+    def __init__(self, index_file: pathlib.Path, file_format: str) -> None:
+        self.index_file = index_file
+        self.file_format = file_format
+        self.extra: dict = {}
+        fd, temp_name = tempfile.mkstemp(
+            dir=index_file.parent, prefix=f"{index_file.name}.", suffix=".tmp"
+        )
+        os.close(fd)
+        self._temp_file = pathlib.Path(temp_name)
+        self._connection = sqlite3.connect(self._temp_file)
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+        self._connection.execute(
+            "CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE TABLE records ("
+            "mmsid TEXT PRIMARY KEY, "
+            "start INTEGER NOT NULL, "
+            "end INTEGER NOT NULL, "
+            "namespaces INTEGER NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self.count = 0
+
+    def __enter__(self) -> "_RecordFileIndexWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        self._connection.close()
+        if exc_type is not None:
+            self._temp_file.unlink(missing_ok=True)
+
+    def add(self, mmsid: str, location: RecordLocation) -> bool:
+        """Add the location of a record unless its MMS ID is already used.
+
+        Returns: True if the record was added
+        """
+        cursor = self._connection.execute(
+            "INSERT OR IGNORE INTO records (mmsid, start, end, namespaces) "
+            "VALUES (?, ?, ?, ?)",
+            (mmsid, *location),
+        )
+        if cursor.rowcount != 1:
+            return False
+        self.count += 1
+        return True
+
+    def save(self, source_stat: os.stat_result) -> RecordFileIndex:
+        """Replace index_file with the new index and open it."""
+        metadata = {
+            "version": INDEX_FORMAT_VERSION,
+            "format": self.file_format,
+            "source_size": source_stat.st_size,
+            "source_mtime_ns": source_stat.st_mtime_ns,
+            "extra": self.extra,
+        }
+        self._connection.executemany(
+            "INSERT INTO metadata (key, value) VALUES (?, ?)",
+            [(key, json.dumps(value)) for key, value in metadata.items()],
+        )
+        self._connection.commit()
+        self._connection.close()
+        os.replace(self._temp_file, self.index_file)
+        index = RecordFileIndex.load(self.index_file, self.file_format)
+        if index is None:
+            raise OSError(f"unable to open index {self.index_file}")
+        return index
+
+
+class _MarcXmlIndexer:
+    def __init__(
+        self,
+        source_file: pathlib.Path,
+        data: mmap.mmap,
+        writer: _RecordFileIndexWriter,
+    ) -> None:
+        self.source_file = source_file
+        self.data = data
+        self.writer = writer
+        self.namespace_contexts: List[Dict[str, str]] = []
+        self._namespace_context_ids: Dict[
+            Tuple[Tuple[str, str], ...], int
+        ] = {}
+        self._in_scope: Dict[str, List[str]] = {}
+        self.encoding: Optional[str] = None
+        self._depth = 0
+        self._record_start: Optional[int] = None
+        self._record_depth = 0
+        self._record_namespaces = 0
+        self._mmsid: Optional[str] = None
+        self._mmsid_text: Optional[List[str]] = None
+        self.parser = expat.ParserCreate(namespace_separator=" ")
+        self.parser.buffer_text = True
+        self.parser.XmlDeclHandler = self._xml_declaration
+        self.parser.StartNamespaceDeclHandler = self._start_namespace
+        self.parser.EndNamespaceDeclHandler = self._end_namespace
+        self.parser.StartElementHandler = self._start_element
+        self.parser.EndElementHandler = self._end_element
+        self.parser.CharacterDataHandler = self._character_data
+
+    def _xml_declaration(self, version, encoding, standalone) -> None:
+        self.encoding = encoding
+
+    def _start_namespace(self, prefix, uri) -> None:
+        self._in_scope.setdefault(prefix or "", []).append(uri)
+
+    def _end_namespace(self, prefix) -> None:
+        self._in_scope[prefix or ""].pop()
+
+    def _get_namespace_context(self) -> int:
+        declarations = tuple(
+            sorted(
+                (prefix, uris[-1])
+                for prefix, uris in self._in_scope.items()
+                if uris
+            )
+        )
+        if declarations not in self._namespace_context_ids:
+            self._namespace_context_ids[declarations] = len(
+                self.namespace_contexts
+            )
+            self.namespace_contexts.append(dict(declarations))
+        return self._namespace_context_ids[declarations]
+
+    def _start_element(self, name, attributes) -> None:
+        self._depth += 1
+        if self._record_start is None:
+            if name == _RECORD_NAME:
+                self._record_start = self.parser.CurrentByteIndex
+                self._record_depth = self._depth
+                self._record_namespaces = self._get_namespace_context()
+                self._mmsid = None
+        elif (
+            name == _CONTROLFIELD_NAME
+            and self._depth == self._record_depth + 1
+            and attributes.get("tag") == "001"
+        ):
+            self._mmsid_text = []
+
+    def _end_element(self, name) -> None:
+        if self._mmsid_text is not None:
+            self._mmsid = "".join(self._mmsid_text).strip()
+            self._mmsid_text = None
+        if (
+            self._record_start is not None
+            and self._depth == self._record_depth
+        ):
+            # The parser points at the start of the end tag of the record.
+            end = self.data.find(b">", self.parser.CurrentByteIndex) + 1
+            self._add_record(self._record_start, end)
+            self._record_start = None
+        self._depth -= 1
+
+    def _character_data(self, text) -> None:
+        if self._mmsid_text is not None:
+            self._mmsid_text.append(text)
+
+    def _add_record(self, start: int, end: int) -> None:
+        if not self._mmsid:
+            logger.warning(
+                "Skipping record at byte %d of %s without a 001 field",
+                start,
+                self.source_file,
+            )
+        elif not self.writer.add(
+            self._mmsid, RecordLocation(start, end, self._record_namespaces)
+        ):
+            logger.warning(
+                'Record "%s" is in %s more than once. Using the first one.',
+                self._mmsid,
+                self.source_file,
+            )
+
+    def run(self) -> None:
+        try:
+            for offset in range(0, len(self.data), PARSE_CHUNK_SIZE):
+                self.parser.Parse(
+                    self.data[offset : offset + PARSE_CHUNK_SIZE], False
+                )
+            self.parser.Parse(b"", True)
+        except expat.ExpatError as error:
+            raise BadRecordFileError(self.source_file, str(error)) from error
+
+
+def build_marcxml_index(
+    source_file: pathlib.Path, index_file: pathlib.Path
+) -> RecordFileIndex:
+    """Find where every record of a MARCXML file starts and ends.
+
+    The file is read once with a streaming parser, so the records are never
+    held in memory. Each record is keyed by the value of its 001 control
+    field, which holds the MMS ID in Alma exports.
+
+    Args:
+        source_file: MARCXML collection file
+        index_file: where the index is saved
+
+    Returns: index of the records in the file
+
+    """
+    stat = source_file.stat()
+    with (
+        source_file.open("rb") as fp,
+        mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data,
+        _RecordFileIndexWriter(index_file, MARCXML_FORMAT) as writer,
+    ):
+        indexer = _MarcXmlIndexer(source_file, data, writer)
+        indexer.run()
+        writer.extra = {
+            "encoding": indexer.encoding,
+            "namespaces": indexer.namespace_contexts,
+        }
+        index = writer.save(stat)
+    logger.info("Indexed %d record(s) in %s.", writer.count, source_file)
+    return index
+
+
+class IndexedRecordFile(abc.ABC):
+    """File of MARC records used to look up records by MMS ID.
+
+    The file is indexed the first time it is opened and the index is kept
+    next to it, so later merges using the same file skip straight to the
+    lookups. Records are read from a memory map of the file only when they
+    are requested, so the file is never loaded into memory as a whole.
+
+    The file can be used directly as a strategy for getting records by MMS
+    ID.
+    """
+
+    file_format: str
+
+    def __init__(
+        self,
+        source_file: pathlib.Path,
+        index_file: Optional[pathlib.Path] = None,
+    ) -> None:
+        """Create a new record file.
+
+        Args:
+            source_file: file with the records
+            index_file: where the index of the file is kept. Defaults to a
+                file next to the source file.
+        """
+        self.source_file = source_file
+        self.index_file = index_file or source_file.with_name(
+            f"{source_file.name}.index"
+        )
+        self._index: Optional[RecordFileIndex] = None
+        self._temp_dir: Optional[tempfile.TemporaryDirectory] = None
+        self._fp: Optional[BinaryIO] = None
+        self._data: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+
+    def __enter__(self: F) -> F:
+        """Open the file, indexing it if needed."""
+        self.open()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        """Close the file."""
+        self.close()
+
+    def __call__(self, mmsid: str) -> MarcRecord:
+        """Get a record by its MMS ID."""
+        return self.get_record(mmsid)
+
+    def __contains__(self, mmsid: str) -> bool:
+        """Check if a record is in the file."""
+        return mmsid in self.index
+
+    def __len__(self) -> int:
+        """Get the number of records in the file."""
+        return len(self.index)
+
+    @property
+    def index(self) -> RecordFileIndex:
+        """Index of the records in the file."""
+        with self._lock:
+            if self._index is None:
+                self._index = self._load_or_build_index()
+            return self._index
+
+    def _load_or_build_index(self) -> RecordFileIndex:
+        index = RecordFileIndex.load(self.index_file, self.file_format)
+        if index is not None:
+            if index.matches(self.source_file):
+                logger.debug("using index %s", self.index_file)
+                return index
+            index.close()
+        try:
+            return self.build_index(self.index_file)
+        except OSError as error:
+            logger.warning(
+                "Unable to save index %s: %s. Using a temporary index "
+                "instead.",
+                self.index_file,
+                error,
+            )
+        self._temp_dir = tempfile.TemporaryDirectory(prefix="galatea-index-")
+        return self.build_index(
+            pathlib.Path(self._temp_dir.name) / self.index_file.name
+        )
+
+    @abc.abstractmethod
+    def build_index(self, index_file: pathlib.Path) -> RecordFileIndex:
+        """Read the whole file to find where its records are.
+
+        Args:
+            index_file: where the index is saved
+
+        Returns: index of the records in the file
+
+        """
+
+    def open(self) -> None:
+        """Open the file for looking up records."""
+        _ = self.index
+        with self._lock:
+            if self._data is None:
+                self._fp = self.source_file.open("rb")
+                self._data = mmap.mmap(
+                    self._fp.fileno(), 0, access=mmap.ACCESS_READ
+                )
+
+    def close(self) -> None:
+        """Close the file and its index."""
+        with self._lock:
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+            if self._temp_dir is not None:
+                self._temp_dir.cleanup()
+                self._temp_dir = None
+            if self._data is not None:
+                self._data.close()
+                self._data = None
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+
+    def locate_record(self, mmsid: str) -> RecordLocation:
+        """Find where a record is in the file."""
+        location = self.index.get(mmsid)
+        if location is None:
+            raise RecordNotInFileError(mmsid, self.source_file)
+        return location
+
+    def read_location(self, location: RecordLocation) -> bytes:
+        """Get the raw bytes found at a location of the file."""
+        if self._data is None:
+            self.open()
+        assert self._data is not None
+        return self._data[location.start : location.end]
+
+    def read_record_bytes(self, mmsid: str) -> bytes:
+        """Get the raw bytes of a record as they are in the file."""
+        return self.read_location(self.locate_record(mmsid))
+
+    @abc.abstractmethod
+    def get_record(self, mmsid: str) -> MarcRecord:
+        """Get a record by its MMS ID.
+
+        Args:
+            mmsid: MMS ID of the record
+
+        Returns: record
+
+        """
+
+
+class MarcXmlRecordFile(IndexedRecordFile):
+    """MARCXML collection file used to look up records by MMS ID."""
+
+    file_format = MARCXML_FORMAT
+
+    def build_index(self, index_file: pathlib.Path) -> RecordFileIndex:
+        """Read the whole file to find where its records are."""
+        return build_marcxml_index(self.source_file, index_file)
+
+    def get_record(self, mmsid: str) -> ET.Element:
+        """Get a record by its MMS ID.
+
+        Args:
+            mmsid: MMS ID of the record
+
+        Returns: record element
+
+        """
+        location = self.locate_record(mmsid)
+        content = self.read_location(location)
+        extra = self.index.extra
+        namespaces = extra["namespaces"][location.namespaces]
+        # The namespaces of the record can be declared by the collection
+        # around it, so they are declared again around the record alone.
+        declarations = "".join(
+            f" xmlns:{prefix}={quoteattr(uri)}"
+            if prefix
+            else f" xmlns={quoteattr(uri)}"
+            for prefix, uri in namespaces.items()
+        )
+        xml_declaration = (
+            f'<?xml version="1.0" encoding="{extra["encoding"]}"?>'
+            if extra.get("encoding")
+            else ""
+        )
+        document = (
+            f"{xml_declaration}<{_WRAPPER_TAG}{declarations}>".encode("ascii")
+            + content
+            + f"</{_WRAPPER_TAG}>".encode("ascii")
+        )
+        try:
+            return xml_backend.fromstring(document)[0]
+        except ET.ParseError as error:
+            raise BadRecordFileError(
+                self.source_file,
+                f'Record "{mmsid}" is not valid. The file may have changed '
+                f"since it was indexed: {error}",
+            ) from error
+
+
+def _read_iso2709_directory(
+    record: bytes,
+) -> Tuple[int, List[Tuple[str, int, int]]]:
+    leader = record[:ISO2709_LEADER_LENGTH]
+    try:
+        base_address = int(leader[12:17])
+    except ValueError as error:
+        raise ValueError(
+            f"invalid base address in leader {leader!r}"
+        ) from error
+    directory_end = record.find(
+        ISO2709_FIELD_TERMINATOR, ISO2709_LEADER_LENGTH, base_address
+    )
+    if directory_end == -1:
+        raise ValueError("directory is not terminated")
+    entries = []
+    for offset in range(
+        ISO2709_LEADER_LENGTH, directory_end, ISO2709_DIRECTORY_ENTRY_LENGTH
+    ):
+        entry = record[offset : offset + ISO2709_DIRECTORY_ENTRY_LENGTH]
+        if len(entry) != ISO2709_DIRECTORY_ENTRY_LENGTH:
+            raise ValueError(f"truncated directory entry {entry!r}")
+        tag = entry[:3].decode("ascii", errors="replace")
+        entries.append((tag, int(entry[3:7]), int(entry[7:12])))
+    return base_address, entries
+
+
+def _get_iso2709_field(
+    record: bytes, base_address: int, length: int, start: int
+) -> bytes:
+    field = record[base_address + start : base_address + start + length]
+    return field.rstrip(ISO2709_FIELD_TERMINATOR)
+
+
+def build_iso2709_index(
+    source_file: pathlib.Path, index_file: pathlib.Path
+) -> RecordFileIndex:
+    """Find where every record of a binary MARC file starts and ends.
+
+    The length of each record is read from its leader, so the file is
+    stepped through one record at a time and only the directory and the 001
+    field of each record are read.
+
+    Args:
+        source_file: ISO 2709 file, such as a .mrc export
+        index_file: where the index is saved
+
+    Returns: index of the records in the file
+
+    """
+    stat = source_file.stat()
+    with (
+        source_file.open("rb") as fp,
+        mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data,
+        _RecordFileIndexWriter(index_file, ISO2709_FORMAT) as writer,
+    ):
+        position = 0
+        while position < len(data):
+            # Some tools add line breaks between records.
+            if data[position : position + 1].isspace():
+                position += 1
+                continue
+            start = position
+            try:
+                length = int(data[start : start + 5])
+                if length < ISO2709_LEADER_LENGTH:
+                    raise ValueError(f"record length {length} is too short")
+                record = data[start : start + length]
+                if len(record) != length:
+                    raise ValueError("record is truncated")
+                base_address, directory = _read_iso2709_directory(record)
+            except ValueError as error:
+                raise BadRecordFileError(
+                    source_file,
+                    f"The record at byte {start} is not valid: {error}",
+                ) from error
+            position = start + length
+            mmsid = next(
+                (
+                    _get_iso2709_field(
+                        record, base_address, field_length, field_start
+                    )
+                    .decode("utf-8", errors="replace")
+                    .strip()
+                    for tag, field_length, field_start in directory
+                    if tag == "001"
+                ),
+                "",
+            )
+            if not mmsid:
+                logger.warning(
+                    "Skipping record at byte %d of %s without a 001 field",
+                    start,
+                    source_file,
+                )
+            elif not writer.add(mmsid, RecordLocation(start, position)):
+                logger.warning(
+                    'Record "%s" is in %s more than once. Using the first one.',
+                    mmsid,
+                    source_file,
+                )
+        index = writer.save(stat)
+    logger.info("Indexed %d record(s) in %s.", writer.count, source_file)
+    return index
+
+
+def parse_iso2709_record(record: bytes) -> marc.MarcRecordIndex:
+    """Read the fields of a binary MARC record.
+
+    Only records encoded in UTF-8, as marked by position 09 of the leader,
+    are fully supported. Characters outside of ASCII in MARC-8 records are
+    replaced.
+
+    Args:
+        record: bytes of a single ISO 2709 record
+
+    Returns: index of the fields of the record, usable by the mapping code
+
+    """
+    base_address, directory = _read_iso2709_directory(record)
+    controlfields: Dict[str, str] = {}
+    datafields: List[marc.DataField] = []
+    for tag, length, start in directory:
+        field = _get_iso2709_field(record, base_address, length, start)
+        if tag.startswith("00"):
+            controlfields[tag] = field.decode("utf-8", errors="replace")
+            continue
+        indicators = field[:2].decode("utf-8", errors="replace").ljust(2)
+        subfields = tuple(
+            (
+                subfield[:1].decode("utf-8", errors="replace"),
+                subfield[1:].decode("utf-8", errors="replace"),
+            )
+            for subfield in field[2:].split(ISO2709_SUBFIELD_DELIMITER)
+            if subfield
+        )
+        datafields.append(
+            marc.DataField(
+                tag=tag,
+                ind1=indicators[0],
+                ind2=indicators[1],
+                subfields=subfields,
+            )
+        )
+    return marc.MarcRecordIndex.from_fields(datafields, controlfields)
+
+
+class Iso2709RecordFile(IndexedRecordFile):
+    """Binary MARC (ISO 2709) file used to look up records by MMS ID.
+
+    Records are read straight into an index of their fields, without being
+    converted to MARCXML first.
+    """
+
+    file_format = ISO2709_FORMAT
+
+    def build_index(self, index_file: pathlib.Path) -> RecordFileIndex:
+        """Read the whole file to find where its records are."""
+        return build_iso2709_index(self.source_file, index_file)
+
+    def get_record(self, mmsid: str) -> marc.MarcRecordIndex:
+        """Get a record by its MMS ID.
+
+        Args:
+            mmsid: MMS ID of the record
+
+        Returns: index of the fields of the record
+
+        """
+        content = self.read_record_bytes(mmsid)
+        try:
+            return parse_iso2709_record(content)
+        except ValueError as error:
+            raise BadRecordFileError(
+                self.source_file,
+                f'Record "{mmsid}" is not valid. The file may have changed '
+                f"since it was indexed: {error}",
+            ) from error
@@ -4,15 +4,22 @@ Added in version 0.4.0.
 
 """
 
+import asyncio
 import collections
+import concurrent.futures
+import contextlib
 import functools
+import heapq
+import itertools
 import logging
+import operator
 import pathlib
 import re
 import csv
 import sys
+import time
+import types
 import warnings
-import xml
 
 import jinja2
 
@@ -31,25 +38,68 @@ from typing import (
     Union,
     Optional,
     Iterable,
+    Iterator,
+    AsyncIterator,
+    Generator,
+    Collection,
+    FrozenSet,
+    Mapping,
+    Sequence,
+    Tuple,
+    TypeVar,
 )
 import dataclasses
 import requests
 from xml.etree import ElementTree as ET
 
-from galatea import tsv
+from galatea import (
+    aio,
+    delta,
+    getmarc,
+    marc,
+    lookup_table,
+    marc_files,
+    merge_journal,
+    record_cache,
+    tsv,
+)
+from galatea.getmarc import GetMarcRetrievalError, InvalidAPIRequestError
+from galatea.marc import MarcRecordIndex, as_record_index
 from galatea.tsv import TableRow
 from galatea.utils import GalateaException, CommandFinishedWithException
 
 
 __all__ = [
+    "amerge_from_getmarc",
     "generate_mapping_file_for_tsv",
     "merge_from_getmarc",
+    "merge_from_iso2709",
+    "merge_from_marcxml",
+    "merge_from_record_file",
+    "merge_from_tsv",
     "BadMappingFileError",
 ]
 
-MARC_SLIM_XML_NAMESPACE = "http://www.loc.gov/MARC21/slim"  # NOSONAR
+MARC_SLIM_XML_NAMESPACE = marc.MARC_SLIM_XML_NAMESPACE
+
+MARC_RECORD = Union[ET.Element, MarcRecordIndex]
+
+DEFAULT_MAX_CONCURRENCY = 1
+DEFAULT_CHECKPOINT_INTERVAL = 100
+DEFAULT_RETRY_ROUNDS = 2
+DEFAULT_RETRY_BACKOFF = 5.0
+JINJA_BYTECODE_CACHE_NAME = "jinja"
+
+T = TypeVar("T")
+R = TypeVar("R")
 
-MARC_RECORD = ET.Element
+# Errors raised by a record strategy when a record is not available. The rows
+# of these records are left unchanged instead of stopping the merge.
+RECORD_UNAVAILABLE_ERRORS: Tuple[Type[GalateaException], ...] = (
+    GetMarcRetrievalError,
+    record_cache.RecordNotCachedError,
+    marc_files.RecordNotInFileError,
+)
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -99,22 +149,6 @@ class BadMappingFileError(GalateaException):
 class SerialzationError(GalateaException): ...
 
 
-class InvalidAPIRequestError(GalateaException): ...
-
-
-class GetMarcRetrievalError(GalateaException):
-    """Unable to access record from GetMarc Server."""
-
-    def __init__(self, mmsid=None, *args):
-        super().__init__(*args)
-        self.mmsid = mmsid
-
-    def __str__(self):
-        if self.mmsid:
-            return f'GetMarcRetrievalError: Unable to get record "{self.mmsid}" record from getmarc server.'
-        return "GetMarcRetrievalError"
-
-
 serialization_methods = {"verbatim": None}
 
 
@@ -254,13 +288,11 @@ def get_matching_marc_data(
     if not mmsid.strip():
         raise InvalidAPIRequestError("MMSId cannot be empty")
     result = request_strategy(f"{get_marc_server}/api/record?mms_id={mmsid}")
-    try:
-        return ET.fromstring(result.text)
-    except xml.etree.ElementTree.ParseError as e:
-        raise GetMarcRetrievalError(mmsid=mmsid) from e
+    return getmarc.parse_record(mmsid, result.content)
 
 
 MARC_REGEX = r"^(?P<datafield>\d{3})((\$?(?P<subfield>[a-zA-Z0-9]{1}))?$)"
+MARC_PATTERN = re.compile(MARC_REGEX)
 
 
 def get_xpath(datafield: str, subfield: Union[str, None], prefix: str) -> str:
@@ -269,6 +301,37 @@ def get_xpath(datafield: str, subfield: Union[str, None], prefix: str) -> str:
     return f".//{prefix}:datafield[@tag='{datafield}']/{prefix}:subfield[@code='{subfield}']"  # noqa: E501
 
 
+@dataclasses.dataclass(frozen=True)
+class MarcSelector:
+    """Pre-parsed MARC field selector, such as "245$a"."""
+
+    tag: str
+    subfield: Optional[str] = None
+
+    def find_values(self, record: MARC_RECORD) -> List[str]:
+        """Get the non-empty text values matching the selector."""
+        return as_record_index(record).get_values(self.tag, self.subfield)
+
+
+@functools.lru_cache(maxsize=None)
+def parse_marc_selector(mapped_value: str) -> Optional[MarcSelector]:
+    """Parse a matching MARC field, such as "245$a" or "245a".
+
+    Args:
+        mapped_value: matching marc field as written in the mapping file
+
+    Returns: selector, or None if the value is not a MARC field selector
+
+    """
+    re_results = MARC_PATTERN.search(mapped_value)
+    if not re_results:
+        return None
+    return MarcSelector(
+        tag=re_results.group("datafield"),
+        subfield=re_results.group("subfield"),
+    )
+
+
 # ===================================================================
 # Validation functions for mapping entries
 
@@ -346,6 +409,20 @@ DEFAULT_MARC_MAPPING_VALIDATIONS: List[
 ]
 
 
+DEFAULT_TSV_MAPPING_VALIDATIONS: List[
+    Callable[[Dict[str, Union[str, List[str]]]], Optional[str]]
+] = [
+    functools.partial(validate_is_not_list, key="key"),
+    functools.partial(validate_is_list_of_strings, key="matching_columns"),
+    functools.partial(validate_is_string, key="delimiter"),
+    functools.partial(
+        validate_limited_to_values,
+        key="existing_data",
+        allowed_values=["keep", "replace", "append"],
+    ),
+]
+
+
 def get_experimental_values(
     entry,
 ) -> Dict[str, Dict[str, Union[str, List[str]]]]:
@@ -385,51 +462,258 @@ def map_marc_mapping_to_mapping_config(
     )
 
 
-def read_mapping_toml_data(
-    mapping_file_fp: BinaryIO,
-    mapping_to_config_strategy: Optional[
-        Callable[[Dict[str, Union[str, List[str]]]], MappingConfig]
-    ] = None,
-    _: bool = False,
-) -> Dict[str, MappingConfig]:
+def map_tsv_mapping_to_mapping_config(
+    entry: Dict[str, Union[str, List[str]]],
+) -> MappingConfig:
+    """Read a mapping entry that takes its data from lookup table columns."""
+    errors = [
+        found_issue
+        for check in DEFAULT_TSV_MAPPING_VALIDATIONS
+        if (found_issue := check(entry))
+    ]
+    if errors:
+        raise BadMappingDataError(
+            "Malformed mapping file: " + ", ".join(errors)
+        )
+    return MappingConfig(
+        key=typing.cast(str, entry["key"]),
+        matching_keys=typing.cast(List[str], entry["matching_columns"]),
+        delimiter=typing.cast(str, entry.get("delimiter", "||")),
+        existing_data=typing.cast(str, entry.get("existing_data", "keep")),
+    )
+
+
+def _load_mapping_toml(mapping_file_fp: BinaryIO) -> Dict[str, typing.Any]:
     starting = mapping_file_fp.tell()
-    mapping = {}
     try:
         mapping_file_fp.seek(0)
-        mapping_data = tomllib.load(mapping_file_fp)
-        for mapping_value in mapping_data["mapping"]:
-            try:
-                if mapping_to_config_strategy is None:
-                    mapping[mapping_value["key"]] = MappingConfig(
-                        **mapping_value
-                    )
-                else:
-                    mapping[mapping_value["key"]] = mapping_to_config_strategy(
-                        mapping_value,
-                    )
-            except TypeError:
-                raise BadMappingDataError("Malformed mapping file")
-        return mapping
+        return tomllib.load(mapping_file_fp)
     except tomllib.TOMLDecodeError as toml_error:
         raise BadMappingDataError(details=str(toml_error)) from toml_error
     finally:
         mapping_file_fp.seek(starting)
 
 
+def _get_mapping_configs(
+    mapping_data: Dict[str, typing.Any],
+    mapping_to_config_strategy: Optional[
+        Callable[[Dict[str, Union[str, List[str]]]], MappingConfig]
+    ] = None,
+) -> Dict[str, MappingConfig]:
+    mapping = {}
+    for mapping_value in mapping_data["mapping"]:
+        try:
+            if mapping_to_config_strategy is None:
+                mapping[mapping_value["key"]] = MappingConfig(**mapping_value)
+            else:
+                mapping[mapping_value["key"]] = mapping_to_config_strategy(
+                    mapping_value,
+                )
+        except TypeError:
+            raise BadMappingDataError("Malformed mapping file")
+    return mapping
+
+
+def _get_identifier_key(mapping_data: Dict[str, typing.Any]) -> str:
+    try:
+        return mapping_data["mappings"]["identifier_key"]
+    except KeyError as e:
+        raise BadMappingDataError(
+            "Mapping file does not contain 'identifier_key' in the "
+            "'mappings' section"
+        ) from e
+
+
+def read_mapping_toml_data(
+    mapping_file_fp: BinaryIO,
+    mapping_to_config_strategy: Optional[
+        Callable[[Dict[str, Union[str, List[str]]]], MappingConfig]
+    ] = None,
+    _: bool = False,
+) -> Dict[str, MappingConfig]:
+    return _get_mapping_configs(
+        _load_mapping_toml(mapping_file_fp), mapping_to_config_strategy
+    )
+
+
 def get_identifier_key_fp(mapping_file_fp: BinaryIO) -> str:
-    starting = mapping_file_fp.tell()
+    return _get_identifier_key(_load_mapping_toml(mapping_file_fp))
+
+
+@dataclasses.dataclass(frozen=True)
+class ColumnPlan:
+    """Mapping of a single column with its selectors already parsed."""
+
+    config: MappingConfig
+    selectors: Tuple[MarcSelector, ...]
+    template: Optional[jinja2.Template] = None
+
+
+@dataclasses.dataclass(frozen=True)
+class MappingPlan:
+    """Mapping file compiled once so that it can be reused for every row."""
+
+    identifier_key: str
+    columns: Mapping[str, ColumnPlan]
+
+    @property
+    def configs(self) -> Mapping[str, MappingConfig]:
+        return types.MappingProxyType({
+            key: column.config for key, column in self.columns.items()
+        })
+
+    @property
+    def marc_tags(self) -> Optional[FrozenSet[str]]:
+        """Tags of the MARC data fields used by the mapping.
+
+        None if a column uses a Jinja template, since a template can use
+        any field of the record.
+        """
+        if any(
+            column.config.serialize_method == "jinja2template"
+            for column in self.columns.values()
+        ):
+            return None
+        return frozenset(
+            selector.tag
+            for column in self.columns.values()
+            for selector in column.selectors
+        )
+
+    def serialize(
+        self,
+        record: MARC_RECORD,
+        config: MappingConfig,
+        enable_experimental_features: bool,
+    ) -> Optional[str]:
+        """Serialize the value of a column using its pre-parsed selectors."""
+        return serialization_base_on_config(
+            record,
+            config,
+            enable_experimental_features,
+            selectors=self.columns[config.key].selectors,
+            template=self.columns[config.key].template,
+        )
+
+
+def create_jinja_environment(
+    templates: Optional[Mapping[str, str]] = None,
+    bytecode_cache_dir: Optional[pathlib.Path] = None,
+) -> jinja2.Environment:
+    """Create a Jinja environment for the templates of a mapping file.
+
+    Args:
+        templates: template source of each column, keyed by mapping key
+        bytecode_cache_dir: folder used to keep compiled templates between
+            runs. If None, templates are only cached in memory.
+
+    Returns: Jinja environment that loads templates by mapping key
+
+    """
+    bytecode_cache = None
+    if bytecode_cache_dir is not None:
+        bytecode_cache_dir.mkdir(parents=True, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(
+            str(bytecode_cache_dir)
+        )
+    return jinja2.Environment(
+        loader=jinja2.DictLoader(dict(templates or {})),
+        bytecode_cache=bytecode_cache,
+    )
+
+
+def get_jinja_template_source(config: MappingConfig) -> str:
+    serialization_method = config.experimental[config.serialize_method]
+    return "".join(
+        typing.cast(str, serialization_method["template"]).split("\n")
+    )
+
+
+def _compile_jinja_template(
+    config: MappingConfig, environment: jinja2.Environment
+) -> Optional[jinja2.Template]:
     try:
-        mapping_file_fp.seek(0)
-        mapping_data = tomllib.load(mapping_file_fp)
-        try:
-            return mapping_data["mappings"]["identifier_key"]
-        except KeyError as e:
-            raise BadMappingDataError(
-                "Mapping file does not contain 'identifier_key' in the "
-                "'mappings' section"
-            ) from e
-    finally:
-        mapping_file_fp.seek(starting)
+        return environment.get_template(config.key)
+    except jinja2.exceptions.TemplateError as error:
+        # Leave it to the serializer to report the error when the column is
+        # actually used, the same way as a template that was never compiled.
+        logger.debug(
+            'Unable to compile Jinja template for "%s". Reason: %s',
+            config.key,
+            error,
+        )
+        return None
+
+
+def compile_column_plan(
+    config: MappingConfig,
+    jinja_environment: Optional[jinja2.Environment] = None,
+) -> ColumnPlan:
+    selectors = []
+    for mapped_value in config.matching_keys:
+        selector = parse_marc_selector(mapped_value)
+        if selector is None:
+            logger.warning(
+                'Ignoring matching key "%s" for "%s" because it is not a '
+                "valid MARC field",
+                mapped_value,
+                config.key,
+            )
+            continue
+        selectors.append(selector)
+    template = None
+    if (
+        jinja_environment is not None
+        and config.serialize_method == "jinja2template"
+    ):
+        template = _compile_jinja_template(config, jinja_environment)
+    return ColumnPlan(
+        config=config, selectors=tuple(selectors), template=template
+    )
+
+
+def read_mapping_plan(
+    mapping_file_fp: BinaryIO,
+    mapping_to_config_strategy: Optional[
+        Callable[[Dict[str, Union[str, List[str]]]], MappingConfig]
+    ] = None,
+    jinja_bytecode_cache_dir: Optional[pathlib.Path] = None,
+) -> MappingPlan:
+    """Read and compile a mapping file in a single pass.
+
+    Jinja templates are compiled here once, instead of for every row.
+
+    Args:
+        mapping_file_fp: mapping toml file opened in binary mode
+        mapping_to_config_strategy: function to convert each mapping entry.
+            Defaults to validating the entry.
+        jinja_bytecode_cache_dir: folder to keep compiled Jinja templates
+            between runs.
+
+    Returns: compiled mapping plan
+
+    """
+    mapping_data = _load_mapping_toml(mapping_file_fp)
+    configs = _get_mapping_configs(
+        mapping_data,
+        mapping_to_config_strategy or map_marc_mapping_to_mapping_config,
+    )
+    jinja_environment = create_jinja_environment(
+        {
+            key: get_jinja_template_source(config)
+            for key, config in configs.items()
+            if config.serialize_method == "jinja2template"
+            and config.serialize_method in config.experimental
+        },
+        bytecode_cache_dir=jinja_bytecode_cache_dir,
+    )
+    return MappingPlan(
+        identifier_key=_get_identifier_key(mapping_data),
+        columns=types.MappingProxyType({
+            key: compile_column_plan(config, jinja_environment)
+            for key, config in configs.items()
+        }),
+    )
 
 
 def get_identifier_key(
@@ -441,43 +725,25 @@ def get_identifier_key(
 
 
 def _get_new_data_from_marc(
-    mapped_value: str, record: ET.Element
+    mapped_value: str, record: MARC_RECORD
 ) -> List[str]:
-    ns = {"marc": MARC_SLIM_XML_NAMESPACE}
-    marc_re = re.compile(MARC_REGEX)
-    re_results = marc_re.search(mapped_value)
-    if not re_results:
+    selector = parse_marc_selector(mapped_value)
+    if selector is None:
         return []
-    mapped_value_results = re_results.groupdict()
-    data_field = mapped_value_results.get("datafield")
-    if not data_field:
-        raise ValueError(
-            f'failed to parse matching key "{mapped_value}" when mapping '
-        )
-    sub_field = mapped_value_results.get("subfield")
-    xpath = get_xpath(data_field, sub_field, "marc")
-    new_data = []
-    for res in record.findall(xpath, ns):
-        if not res.text:
-            continue
-        try:
-            data = res.text.strip()
-        except AttributeError as e:
-            raise ValueError(
-                f'failed to get result from matching key "{mapped_value}"'
-            ) from e
-        if not data:
-            continue
-        new_data.append(data)
-    return new_data
+    return selector.find_values(record)
 
 
 def locate_marc_value_in_record(
-    config: MappingConfig, record: ET.Element
+    config: MappingConfig,
+    record: MARC_RECORD,
+    selectors: Optional[Iterable[MarcSelector]] = None,
 ) -> Optional[str]:
+    if selectors is None:
+        selectors = compile_column_plan(config).selectors
+    record = as_record_index(record)
     new_data: List[str] = []
-    for mapped_value in config.matching_keys:
-        new_data += _get_new_data_from_marc(mapped_value, record)
+    for selector in selectors:
+        new_data += selector.find_values(record)
     if len(new_data) == 0:
         return None
     return config.delimiter.join(new_data)
@@ -502,42 +768,23 @@ def experimental_feature(func):
     return inner
 
 
-def organize_marc_one_code_per_subfield(marc_record: ET.Element):
-    fields = collections.defaultdict(list)
-    ns = {"marc": MARC_SLIM_XML_NAMESPACE}
-    for res in marc_record.findall(".//marc:datafield", ns):
-        subfield_data = {}
-        for sub_field in res.findall(".//marc:subfield", ns):
-            subfield_data[sub_field.attrib["code"]] = sub_field.text
-        fields[res.attrib["tag"]].append(subfield_data)
-    return fields
+def organize_marc_one_code_per_subfield(marc_record: MARC_RECORD):
+    return as_record_index(marc_record).organize_one_code_per_subfield()
 
 
-def organize_with_code_and_value(marc_record: ET.Element):
-    fields = collections.defaultdict(list)
-    ns = {"marc": MARC_SLIM_XML_NAMESPACE}
-    for res in marc_record.findall(".//marc:datafield", ns):
-        subfield_data = []
-        for sub_field in res.findall(".//marc:subfield", ns):
-            subfield_data.append({
-                "code": sub_field.attrib["code"],
-                "value": sub_field.text,
-            })
-        fields[res.attrib["tag"]].append(subfield_data)
-    return fields
+def organize_with_code_and_value(marc_record: MARC_RECORD):
+    return as_record_index(marc_record).organize_with_code_and_value()
 
 
 @experimental_feature
 def serialize_with_jinja_template(
-    marc_record: ET.Element,
+    marc_record: MARC_RECORD,
     config: MappingConfig,
     enable_experimental_features: bool,
+    template: Optional[jinja2.Template] = None,
 ) -> str:
-    serialization_method = config.experimental[config.serialize_method]
-    jinja_template = "".join(
-        typing.cast(str, serialization_method["template"]).split("\n")
-    )
-    template = jinja2.Template(jinja_template)
+    if template is None:
+        template = jinja2.Template(get_jinja_template_source(config))
     fields = organize_with_code_and_value(marc_record)
     try:
         return template.render(fields=fields)
@@ -625,18 +872,21 @@ class MergeRowData:
 
 
 def serialization_base_on_config(
-    record: ET.Element,
+    record: MARC_RECORD,
     config: MappingConfig,
     enable_experimental_features: bool,
+    selectors: Optional[Iterable[MarcSelector]] = None,
+    template: Optional[jinja2.Template] = None,
 ) -> Optional[str]:
     match config.serialize_method:
         case "verbatim":
-            return locate_marc_value_in_record(config, record)
+            return locate_marc_value_in_record(config, record, selectors)
         case "jinja2template":
             return serialize_with_jinja_template(
                 record,
                 config,
                 enable_experimental_features=enable_experimental_features,
+                template=template,
             )
     return None
 
@@ -663,188 +913,1429 @@ def is_row_empty(
     return all(not str(e).strip() for e in row.values())
 
 
-def merge_data_from_getmarc(
-    mapping_file_fp: BinaryIO,
-    input_metadata_tsv_fp: TextIO,
-    get_marc_server_strategy: Callable[[str], ET.Element],
-    dialect: Union[Type[csv.Dialect], csv.Dialect],
-    enable_experimental_features: bool = False,
-) -> List[Dict[str, Union[str, str]]]:
-    non_fatal_errors = []
-    mapping = read_mapping_toml_data(
-        mapping_file_fp,
-        map_marc_mapping_to_mapping_config,
-        enable_experimental_features,
-    )
-    identifier_key: str = get_identifier_key_fp(mapping_file_fp)
+def _fetch_now(
+    fetch: Callable[[str], R], key: str
+) -> "concurrent.futures.Future[R]":
+    future: concurrent.futures.Future[R] = concurrent.futures.Future()
+    try:
+        future.set_result(fetch(key))
+    except Exception as error:
+        future.set_exception(error)
+    return future
+
+
+def iter_with_prefetched_records(
+    items: Iterable[T],
+    record_key: Callable[[T], Optional[str]],
+    fetch: Callable[[str], R],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    key_counts: Optional[Mapping[str, int]] = None,
+) -> Generator[Tuple[T, "Optional[concurrent.futures.Future[R]]"], None, None]:
+    """Iterate over items along with their records, fetching them ahead.
+
+    Records are fetched by a bounded pool of threads while the items ahead of
+    them are still being worked on. Items are always yielded in the same order
+    they came in.
+
+    Each record is only fetched once, no matter how many items share the same
+    key. If the number of items using each key is known ahead of time, a
+    record is let go of as soon as the last item using it is yielded.
+    Otherwise, every record is kept until the iteration is finished.
 
-    new_rows: List[Dict[str, str]] = []
+    Args:
+        items: items to iterate over, such as tsv rows
+        record_key: gets the key of the record needed for an item or None if
+            the item does not need a record
+        fetch: function used to get a record by its key
+        max_concurrency: maximum number of records to fetch at the same time.
+            When 1, records are fetched one by one when they are needed.
+        key_counts: optional number of items using each key
 
-    def _iter_row(
-        fp: TextIO, _dialect: Union[Type[csv.Dialect], csv.Dialect, str]
-    ) -> Iterable[TableRow[Dict[str, str]]]:
-        yield from tsv.iter_tsv_fp(fp, dialect=_dialect)
+    Yields: each item and a future for its record, or None if the item does
+        not need a record
 
-    warned_extra_keys = set()
-    for row in _iter_row(input_metadata_tsv_fp, dialect):
-        try:
-            if is_row_empty(row.entry):
-                logger.warning("Row #%s is empty", row.line_number)
-                new_rows.append(row.entry)
-                continue
-            mmsid = row.entry[identifier_key]
-            if not mmsid:
-                logger.warning(
-                    'Skipping row #%d because the "%s" field is empty',
-                    row.line_number,
-                    identifier_key,
-                )
-                new_rows.append(row.entry)
-                continue
-            else:
-                logger.info("Mapping row #%s.", row.line_number)
-                try:
-                    record = get_marc_server_strategy(typing.cast(str, mmsid))
-                except GetMarcRetrievalError as e:
-                    logger.error(
-                        "Unable to access marc information from row #%s. Reason: %s",
-                        row.line_number,
-                        e,
-                    )
-                    new_rows.append(row.entry)
-                    raise NonFatalMergingRowError(
-                        f"Unable to merge data from row #{row.line_number}"
-                    )
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
 
-            merged_row: Dict[str, str] = row.entry.copy()
-            merger = MergeRowData(record)
-            merger.serialize_value_strategy = serialization_base_on_config
-            merger.enable_experimental_features = enable_experimental_features
-            for mapped_source_key, mapping_configuration in mapping.items():
-                # Don't fail if the mapper contains extra keys, just warn the user
-                # about it once.
-                if mapped_source_key not in row.entry:
-                    if mapped_source_key not in warned_extra_keys:
-                        warned_extra_keys.add(mapped_source_key)
-                        logger.warning(
-                            'Mapping contains key not found in table: "%s"',
-                            mapped_source_key,
-                        )
-                    continue
-
-                # Optimization: if there is already data and existing_data is
-                # set to ignored anyway, skip this key and move on to the next
-                # one
-                try:
-                    merger.merge_row_data(
-                        mapped_source_key,
-                        merged_row,
-                        mapping_configuration,
-                        row.line_number,
-                    )
-                except SerialzationError as e:
-                    raise SerialzationError(
-                        f'Tried to serialize line {row.line_number}, column "{mapped_source_key}" of tsv file. {str(e)}'
-                    ) from e
-            new_rows.append(merged_row)
-        except NonFatalMergingRowError as e:
-            non_fatal_errors.append(str(e))
+    memo: Dict[str, concurrent.futures.Future[R]] = {}
+    remaining = dict(key_counts) if key_counts is not None else None
 
-    if non_fatal_errors:
-        errors_list = "\n".join([f"* {e}" for e in non_fatal_errors])
-        logger.error(
-            f"The following error(s) occured while trying to merge data.\n{errors_list}"
+    def _release(key: Optional[str]) -> None:
+        if key is None or remaining is None or key not in remaining:
+            return
+        remaining[key] -= 1
+        if remaining[key] <= 0:
+            del remaining[key]
+            memo.pop(key, None)
+
+    window: collections.deque[
+        Tuple[T, Optional[str], Optional[concurrent.futures.Future[R]]]
+    ] = collections.deque()
+    executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    if max_concurrency == 1:
+        max_window_size = 1
+
+        def submit(key: str) -> concurrent.futures.Future[R]:
+            return _fetch_now(fetch, key)
+
+    else:
+        max_window_size = max_concurrency * 2
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="galatea-fetch"
         )
-        raise NonFatalMergingRowError(recovered_data=new_rows)
-    return new_rows
 
+        def submit(key: str) -> concurrent.futures.Future[R]:
+            return typing.cast(
+                concurrent.futures.ThreadPoolExecutor, executor
+            ).submit(fetch, key)
 
-def write_new_rows_to_file(
-    rows: List[Dict[str, str]],
+    def _next_ready() -> Tuple[T, Optional[concurrent.futures.Future[R]]]:
+        ready_item, ready_key, ready_future = window.popleft()
+        _release(ready_key)
+        return ready_item, ready_future
+
+    try:
+        for item in items:
+            key = record_key(item)
+            future = None
+            if key is not None:
+                if key not in memo:
+                    memo[key] = submit(key)
+                future = memo[key]
+            window.append((item, key, future))
+            while len(window) >= max_window_size:
+                yield _next_ready()
+        while window:
+            yield _next_ready()
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def row_needs_record(
+    row: Dict[str, str], mapping: Mapping[str, MappingConfig]
+) -> bool:
+    """Check if merging a record could change any column of a row.
+
+    A column cannot change if it already has data and its mapping is set to
+    keep existing data.
+
+    Args:
+        row: tsv row
+        mapping: mapping configuration for each column
+
+    Returns: False if every mapped column in the row would be kept as-is.
+
+    """
+    for key, config in mapping.items():
+        if key not in row:
+            continue
+        if not row[key] or config.existing_data != "keep":
+            return True
+    return False
+
+
+@dataclasses.dataclass
+class MergeSummary:
+    """Counts of what happened to the rows of a merge run."""
+
+    rows: int = 0
+    merged: int = 0
+    already_complete: int = 0
+    empty: int = 0
+    missing_identifier: int = 0
+    failed: int = 0
+    distinct_records: int = 0
+
+    def __str__(self) -> str:
+        """Summarize the merge run."""
+        return (
+            f"Merge summary: {self.rows} row(s) read. "
+            f"{self.merged} merged using {self.distinct_records} distinct "
+            f"record(s), {self.already_complete} skipped because every mapped "
+            f"column already had data to keep, {self.empty} empty, "
+            f"{self.missing_identifier} without an identifier and "
+            f"{self.failed} failed."
+        )
+
+
+class MergedRow(typing.NamedTuple):
+    """Row of the table after merging it with its record."""
+
+    line_number: int
+    entry: Dict[str, str]
+    failed_identifier: Optional[str] = None
+    original: Optional[Dict[str, str]] = None
+    """Row as it was read, if it was merged."""
+
+
+def iter_merged_rows_from_getmarc(
+    mapping_file_fp: BinaryIO,
+    input_metadata_tsv_fp: TextIO,
+    get_marc_server_strategy: Callable[[str], MARC_RECORD],
     dialect: Union[Type[csv.Dialect], csv.Dialect],
-    fp: TextIO,
-    dict_writer: Type[csv.DictWriter] = csv.DictWriter,
-) -> None:
-    field_names = rows[0].keys()
-    # Just make sure that every row has the same keys
-    if all([r.keys() == rows[0].keys() for r in rows]) is False:
-        raise ValueError("Not all row have the same keys")
+    enable_experimental_features: bool = False,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    jinja_bytecode_cache_dir: Optional[pathlib.Path] = None,
+    start_after_line: int = 0,
+    only_identifiers: Optional[Collection[str]] = None,
+    on_records_planned: Optional[Callable[[List[str]], None]] = None,
+    on_mapping_planned: Optional[Callable[[MappingPlan], None]] = None,
+) -> Iterator[MergedRow]:
+    """Merge the rows of a table with their records as they are read.
+
+    Rows are yielded in the order of the table as soon as they are merged,
+    so the table never has to be held in memory. Rows that could not be
+    merged because their record was not available are yielded unchanged
+    with the identifier that failed.
 
-    writer = dict_writer(fp, fieldnames=field_names, dialect=dialect)
-    writer.writeheader()
-    for row in rows:
-        try:
-            writer.writerow(row)
-        except csv.Error as e:
-            logger.error(f"Failed to write: {row}")
-            raise GalateaException("Unable to write row") from e
+    Args:
+        mapping_file_fp: mapping toml file opened in binary mode
+        input_metadata_tsv_fp: table to merge
+        get_marc_server_strategy: function to get the record of an MMS ID
+        dialect: dialect of the table
+        enable_experimental_features: enable experimental features
+        max_concurrency: maximum number of records requested at the same
+            time
+        jinja_bytecode_cache_dir: folder to keep compiled Jinja templates
+            between runs
+        start_after_line: skip the rows up to and including this line
+            number, such as when resuming an interrupted merge
+        only_identifiers: only merge the rows with one of these
+            identifiers. Other rows are yielded unchanged.
+        on_records_planned: called with the MMS IDs of the records needed,
+            in the order they are first needed, before any is fetched
+        on_mapping_planned: called with the mapping plan once the mapping
+            file is read, before any record is fetched
+
+    Yields: merged rows
 
+    """
+    plan = read_mapping_plan(
+        mapping_file_fp, jinja_bytecode_cache_dir=jinja_bytecode_cache_dir
+    )
+    if on_mapping_planned is not None:
+        on_mapping_planned(plan)
+    merger = _RowMerger(plan, enable_experimental_features, only_identifiers)
 
-def merge_from_getmarc(
+    if start_after_line:
+        logger.info("Resuming after line %d.", start_after_line)
+
+    # Count the rows using each record ahead of time, so each distinct record
+    # is only fetched once and can be released after its last row.
+    key_counts = merger.count_record_keys(
+        _iter_rows_after(input_metadata_tsv_fp, dialect, start_after_line)
+    )
+    if on_records_planned is not None:
+        on_records_planned(list(key_counts))
+
+    def _fetch_record_index(mmsid: str) -> MarcRecordIndex:
+        # Every row sharing this record also shares the index, so the record
+        # is only walked once no matter how many rows or columns use it.
+        return as_record_index(get_marc_server_strategy(mmsid))
+
+    rows = _iter_rows_after(input_metadata_tsv_fp, dialect, start_after_line)
+    prefetched_rows = iter_with_prefetched_records(
+        rows,
+        record_key=merger.record_key,
+        fetch=_fetch_record_index,
+        max_concurrency=max_concurrency,
+        key_counts=key_counts,
+    )
+    # Close the readers explicitly, so they are never left to be cleaned up
+    # after the table they read has been closed.
+    with contextlib.closing(rows), contextlib.closing(prefetched_rows):
+        for row, pending_record in prefetched_rows:
+            yield merger.merge(row, pending_record)
+
+    logger.info(str(merger.summary))
+
+
+async def amerge_from_getmarc(
     input_metadata_tsv_file: pathlib.Path,
-    output_metadata_tsv_file: pathlib.Path,
     mapping_file: pathlib.Path,
-    get_marc_server: str,
-    row_merge_data_strategy: Callable[
-        [
-            BinaryIO,
-            TextIO,
-            Callable[[str], ET.Element],
-            Union[Type[csv.Dialect], csv.Dialect],
-            bool,
-        ],
-        List[Dict[str, str]],
-    ] = merge_data_from_getmarc,
-    write_to_file_strategy: Callable[
-        [List[Dict[str, str]], Union[Type[csv.Dialect], csv.Dialect], TextIO],
-        None,
-    ] = write_new_rows_to_file,
+    get_marc_server: Optional[Union[str, Sequence[str]]] = None,
+    fetch: Optional[aio.AsyncStrategy[MARC_RECORD]] = None,
     enable_experimental_features: bool = False,
-) -> None:
-    """Merge data from GetMARC server into a TSV file using a mapping file.
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    client: Optional[getmarc.GetMarcClient] = None,
+) -> AsyncIterator[MergedRow]:
+    """Merge the rows of a TSV file with their records from an event loop.
+
+    The asyncio counterpart of iter_merged_rows_from_getmarc. Records are
+    fetched with an async strategy as tasks on the running loop, so many
+    merges can share the same loop. Rows are yielded in the order of the
+    table as soon as they are merged. Writing them is up to the caller.
 
     Args:
         input_metadata_tsv_file: Source TSV file to be merged with.
-        output_metadata_tsv_file: Output TSV file to be created or overwritten.
         mapping_file: Mapping file to be used for merging.
-        get_marc_server: url of the GetMARC server.
-        row_merge_data_strategy: strategy to create new rows from GetMARC
-            server and input tsv file.
-        write_to_file_strategy: strategy to write new rows to the output file.
-        enable_experimental_features: enable experimental features that are not
+        get_marc_server: url of the GetMARC server, or the urls of replicas
+            of it. Only used when neither fetch nor client is given.
+        fetch: coroutine function getting the record of an MMS ID, such as
+            one using an async HTTP client. Defaults to requesting the
+            records with client in worker threads.
+        enable_experimental_features: enable experimental features.
+        max_concurrency: maximum number of records requested at the same
+            time.
+        client: client used to request records when fetch is not given.
+            Sharing a client between merges also shares its connection
+            pool. Defaults to a client for get_marc_server that only keeps
+            the data fields used by the mapping file, closed once the merge
+            is done.
+
+    Yields: merged rows. Rows that could not be merged because their record
+        was not available are yielded unchanged with the identifier that
+        failed.
 
     """
-    successful_with_no_issues = True
+    with mapping_file.open("rb") as mapping_file_fp:
+        try:
+            plan = read_mapping_plan(mapping_file_fp)
+        except BadMappingDataError as mapping_data_error:
+            raise BadMappingFileError(
+                source_file=mapping_file, details=mapping_data_error.details
+            ) from mapping_data_error
+    owned_client: Optional[getmarc.GetMarcClient] = None
+    if fetch is None:
+        if client is None:
+            if get_marc_server is None:
+                raise ValueError(
+                    "get_marc_server, fetch or client is required"
+                )
+            owned_client = client = getmarc.GetMarcClient(
+                get_marc_server,
+                pool_size=max(getmarc.DEFAULT_POOL_SIZE, max_concurrency),
+                parse=getmarc.RecordFieldParser(plan.marc_tags),
+            )
+        fetch = aio.to_async_strategy(client.get_record)
+    record_strategy = fetch
+
+    async def _fetch_record_index(mmsid: str) -> MarcRecordIndex:
+        return as_record_index(await record_strategy(mmsid))
+
+    merger = _RowMerger(plan, enable_experimental_features)
+
+    def _count_record_keys() -> "collections.Counter[str]":
+        with input_metadata_tsv_file.open("r", encoding="utf-8") as fp:
+            return merger.count_record_keys(
+                _iter_rows_after(fp, tsv.get_tsv_dialect(fp), 0)
+            )
+
     try:
+        # Reading the whole table is left to a thread, so the loop is free
+        # for other work in the meantime.
+        key_counts = await asyncio.to_thread(_count_record_keys)
+        with input_metadata_tsv_file.open("r", encoding="utf-8") as fp:
+            rows = _iter_rows_after(fp, tsv.get_tsv_dialect(fp), 0)
+            prefetched_rows = aio.aiter_with_prefetched(
+                rows,
+                key=merger.record_key,
+                fetch=_fetch_record_index,
+                max_concurrency=max_concurrency,
+                key_counts=key_counts,
+            )
+            async with contextlib.aclosing(prefetched_rows):
+                async for row, pending_record in prefetched_rows:
+                    yield merger.merge(row, pending_record)
+        logger.info(str(merger.summary))
+    finally:
+        if owned_client is not None:
+            owned_client.close()
+
+
+def _iter_rows_after(
+    fp: TextIO,
+    dialect: Union[Type[csv.Dialect], csv.Dialect, str],
+    start_after_line: int,
+) -> Generator[TableRow[Dict[str, str]], None, None]:
+    table_rows: Iterable[TableRow[Dict[str, str]]] = tsv.iter_tsv_fp(
+        fp, dialect=dialect
+    )
+    for row in table_rows:
+        if row.line_number > start_after_line:
+            yield row
+
+
+class _PendingRecord(typing.Protocol):
+    def result(self) -> MarcRecordIndex: ...
+
+
+class _RowMerger:
+    """Merge rows one at a time with records that were fetched ahead.
+
+    Shared by the threaded and the asyncio merges, which only differ in how
+    the records are fetched.
+    """
+
+    def __init__(
+        self,
+        plan: MappingPlan,
+        enable_experimental_features: bool = False,
+        only_identifiers: Optional[Collection[str]] = None,
+    ) -> None:
+        self.plan = plan
+        self.enable_experimental_features = enable_experimental_features
+        self.only_identifiers = only_identifiers
+        self.summary = MergeSummary()
+        self.key_counts: Mapping[str, int] = {}
+        self._announced_keys: typing.Set[str] = set()
+        self._warned_extra_keys: typing.Set[str] = set()
+
+    def is_excluded(self, row: TableRow[Dict[str, str]]) -> bool:
+        return (
+            self.only_identifiers is not None
+            and row.entry.get(self.plan.identifier_key)
+            not in self.only_identifiers
+        )
+
+    def record_key(self, row: TableRow[Dict[str, str]]) -> Optional[str]:
+        if self.is_excluded(row) or is_row_empty(row.entry):
+            return None
+        if not row_needs_record(row.entry, self.plan.configs):
+            return None
+        return row.entry[self.plan.identifier_key] or None
+
+    def count_record_keys(
+        self, rows: Iterable[TableRow[Dict[str, str]]]
+    ) -> "collections.Counter[str]":
+        key_counts = collections.Counter(
+            key for key in map(self.record_key, rows) if key is not None
+        )
+        self.key_counts = key_counts
+        self.summary.distinct_records = len(key_counts)
+        logger.info(
+            "Found %d distinct record(s) to merge for %d row(s).",
+            len(key_counts),
+            key_counts.total(),
+        )
+        return key_counts
+
+    def merge(
+        self,
+        row: TableRow[Dict[str, str]],
+        pending_record: Optional[_PendingRecord],
+    ) -> MergedRow:
+        """Merge a row with its record once the record has been fetched."""
+        mapping = self.plan.configs
+        identifier_key = self.plan.identifier_key
+        summary = self.summary
+        if self.is_excluded(row):
+            return MergedRow(row.line_number, row.entry)
+        summary.rows += 1
+        # Don't fail if the mapper contains extra keys, just warn the user
+        # about it once.
+        for mapped_source_key in mapping:
+            if (
+                mapped_source_key not in row.entry
+                and mapped_source_key not in self._warned_extra_keys
+            ):
+                self._warned_extra_keys.add(mapped_source_key)
+                logger.warning(
+                    'Mapping contains key not found in table: "%s"',
+                    mapped_source_key,
+                )
+        if is_row_empty(row.entry):
+            logger.warning("Row #%s is empty", row.line_number)
+            summary.empty += 1
+            return MergedRow(row.line_number, row.entry)
+        mmsid = row.entry[identifier_key]
+        if not mmsid:
+            logger.warning(
+                'Skipping row #%d because the "%s" field is empty',
+                row.line_number,
+                identifier_key,
+            )
+            summary.missing_identifier += 1
+            return MergedRow(row.line_number, row.entry)
+        if pending_record is None:
+            logger.info(
+                "Skipping row #%s because every mapped column already "
+                "has data to keep.",
+                row.line_number,
+            )
+            summary.already_complete += 1
+            return MergedRow(row.line_number, row.entry)
+        if mmsid not in self._announced_keys:
+            self._announced_keys.add(mmsid)
+            logger.info(
+                "Mapping row #%s. Record %d of %d.",
+                row.line_number,
+                len(self._announced_keys),
+                len(self.key_counts),
+            )
+        else:
+            logger.info(
+                "Mapping row #%s. Reusing record %s.",
+                row.line_number,
+                mmsid,
+            )
+        try:
+            record = pending_record.result()
+        except RECORD_UNAVAILABLE_ERRORS as e:
+            logger.error(
+                "Unable to access marc information from row #%s. Reason: %s",
+                row.line_number,
+                e,
+            )
+            summary.failed += 1
+            return MergedRow(
+                row.line_number, row.entry, failed_identifier=mmsid
+            )
+        merged_row: Dict[str, str] = row.entry.copy()
+        merger = MergeRowData(record)
+        merger.serialize_value_strategy = self.plan.serialize
+        merger.enable_experimental_features = self.enable_experimental_features
+        for mapped_source_key, mapping_configuration in mapping.items():
+            if mapped_source_key not in row.entry:
+                continue
+            try:
+                merger.merge_row_data(
+                    mapped_source_key,
+                    merged_row,
+                    mapping_configuration,
+                    row.line_number,
+                )
+            except SerialzationError as e:
+                raise SerialzationError(
+                    f'Tried to serialize line {row.line_number}, column "{mapped_source_key}" of tsv file. {str(e)}'
+                ) from e
+        summary.merged += 1
+        return MergedRow(row.line_number, merged_row, original=row.entry)
+
+
+def get_lookup_key(mapping_data: Dict[str, typing.Any]) -> str:
+    """Get the column of the lookup table matching the identifier key.
+
+    Defaults to the identifier key when the mapping file does not set a
+    "lookup_key" in its [mappings] section.
+    """
+    return mapping_data["mappings"].get(
+        "lookup_key", _get_identifier_key(mapping_data)
+    )
+
+
+def iter_joined_rows_from_tsv(
+    mapping_file_fp: BinaryIO,
+    input_metadata_tsv_fp: TextIO,
+    get_lookup_row: Callable[[str], Optional[Mapping[str, str]]],
+    dialect: Union[Type[csv.Dialect], csv.Dialect],
+    enable_experimental_features: bool = False,
+    start_after_line: int = 0,
+) -> Iterator[MergedRow]:
+    """Join the rows of a table with the rows of a lookup table.
+
+    The table is read once and each row is joined with the row of the lookup
+    table having the same identifier. The columns of the lookup row listed
+    in "matching_columns" are merged into the mapped column, following its
+    "existing_data" setting. Rows without a matching lookup row are yielded
+    unchanged with the identifier that failed.
+
+    Args:
+        mapping_file_fp: mapping toml file opened in binary mode
+        input_metadata_tsv_fp: table to merge
+        get_lookup_row: function to get the lookup row of an identifier, or
+            None if there is not one
+        dialect: dialect of the table
+        enable_experimental_features: enable experimental features
+        start_after_line: skip the rows up to and including this line
+            number, such as when resuming an interrupted merge
+
+    Yields: merged rows
+
+    """
+    mapping_data = _load_mapping_toml(mapping_file_fp)
+    identifier_key = _get_identifier_key(mapping_data)
+    mapping = _get_mapping_configs(
+        mapping_data, map_tsv_mapping_to_mapping_config
+    )
+    summary = MergeSummary()
+    joined_keys = set()
+    warned_missing_columns = set()
+
+    def _serialize_lookup_columns(
+        lookup_row: Mapping[str, str], config: MappingConfig, _: bool
+    ) -> Optional[str]:
+        values = []
+        for column in config.matching_keys:
+            if column not in lookup_row:
+                if column not in warned_missing_columns:
+                    warned_missing_columns.add(column)
+                    logger.warning(
+                        'Mapping contains column not found in lookup table: "%s"',
+                        column,
+                    )
+                continue
+            value = (lookup_row[column] or "").strip()
+            if value:
+                values.append(value)
+        return config.delimiter.join(values) or None
+
+    table_rows: Iterable[TableRow[Dict[str, str]]] = tsv.iter_tsv_fp(
+        input_metadata_tsv_fp, dialect=dialect
+    )
+    for row in table_rows:
+        if row.line_number <= start_after_line:
+            continue
+        summary.rows += 1
+        if is_row_empty(row.entry):
+            summary.empty += 1
+            yield MergedRow(row.line_number, row.entry)
+            continue
+        key = (row.entry.get(identifier_key) or "").strip()
+        if not key:
+            logger.warning(
+                'Skipping row #%d because the "%s" field is empty',
+                row.line_number,
+                identifier_key,
+            )
+            summary.missing_identifier += 1
+            yield MergedRow(row.line_number, row.entry)
+            continue
+        if not row_needs_record(row.entry, mapping):
+            summary.already_complete += 1
+            yield MergedRow(row.line_number, row.entry)
+            continue
+        lookup_row = get_lookup_row(key)
+        if lookup_row is None:
+            logger.error(
+                'Unable to join row #%s. "%s" is not in the lookup table.',
+                row.line_number,
+                key,
+            )
+            summary.failed += 1
+            yield MergedRow(row.line_number, row.entry, failed_identifier=key)
+            continue
+        joined_keys.add(key)
+        merged_row = row.entry.copy()
+        # The lookup row takes the place of a MARC record. Only the serialize
+        # strategy reads it.
+        merger = MergeRowData(typing.cast(MARC_RECORD, lookup_row))
+        merger.serialize_value_strategy = _serialize_lookup_columns  # type: ignore[assignment]
+        merger.enable_experimental_features = enable_experimental_features
+        for mapped_source_key, mapping_configuration in mapping.items():
+            if mapped_source_key not in merged_row:
+                continue
+            merger.merge_row_data(
+                mapped_source_key,
+                merged_row,
+                mapping_configuration,
+                row.line_number,
+            )
+        summary.merged += 1
+        summary.distinct_records = len(joined_keys)
+        yield MergedRow(row.line_number, merged_row, original=row.entry)
+
+    logger.info(str(summary))
+
+
+def merge_data_from_getmarc(
+    mapping_file_fp: BinaryIO,
+    input_metadata_tsv_fp: TextIO,
+    get_marc_server_strategy: Callable[[str], ET.Element],
+    dialect: Union[Type[csv.Dialect], csv.Dialect],
+    enable_experimental_features: bool = False,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    jinja_bytecode_cache_dir: Optional[pathlib.Path] = None,
+) -> List[Dict[str, Union[str, str]]]:
+    non_fatal_errors = []
+    new_rows: List[Dict[str, str]] = []
+    for merged_row in iter_merged_rows_from_getmarc(
+        mapping_file_fp,
+        input_metadata_tsv_fp,
+        get_marc_server_strategy,
+        dialect,
+        enable_experimental_features,
+        max_concurrency=max_concurrency,
+        jinja_bytecode_cache_dir=jinja_bytecode_cache_dir,
+    ):
+        new_rows.append(merged_row.entry)
+        if merged_row.failed_identifier is not None:
+            non_fatal_errors.append(
+                f"Unable to merge data from row #{merged_row.line_number}"
+            )
+
+    if non_fatal_errors:
+        errors_list = "\n".join([f"* {e}" for e in non_fatal_errors])
+        logger.error(
+            f"The following error(s) occured while trying to merge data.\n{errors_list}"
+        )
+        raise NonFatalMergingRowError(recovered_data=new_rows)
+    return new_rows
+
+
+def write_new_rows_to_file(
+    rows: Iterable[Dict[str, str]],
+    dialect: Union[Type[csv.Dialect], csv.Dialect],
+    fp: TextIO,
+    dict_writer: Type[csv.DictWriter] = csv.DictWriter,
+    write_header: bool = True,
+) -> None:
+    row_iterator = iter(rows)
+    first_row = next(row_iterator, None)
+    if first_row is None:
+        return
+    field_names = first_row.keys()
+    writer = dict_writer(fp, fieldnames=field_names, dialect=dialect)
+    if write_header:
+        writer.writeheader()
+    for row in itertools.chain([first_row], row_iterator):
+        # Just make sure that every row has the same keys
+        if row.keys() != field_names:
+            raise ValueError("Not all row have the same keys")
+        try:
+            writer.writerow(row)
+        except csv.Error as e:
+            logger.error(f"Failed to write: {row}")
+            raise GalateaException("Unable to write row") from e
+
+
+def iter_checkpointed_rows(
+    rows: Iterable[MergedRow],
+    output_fp: TextIO,
+    journal: merge_journal.MergeJournal,
+    checkpoint: merge_journal.MergeCheckpoint,
+    checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL,
+    row_outputs: Callable[
+        [MergedRow], Iterable[Dict[str, str]]
+    ] = lambda merged_row: (merged_row.entry,),
+) -> Iterator[Dict[str, str]]:
+    """Pass merged rows on to be written, saving checkpoints along the way.
+
+    A row is only considered written once the next one is requested, so a
+    checkpoint never includes a row that is still waiting to be written.
+
+    Args:
+        rows: merged rows
+        output_fp: file the rows are written to
+        journal: journal to save the checkpoints to
+        checkpoint: progress of the merge, updated in place
+        checkpoint_interval: number of rows between checkpoints
+        row_outputs: rows to write for each merged row. Defaults to the
+            entry of the merged row.
+
+    Yields: rows to write
+
+    """
+
+    def _save() -> None:
+        output_fp.flush()
+        checkpoint.output_offset = output_fp.tell()
+        journal.save(checkpoint)
+
+    # A record used by several rows is only recorded once.
+    failed = set(checkpoint.failed_identifiers)
+    uncommitted = 0
+    for merged_row in rows:
+        yield from row_outputs(merged_row)
+        checkpoint.last_line_number = merged_row.line_number
+        if (
+            merged_row.failed_identifier is not None
+            and merged_row.failed_identifier not in failed
+        ):
+            failed.add(merged_row.failed_identifier)
+            checkpoint.failed_identifiers.append(merged_row.failed_identifier)
+        uncommitted += 1
+        if uncommitted >= checkpoint_interval:
+            _save()
+            uncommitted = 0
+    _save()
+
+
+def iter_merged_row_changes(
+    merged_row: MergedRow, identifier_key: str
+) -> Iterator[delta.CellChange]:
+    """Iterate over the cells changed by merging a row.
+
+    Args:
+        merged_row: merged row
+        identifier_key: column identifying the row
+
+    Yields: changed cells. Rows that were not merged have none.
+
+    """
+    if merged_row.original is None:
+        return
+    yield from delta.iter_cell_changes(
+        merged_row.line_number,
+        merged_row.original,
+        merged_row.entry,
+        identifier_key,
+    )
+
+
+def _iter_entry_rows(merged_row: MergedRow) -> Iterator[Dict[str, str]]:
+    yield merged_row.entry
+
+
+def _iter_delta_rows(
+    merged_row: MergedRow, identifier_key: str
+) -> Iterator[Dict[str, str]]:
+    for change in iter_merged_row_changes(merged_row, identifier_key):
+        yield change.as_row()
+
+
+@dataclasses.dataclass(frozen=True)
+class RetryPolicy:
+    """How records that failed to be fetched are retried after a merge."""
+
+    rounds: int = DEFAULT_RETRY_ROUNDS
+    backoff: float = DEFAULT_RETRY_BACKOFF
+    sleep: Callable[[float], None] = time.sleep
+
+    def get_backoff(self, round_number: int) -> float:
+        """Get the seconds to wait before a round, starting from 1."""
+        return self.backoff * (2 ** (round_number - 1))
+
+
+def retry_failed_records(
+    identifiers: Iterable[str],
+    fetch: Callable[[str], MARC_RECORD],
+    policy: RetryPolicy,
+) -> Tuple[Dict[str, MarcRecordIndex], List[str]]:
+    """Try again to fetch records that failed during a merge.
+
+    Every record still failing is retried in each round, waiting longer
+    before each round.
+
+    Args:
+        identifiers: MMS IDs of the records that failed
+        fetch: function to get a record by its MMS ID
+        policy: number of rounds and backoff between them
+
+    Returns: records fetched by MMS ID, and the MMS IDs still failing
+
+    """
+    remaining = list(dict.fromkeys(identifiers))
+    recovered: Dict[str, MarcRecordIndex] = {}
+    for round_number in range(1, policy.rounds + 1):
+        if not remaining:
+            break
+        backoff = policy.get_backoff(round_number)
+        logger.info(
+            "Retrying %d record(s) that failed in %.1f second(s). "
+            "Round %d of %d.",
+            len(remaining),
+            backoff,
+            round_number,
+            policy.rounds,
+        )
+        policy.sleep(backoff)
+        still_failing = []
+        for mmsid in remaining:
+            try:
+                recovered[mmsid] = as_record_index(fetch(mmsid))
+            except RECORD_UNAVAILABLE_ERRORS as error:
+                logger.warning("Retrying %s failed. Reason: %s", mmsid, error)
+                still_failing.append(mmsid)
+        remaining = still_failing
+    return recovered, remaining
+
+
+def _merge_recovered_rows(
+    journal: merge_journal.MergeJournal,
+    checkpoint: merge_journal.MergeCheckpoint,
+    mapping_file: pathlib.Path,
+    dialect: Union[Type[csv.Dialect], csv.Dialect],
+    recovered: Dict[str, MarcRecordIndex],
+    enable_experimental_features: bool,
+) -> None:
+    # The rows that failed were written unchanged, so merging them now gives
+    # the same result as if their records had been available the first time.
+    retry_output_file = journal.partial_output_file.with_name(
+        f"{journal.partial_output_file.name}.retry"
+    )
+    with (
+        mapping_file.open("rb") as mapping_file_fp,
+        journal.partial_output_file.open("r", encoding="utf-8") as partial_fp,
+        retry_output_file.open("w", encoding="utf-8") as output_fp,
+    ):
+        write_new_rows_to_file(
+            (
+                merged_row.entry
+                for merged_row in iter_merged_rows_from_getmarc(
+                    mapping_file_fp,
+                    partial_fp,
+                    recovered.__getitem__,
+                    dialect,
+                    enable_experimental_features,
+                    only_identifiers=recovered.keys(),
+                )
+            ),
+            dialect,
+            output_fp,
+        )
+        output_fp.flush()
+        checkpoint.output_offset = output_fp.tell()
+    _replace_partial_output(journal, checkpoint, retry_output_file, recovered)
+
+
+def _merge_recovered_changes(
+    journal: merge_journal.MergeJournal,
+    checkpoint: merge_journal.MergeCheckpoint,
+    mapping_file: pathlib.Path,
+    input_metadata_tsv_file: pathlib.Path,
+    dialect: Union[Type[csv.Dialect], csv.Dialect],
+    recovered: Dict[str, MarcRecordIndex],
+    enable_experimental_features: bool,
+    identifier_key: str,
+) -> None:
+    # The rows that failed have no changes in the delta yet, so their changes
+    # are merged in line order with the changes already written.
+    retry_output_file = journal.partial_output_file.with_name(
+        f"{journal.partial_output_file.name}.retry"
+    )
+    with (
+        mapping_file.open("rb") as mapping_file_fp,
+        input_metadata_tsv_file.open("r", encoding="utf-8") as input_fp,
+        journal.partial_output_file.open(
+            "r", newline="", encoding="utf-8"
+        ) as partial_fp,
+        retry_output_file.open("w", newline="", encoding="utf-8") as output_fp,
+    ):
+        recovered_changes = (
+            change
+            for merged_row in iter_merged_rows_from_getmarc(
+                mapping_file_fp,
+                input_fp,
+                recovered.__getitem__,
+                dialect,
+                enable_experimental_features,
+                only_identifiers=recovered.keys(),
+            )
+            for change in iter_merged_row_changes(merged_row, identifier_key)
+        )
+        delta.write_changes_fp(
+            output_fp,
+            heapq.merge(
+                delta.read_changes_fp(
+                    partial_fp, source=str(journal.partial_output_file)
+                ),
+                recovered_changes,
+                key=operator.attrgetter("line_number"),
+            ),
+        )
+        output_fp.flush()
+        checkpoint.output_offset = output_fp.tell()
+    _replace_partial_output(journal, checkpoint, retry_output_file, recovered)
+
+
+def _replace_partial_output(
+    journal: merge_journal.MergeJournal,
+    checkpoint: merge_journal.MergeCheckpoint,
+    retry_output_file: pathlib.Path,
+    recovered: Dict[str, MarcRecordIndex],
+) -> None:
+    retry_output_file.replace(journal.partial_output_file)
+    checkpoint.failed_identifiers = [
+        mmsid
+        for mmsid in checkpoint.failed_identifiers
+        if mmsid not in recovered
+    ]
+    journal.save(checkpoint)
+
+
+def _open_partial_output(
+    journal: merge_journal.MergeJournal,
+    checkpoint: merge_journal.MergeCheckpoint,
+) -> TextIO:
+    if checkpoint.output_offset == 0:
+        return journal.partial_output_file.open("w", encoding="utf-8")
+    try:
+        with journal.partial_output_file.open("r+b") as partial_fp:
+            # Drop any rows written after the last checkpoint. They are
+            # merged again when resuming.
+            partial_fp.truncate(checkpoint.output_offset)
+    except FileNotFoundError as error:
+        raise merge_journal.JournalMismatchError(
+            journal.journal_file,
+            f"{journal.partial_output_file} is missing",
+        ) from error
+    return journal.partial_output_file.open("a", encoding="utf-8")
+
+
+def _load_checkpoint(
+    journal: merge_journal.MergeJournal,
+    input_metadata_tsv_file: pathlib.Path,
+    resume: bool,
+) -> merge_journal.MergeCheckpoint:
+    checkpoint = journal.load() if resume else None
+    if checkpoint is None:
+        if resume:
+            logger.info(
+                "No merge to resume was found for %s. Starting from the "
+                "beginning.",
+                journal.output_file,
+            )
+        return merge_journal.MergeCheckpoint(
+            input_file=str(input_metadata_tsv_file)
+        )
+    if checkpoint.input_file != str(input_metadata_tsv_file):
+        raise merge_journal.JournalMismatchError(
+            journal.journal_file,
+            f"It was written for {checkpoint.input_file}",
+        )
+    logger.info(
+        "Resuming merge into %s after line %d.",
+        journal.output_file,
+        checkpoint.last_line_number,
+    )
+    return checkpoint
+
+
+def _merge_into_partial_output(
+    input_metadata_tsv_file: pathlib.Path,
+    output_metadata_tsv_file: pathlib.Path,
+    mapping_file: pathlib.Path,
+    record_strategy: Callable[[str], typing.Any],
+    row_merge_data_strategy: Callable[..., Iterable[MergedRow]],
+    write_to_file_strategy: Callable[..., None],
+    enable_experimental_features: bool,
+    resume: bool,
+    checkpoint_interval: int,
+    retry_policy: RetryPolicy,
+    row_options: Mapping[str, typing.Any],
+    delta_output: bool = False,
+) -> Tuple[merge_journal.MergeJournal, merge_journal.MergeCheckpoint]:
+    journal = merge_journal.MergeJournal(output_metadata_tsv_file)
+    checkpoint = _load_checkpoint(journal, input_metadata_tsv_file, resume)
+    write_header = checkpoint.output_offset == 0
+    row_outputs: Callable[[MergedRow], Iterable[Dict[str, str]]] = (
+        _iter_entry_rows
+    )
+    try:
+        if delta_output:
+            identifier_key = get_identifier_key(mapping_file)
+            row_outputs = functools.partial(
+                _iter_delta_rows, identifier_key=identifier_key
+            )
         with input_metadata_tsv_file.open(
             "r", encoding="utf-8"
         ) as input_metadata_tsv_file_fp:
             dialect = tsv.get_tsv_dialect(input_metadata_tsv_file_fp)
-            with mapping_file.open("rb") as mapping_file_fp:
+            with (
+                mapping_file.open("rb") as mapping_file_fp,
+                _open_partial_output(journal, checkpoint) as output_fp,
+            ):
+                merged_rows = row_merge_data_strategy(
+                    mapping_file_fp,
+                    input_metadata_tsv_file_fp,
+                    record_strategy,
+                    dialect,
+                    enable_experimental_features,
+                    start_after_line=checkpoint.last_line_number,
+                    **row_options,
+                )
                 try:
-                    new_rows = row_merge_data_strategy(
-                        mapping_file_fp,
-                        input_metadata_tsv_file_fp,
-                        functools.partial(
-                            get_matching_marc_data,
-                            get_marc_server=get_marc_server,
+                    write_to_file_strategy(
+                        iter_checkpointed_rows(
+                            merged_rows,
+                            output_fp,
+                            journal,
+                            checkpoint,
+                            checkpoint_interval=checkpoint_interval,
+                            row_outputs=row_outputs,
                         ),
-                        dialect,
-                        enable_experimental_features,
+                        delta.DELTA_DIALECT if delta_output else dialect,
+                        output_fp,
+                        write_header=write_header,
                     )
-                except NonFatalMergingRowError as e:
-                    new_rows = e.recovered_data
-                    successful_with_no_issues = False
+                finally:
+                    # Stop merging before the files it reads are closed.
+                    close_merged_rows = getattr(merged_rows, "close", None)
+                    if close_merged_rows is not None:
+                        close_merged_rows()
+        if checkpoint.failed_identifiers:
+            recovered, _ = retry_failed_records(
+                checkpoint.failed_identifiers, record_strategy, retry_policy
+            )
+            if recovered and delta_output:
+                _merge_recovered_changes(
+                    journal,
+                    checkpoint,
+                    mapping_file,
+                    input_metadata_tsv_file,
+                    dialect,
+                    recovered,
+                    enable_experimental_features,
+                    identifier_key,
+                )
+            elif recovered:
+                _merge_recovered_rows(
+                    journal,
+                    checkpoint,
+                    mapping_file,
+                    dialect,
+                    recovered,
+                    enable_experimental_features,
+                )
     except BadMappingDataError as mapping_data_error:
         raise BadMappingFileError(
             source_file=mapping_file, details=mapping_data_error.details
         ) from mapping_data_error
+    return journal, checkpoint
 
-    with output_metadata_tsv_file.open("w", encoding="utf-8") as f:
-        write_to_file_strategy(new_rows, dialect, f)
 
-    if not successful_with_no_issues:
+def _finish_merge(
+    journal: merge_journal.MergeJournal,
+    checkpoint: merge_journal.MergeCheckpoint,
+    source_name: str,
+) -> None:
+    journal.finish()
+    if checkpoint.failed_identifiers:
+        errors_list = "\n".join(
+            f"* {identifier}" for identifier in checkpoint.failed_identifiers
+        )
+        logger.error(
+            "Unable to merge data for the following identifier(s).\n%s",
+            errors_list,
+        )
         raise CommandFinishedWithException(
-            f"Unable to complete merge data from GetMARC. "
-            f"{output_metadata_tsv_file} was written to the best it could."
+            f"Unable to complete merge data from {source_name}. "
+            f"{journal.output_file} was written to the best it could."
+        )
+
+
+def merge_from_getmarc(
+    input_metadata_tsv_file: pathlib.Path,
+    output_metadata_tsv_file: pathlib.Path,
+    mapping_file: pathlib.Path,
+    get_marc_server: Union[str, Sequence[str]],
+    row_merge_data_strategy: Callable[
+        ...,
+        Iterable[MergedRow],
+    ] = iter_merged_rows_from_getmarc,
+    write_to_file_strategy: Callable[
+        ...,
+        None,
+    ] = write_new_rows_to_file,
+    enable_experimental_features: bool = False,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    cache: Optional[record_cache.MarcRecordCache] = None,
+    refresh_cache: bool = False,
+    offline: bool = False,
+    resume: bool = False,
+    checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL,
+    client: Optional[getmarc.GetMarcClient] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+    batch_size: int = 1,
+    delta_output: bool = False,
+) -> None:
+    """Merge data from GetMARC server into a TSV file using a mapping file.
+
+    Merged rows are written to a partial output file as they are merged,
+    with a journal of the progress next to it. The output file is only
+    replaced once every row has been written.
+
+    Args:
+        input_metadata_tsv_file: Source TSV file to be merged with.
+        output_metadata_tsv_file: Output TSV file to be created or overwritten.
+        mapping_file: Mapping file to be used for merging.
+        get_marc_server: url of the GetMARC server, or the urls of replicas
+            of it to spread the requests between.
+        row_merge_data_strategy: strategy to create new rows from GetMARC
+            server and input tsv file.
+        write_to_file_strategy: strategy to write new rows to the output file.
+        enable_experimental_features: enable experimental features that are not
+        max_concurrency: maximum number of records requested from the
+            GetMARC server at the same time.
+        cache: optional local cache of records to use before requesting
+            them from the GetMARC server. Compiled Jinja templates are also
+            kept in the cache folder.
+        refresh_cache: ignore records in the cache and request them again.
+        offline: only use records found in the cache.
+        resume: continue an interrupted merge from its journal.
+        checkpoint_interval: number of rows written between updates of the
+            journal.
+        client: client used to request records from the GetMARC server.
+            Defaults to a client for get_marc_server with the default
+            timeouts and retries. Unless a cache is used, a client parsing
+            records with a getmarc.RecordFieldParser, as the default client
+            does, only keeps the data fields used by the mapping file.
+        retry_policy: how records that failed to be fetched are retried
+            once every row has been merged. Defaults to RetryPolicy().
+            Records are never retried when offline, as the cache does not
+            change during a run.
+        batch_size: number of records requested from the GetMARC server
+            with a single request. The server must support requesting a
+            comma separated list of MMS IDs.
+        delta_output: write only the cells changed by the merge to
+            output_metadata_tsv_file, as a delta that can be applied with
+            galatea.delta.apply_delta, instead of the whole table.
+
+    """
+    if cache is None and (offline or refresh_cache):
+        raise ValueError("offline and refresh_cache require a cache")
+    if offline:
+        retry_policy = RetryPolicy(rounds=0)
+    field_parser: Optional[getmarc.RecordFieldParser] = None
+    if client is None:
+        # Cached records are kept whole, so that they can be used with any
+        # mapping. Otherwise, only the fields used by the mapping are parsed.
+        if cache is None:
+            field_parser = getmarc.RecordFieldParser()
+        client = getmarc.GetMarcClient(
+            get_marc_server,
+            pool_size=max(getmarc.DEFAULT_POOL_SIZE, max_concurrency),
+            parse=field_parser or getmarc.parse_record,
+        )
+    elif cache is None and isinstance(client.parse, getmarc.RecordFieldParser):
+        field_parser = client.parse
+    get_marc_server_strategy: Callable[[str], ET.Element] = client.get_record
+    batching_strategy: Optional[getmarc.BatchingRecordStrategy] = None
+    if batch_size > 1:
+        batching_strategy = getmarc.BatchingRecordStrategy(
+            client.get_records,
+            batch_size,
+            should_fetch=(
+                (lambda mmsid: not cache.contains(mmsid))
+                if cache is not None and not refresh_cache
+                else (lambda _: True)
+            ),
+        )
+        get_marc_server_strategy = batching_strategy
+    cached_strategy: Optional[record_cache.CachedRecordStrategy] = None
+    if cache is not None:
+        cached_strategy = record_cache.CachedRecordStrategy(
+            get_marc_server_strategy,
+            cache,
+            refresh=refresh_cache,
+            offline=offline,
+        )
+        get_marc_server_strategy = cached_strategy
+    try:
+        journal, checkpoint = _merge_into_partial_output(
+            input_metadata_tsv_file,
+            output_metadata_tsv_file,
+            mapping_file,
+            get_marc_server_strategy,
+            row_merge_data_strategy=row_merge_data_strategy,
+            write_to_file_strategy=write_to_file_strategy,
+            enable_experimental_features=enable_experimental_features,
+            resume=resume,
+            checkpoint_interval=checkpoint_interval,
+            retry_policy=retry_policy or RetryPolicy(),
+            row_options={
+                "max_concurrency": max_concurrency,
+                "jinja_bytecode_cache_dir": (
+                    None
+                    if cache is None
+                    else cache.cache_dir / JINJA_BYTECODE_CACHE_NAME
+                ),
+                "on_records_planned": (
+                    None
+                    if batching_strategy is None
+                    else batching_strategy.expect
+                ),
+                "on_mapping_planned": (
+                    None
+                    if field_parser is None
+                    else lambda plan: field_parser.keep(plan.marc_tags)
+                ),
+            },
+            delta_output=delta_output,
+        )
+    finally:
+        client.close()
+    if cached_strategy is not None:
+        logger.info(
+            "Used %d cached record(s) and fetched %d record(s).",
+            cached_strategy.hits,
+            cached_strategy.misses,
+        )
+    if batching_strategy is not None:
+        logger.info(
+            "Requested %d record(s) in %d batch(es).",
+            client.total_attempts,
+            batching_strategy.batches,
+        )
+    else:
+        logger.info(
+            "Sent %d request(s) to the GetMARC server.", client.total_attempts
+        )
+    client.log_endpoint_usage()
+    _finish_merge(journal, checkpoint, "GetMARC")
+
+
+def merge_from_record_file(
+    input_metadata_tsv_file: pathlib.Path,
+    output_metadata_tsv_file: pathlib.Path,
+    mapping_file: pathlib.Path,
+    record_file: marc_files.IndexedRecordFile,
+    row_merge_data_strategy: Callable[
+        ...,
+        Iterable[MergedRow],
+    ] = iter_merged_rows_from_getmarc,
+    write_to_file_strategy: Callable[
+        ...,
+        None,
+    ] = write_new_rows_to_file,
+    enable_experimental_features: bool = False,
+    resume: bool = False,
+    checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL,
+    delta_output: bool = False,
+) -> None:
+    """Merge data from a local file of records into a TSV file.
+
+    The records are looked up in the file instead of being requested from a
+    GetMARC server. The file is indexed by MMS ID the first time it is used
+    and the index is kept for later merges.
+
+    Args:
+        input_metadata_tsv_file: Source TSV file to be merged with.
+        output_metadata_tsv_file: Output TSV file to be created or overwritten.
+        mapping_file: Mapping file to be used for merging.
+        record_file: file containing the records.
+        row_merge_data_strategy: strategy to create new rows from the
+            records and input tsv file.
+        write_to_file_strategy: strategy to write new rows to the output file.
+        enable_experimental_features: enable experimental features.
+        resume: continue an interrupted merge from its journal.
+        checkpoint_interval: number of rows written between updates of the
+            journal.
+        delta_output: write only the cells changed by the merge to
+            output_metadata_tsv_file, as a delta, instead of the whole table.
+
+    """
+    with record_file:
+        journal, checkpoint = _merge_into_partial_output(
+            input_metadata_tsv_file,
+            output_metadata_tsv_file,
+            mapping_file,
+            record_file.get_record,
+            row_merge_data_strategy=row_merge_data_strategy,
+            write_to_file_strategy=write_to_file_strategy,
+            enable_experimental_features=enable_experimental_features,
+            resume=resume,
+            checkpoint_interval=checkpoint_interval,
+            # Records missing from a file are still missing the second time.
+            retry_policy=RetryPolicy(rounds=0),
+            row_options={},
+            delta_output=delta_output,
+        )
+    _finish_merge(journal, checkpoint, str(record_file.source_file))
+
+
+def merge_from_marcxml(
+    input_metadata_tsv_file: pathlib.Path,
+    output_metadata_tsv_file: pathlib.Path,
+    mapping_file: pathlib.Path,
+    marcxml_file: pathlib.Path,
+    index_file: Optional[pathlib.Path] = None,
+    **kwargs,
+) -> None:
+    """Merge data from a MARCXML file into a TSV file using a mapping file.
+
+    Args:
+        input_metadata_tsv_file: Source TSV file to be merged with.
+        output_metadata_tsv_file: Output TSV file to be created or overwritten.
+        mapping_file: Mapping file to be used for merging.
+        marcxml_file: MARCXML collection containing the records, such as an
+            export from Alma.
+        index_file: where the index of the MARCXML file is kept. Defaults to
+            a file next to it.
+        **kwargs: other options of merge_from_record_file.
+
+    """
+    merge_from_record_file(
+        input_metadata_tsv_file,
+        output_metadata_tsv_file,
+        mapping_file,
+        marc_files.MarcXmlRecordFile(marcxml_file, index_file=index_file),
+        **kwargs,
+    )
+
+
+def merge_from_iso2709(
+    input_metadata_tsv_file: pathlib.Path,
+    output_metadata_tsv_file: pathlib.Path,
+    mapping_file: pathlib.Path,
+    marc_file: pathlib.Path,
+    index_file: Optional[pathlib.Path] = None,
+    **kwargs,
+) -> None:
+    """Merge data from a binary MARC file into a TSV file.
+
+    Args:
+        input_metadata_tsv_file: Source TSV file to be merged with.
+        output_metadata_tsv_file: Output TSV file to be created or overwritten.
+        mapping_file: Mapping file to be used for merging.
+        marc_file: ISO 2709 file containing the records, such as a .mrc
+            export.
+        index_file: where the index of the file is kept. Defaults to a file
+            next to it.
+        **kwargs: other options of merge_from_record_file.
+
+    """
+    merge_from_record_file(
+        input_metadata_tsv_file,
+        output_metadata_tsv_file,
+        mapping_file,
+        marc_files.Iso2709RecordFile(marc_file, index_file=index_file),
+        **kwargs,
+    )
+
+
+def merge_from_tsv(
+    input_metadata_tsv_file: pathlib.Path,
+    output_metadata_tsv_file: pathlib.Path,
+    mapping_file: pathlib.Path,
+    lookup_file: pathlib.Path,
+    write_to_file_strategy: Callable[
+        ...,
+        None,
+    ] = write_new_rows_to_file,
+    enable_experimental_features: bool = False,
+    resume: bool = False,
+    checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL,
+    max_rows_in_memory: int = lookup_table.DEFAULT_MAX_ROWS_IN_MEMORY,
+    delta_output: bool = False,
+) -> None:
+    """Merge data from a lookup table into a TSV file using a mapping file.
+
+    The lookup table, such as an Alma Analytics export, is read once into a
+    lookup by its key column. The TSV file is then joined with it in a
+    single pass.
+
+    Args:
+        input_metadata_tsv_file: Source TSV file to be merged with.
+        output_metadata_tsv_file: Output TSV file to be created or overwritten.
+        mapping_file: Mapping file to be used for merging.
+        lookup_file: TSV or CSV file with the data to merge.
+        write_to_file_strategy: strategy to write new rows to the output file.
+        enable_experimental_features: enable experimental features.
+        resume: continue an interrupted merge from its journal.
+        checkpoint_interval: number of rows written between updates of the
+            journal.
+        max_rows_in_memory: number of rows of the lookup table kept in
+            memory before using a database on disk instead.
+        delta_output: write only the cells changed by the merge to
+            output_metadata_tsv_file, as a delta, instead of the whole table.
+
+    """
+    try:
+        with mapping_file.open("rb") as mapping_file_fp:
+            lookup_key = get_lookup_key(_load_mapping_toml(mapping_file_fp))
+    except BadMappingDataError as mapping_data_error:
+        raise BadMappingFileError(
+            source_file=mapping_file, details=mapping_data_error.details
+        ) from mapping_data_error
+    with lookup_table.load_lookup_table(
+        lookup_file, lookup_key, max_rows_in_memory=max_rows_in_memory
+    ) as lookup:
+        journal, checkpoint = _merge_into_partial_output(
+            input_metadata_tsv_file,
+            output_metadata_tsv_file,
+            mapping_file,
+            lookup.get,
+            row_merge_data_strategy=iter_joined_rows_from_tsv,
+            write_to_file_strategy=write_to_file_strategy,
+            enable_experimental_features=enable_experimental_features,
+            resume=resume,
+            checkpoint_interval=checkpoint_interval,
+            retry_policy=RetryPolicy(rounds=0),
+            row_options={},
+            delta_output=delta_output,
         )
+    _finish_merge(journal, checkpoint, str(lookup_file))
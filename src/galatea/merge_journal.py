@@ -0,0 +1,123 @@
+"""Checkpoint journal used to resume an interrupted merge.
+
+Added in version 0.7.0.
+
+"""
+
+import dataclasses
+import json
+import logging
+import os
+import pathlib
+import tempfile
+from typing import List, Optional
+
+from galatea.utils import GalateaException
+
+__all__ = [
+    "MergeCheckpoint",
+    "MergeJournal",
+    "JournalMismatchError",
+]
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+JOURNAL_FORMAT_VERSION = 1
+
+
+class JournalMismatchError(GalateaException):
+    """Journal was written for a different merge than the one resumed."""
+
+    def __init__(self, journal_file: pathlib.Path, reason: str, *args) -> None:
+        """Create a new exception for a journal that cannot be used."""
+        super().__init__(*args)
+        self.journal_file = journal_file
+        self.reason = reason
+
+    def __str__(self) -> str:
+        """Print string."""
+        return (
+            f"Unable to resume using {self.journal_file}. {self.reason}. "
+            f"Remove it to start the merge from the beginning."
+        )
+
+
+@dataclasses.dataclass
+class MergeCheckpoint:
+    """Progress of a merge that has been safely written to the output."""
+
+    input_file: str
+    last_line_number: int = 0
+    output_offset: int = 0
+    failed_identifiers: List[str] = dataclasses.field(default_factory=list)
+
+
+class MergeJournal:
+    """Small JSON file that records the progress of a merge.
+
+    The merged rows are written to a partial output file next to the final
+    output. After a batch of rows is flushed to the partial output, the
+    journal is updated with the line number of the last row written and the
+    size of the partial output at that point. Anything written after the
+    last checkpoint is discarded when resuming.
+    """
+
+    def __init__(self, output_file: pathlib.Path) -> None:
+        """Create a journal for a merge writing to an output file.
+
+        Args:
+            output_file: final output file of the merge
+        """
+        self.output_file = output_file
+        self.journal_file = output_file.with_name(
+            f"{output_file.name}.journal"
+        )
+        self.partial_output_file = output_file.with_name(
+            f"{output_file.name}.partial"
+        )
+
+    def load(self) -> Optional[MergeCheckpoint]:
+        """Read the last checkpoint, or None if there is no journal."""
+        try:
+            with self.journal_file.open("r", encoding="utf-8") as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as error:
+            raise JournalMismatchError(
+                self.journal_file, f"The journal is unreadable: {error}"
+            ) from error
+        if data.get("version") != JOURNAL_FORMAT_VERSION:
+            raise JournalMismatchError(
+                self.journal_file, "The journal format is not supported"
+            )
+        return MergeCheckpoint(
+            input_file=data["input_file"],
+            last_line_number=data["last_line_number"],
+            output_offset=data["output_offset"],
+            failed_identifiers=list(data["failed_identifiers"]),
+        )
+
+    def save(self, checkpoint: MergeCheckpoint) -> None:
+        """Write a checkpoint, replacing the previous one atomically."""
+        data = {"version": JOURNAL_FORMAT_VERSION}
+        data.update(dataclasses.asdict(checkpoint))
+        fd, temp_name = tempfile.mkstemp(
+            dir=self.journal_file.parent, suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fp:
+                json.dump(data, fp)
+                fp.flush()
+                os.fsync(fp.fileno())
+            os.replace(temp_name, self.journal_file)
+        except BaseException:
+            pathlib.Path(temp_name).unlink(missing_ok=True)
+            raise
+
+    def finish(self) -> None:
+        """Move the partial output into place and remove the journal."""
+        self.partial_output_file.replace(self.output_file)
+        self.journal_file.unlink(missing_ok=True)
+        logger.debug("removed merge journal %s", self.journal_file)
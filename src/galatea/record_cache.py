@@ -0,0 +1,193 @@
+"""Local on-disk cache of MARC records.
+
+Added in version 0.7.0.
+
+"""
+
+import datetime
+import gzip
+import hashlib
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+from urllib.parse import quote
+from xml.etree import ElementTree as ET
+
+from galatea import xml_backend
+from galatea.utils import GalateaException
+
+__all__ = [
+    "DEFAULT_CACHE_TTL",
+    "MarcRecordCache",
+    "CachedRecordStrategy",
+    "RecordNotCachedError",
+]
+
+DEFAULT_CACHE_TTL = datetime.timedelta(days=30)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class RecordNotCachedError(GalateaException):
+    """Record is not in the cache and fetching it is not allowed."""
+
+    def __init__(self, mmsid: str, *args) -> None:
+        """Create a new exception for a record that is not cached."""
+        super().__init__(*args)
+        self.mmsid = mmsid
+
+    def __str__(self) -> str:
+        """Print string."""
+        return f'Record "{self.mmsid}" is not available in the local cache.'
+
+
+class MarcRecordCache:
+    """Compressed MARC records stored on disk, keyed by server and MMS ID.
+
+    Each record is saved as a gzipped MARCXML file in a folder specific to
+    the server it came from, so that records from different servers never
+    get mixed up.
+    """
+
+    suffix = ".xml.gz"
+
+    def __init__(
+        self,
+        cache_dir: pathlib.Path,
+        server: str,
+        ttl: Optional[datetime.timedelta] = DEFAULT_CACHE_TTL,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Create a new record cache.
+
+        Args:
+            cache_dir: root folder of the cache
+            server: url of the server the records come from
+            ttl: how long a cached record can be used for. None never expires.
+            clock: function returning the current time in seconds
+        """
+        self.cache_dir = cache_dir
+        self.server = server
+        self.ttl = ttl
+        self._clock = clock
+
+    @property
+    def server_dir(self) -> pathlib.Path:
+        """Folder containing the records of the server."""
+        server_key = hashlib.sha256(
+            self.server.rstrip("/").encode("utf-8")
+        ).hexdigest()[:16]
+        return self.cache_dir / server_key
+
+    def path_for(self, mmsid: str) -> pathlib.Path:
+        """Get the location of a record in the cache."""
+        return self.server_dir / f"{quote(mmsid, safe='')}{self.suffix}"
+
+    def is_expired(self, path: pathlib.Path) -> bool:
+        """Check if a cached record file is older than the ttl allows."""
+        if self.ttl is None:
+            return False
+        age = self._clock() - path.stat().st_mtime
+        return age > self.ttl.total_seconds()
+
+    def contains(self, mmsid: str) -> bool:
+        """Check if a record is cached and has not expired."""
+        try:
+            return not self.is_expired(self.path_for(mmsid))
+        except FileNotFoundError:
+            return False
+
+    def get(self, mmsid: str) -> Optional[ET.Element]:
+        """Get a record from the cache.
+
+        Args:
+            mmsid: MMS ID of the record
+
+        Returns: the record, or None if it is not cached or has expired.
+
+        """
+        path = self.path_for(mmsid)
+        try:
+            if self.is_expired(path):
+                logger.debug("cached record for %s has expired", mmsid)
+                return None
+            with gzip.open(path, "rb") as fp:
+                return xml_backend.fromstring(fp.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ET.ParseError) as error:
+            logger.warning(
+                "Ignoring unreadable cached record for %s. Reason: %s",
+                mmsid,
+                error,
+            )
+            return None
+
+    def put(self, mmsid: str, record: ET.Element) -> None:
+        """Save a record to the cache, replacing any older copy."""
+        path = self.path_for(mmsid)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so that a crash or another thread
+        # never leaves a partially written record behind.
+        fd, temp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with (
+                os.fdopen(fd, "wb") as raw,
+                gzip.GzipFile(fileobj=raw, mode="wb") as fp,
+            ):
+                fp.write(xml_backend.tostring(record))
+            os.replace(temp_name, path)
+        except BaseException:
+            pathlib.Path(temp_name).unlink(missing_ok=True)
+            raise
+
+
+class CachedRecordStrategy:
+    """Record fetching strategy that reads and fills a record cache."""
+
+    def __init__(
+        self,
+        fetch: Callable[[str], ET.Element],
+        cache: MarcRecordCache,
+        refresh: bool = False,
+        offline: bool = False,
+    ) -> None:
+        """Wrap a record fetching strategy with a cache.
+
+        Args:
+            fetch: function used to get a record that is not cached
+            cache: record cache
+            refresh: ignore cached records and fetch them again
+            offline: only use cached records, never fetch
+        """
+        if refresh and offline:
+            raise ValueError("refresh and offline cannot be used together")
+        self._fetch = fetch
+        self.cache = cache
+        self.refresh = refresh
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, mmsid: str) -> ET.Element:
+        """Get a record, using the cache when possible."""
+        if not self.refresh:
+            record = self.cache.get(mmsid)
+            if record is not None:
+                with self._lock:
+                    self.hits += 1
+                logger.debug("using cached record for %s", mmsid)
+                return record
+        if self.offline:
+            raise RecordNotCachedError(mmsid)
+        with self._lock:
+            self.misses += 1
+        record = self._fetch(mmsid)
+        self.cache.put(mmsid, record)
+        return record
@@ -0,0 +1,412 @@
+"""Protection for requests sent to remote servers.
+
+Added in version 0.7.0.
+
+"""
+
+import logging
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+)
+from urllib.parse import urlsplit
+
+import requests
+
+from galatea.utils import GalateaException
+
+__all__ = [
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "Endpoint",
+    "EndpointBalancer",
+    "HostGuard",
+    "is_server_error",
+]
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+DEFAULT_MAX_IN_FLIGHT_PER_HOST = 8
+DEFAULT_UNHEALTHY_COOLDOWN = 30.0
+DEFAULT_LATENCY_SMOOTHING = 0.3
+DEFAULT_FAILURE_EXCEPTIONS: Tuple[Type[BaseException], ...] = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+R = TypeVar("R")
+
+
+class CircuitOpenError(GalateaException):
+    """Remote server kept failing, so no more requests are sent to it."""
+
+    def __init__(self, name: str, failures: int, *args) -> None:
+        """Create a new exception for a server that is not responding."""
+        super().__init__(*args)
+        self.name = name
+        self.failures = failures
+
+    def __str__(self) -> str:
+        """Print string."""
+        return (
+            f"{self.name} is not available. Stopped sending requests to it "
+            f"after {self.failures} failed request(s) in a row and a failed "
+            f"retry."
+        )
+
+
+def is_server_error(response: Any) -> bool:
+    """Check if a response is a server error that counts as a failure."""
+    return isinstance(response, requests.Response) and (
+        response.status_code >= 500
+    )
+
+
+class CircuitBreaker:
+    """Stop calling a remote server that keeps failing.
+
+    The breaker starts closed, letting every call through. After a number
+    of failures in a row, it opens. The next call waits for the reset
+    timeout and is then sent as a single probe while other calls wait for
+    its result. If the probe works, the breaker closes again. If it fails,
+    the breaker gives up and every call raises CircuitOpenError right away.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+    ABORTED = "aborted"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+        failure_exceptions: Tuple[
+            Type[BaseException], ...
+        ] = DEFAULT_FAILURE_EXCEPTIONS,
+        is_failure_result: Callable[[Any], bool] = is_server_error,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        """Create a new circuit breaker.
+
+        Args:
+            name: name of the remote server, used in messages
+            failure_threshold: number of failures in a row that opens the
+                breaker
+            reset_timeout: seconds to wait before probing a server after
+                the breaker opens
+            failure_exceptions: exceptions counted as failures
+            is_failure_result: checks if a returned value is a failure,
+                such as a 5xx response
+            clock: function returning the current time in seconds
+            sleep: function used to wait before probing
+        """
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_exceptions = failure_exceptions
+        self.is_failure_result = is_failure_result
+        self._clock = clock
+        self._sleep = sleep
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._condition = threading.Condition()
+
+    def _before_call(self) -> bool:
+        with self._condition:
+            while True:
+                if self.state == self.ABORTED:
+                    raise CircuitOpenError(self.name, self.failure_threshold)
+                if self.state == self.CLOSED:
+                    return False
+                if self.state == self.OPEN:
+                    self.state = self.HALF_OPEN
+                    wait = self._opened_at + self.reset_timeout - self._clock()
+                    break
+                # Another call is probing the server. Wait for its result.
+                self._condition.wait()
+        if wait > 0:
+            logger.warning(
+                "Pausing requests to %s for %.1f second(s) before trying "
+                "again.",
+                self.name,
+                wait,
+            )
+            self._sleep(wait)
+        return True
+
+    def _record_failure(self, probe: bool) -> None:
+        with self._condition:
+            if probe:
+                logger.error("%s is still not responding.", self.name)
+                self.state = self.ABORTED
+                self._condition.notify_all()
+                return
+            self.consecutive_failures += 1
+            if (
+                self.state == self.CLOSED
+                and self.consecutive_failures >= self.failure_threshold
+            ):
+                logger.warning(
+                    "%s failed %d time(s) in a row.",
+                    self.name,
+                    self.consecutive_failures,
+                )
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+
+    def _record_success(self, probe: bool) -> None:
+        with self._condition:
+            self.consecutive_failures = 0
+            if probe:
+                logger.info("%s is responding again.", self.name)
+                self.state = self.CLOSED
+                self._condition.notify_all()
+
+    def call(self, func: Callable[..., R], *args, **kwargs) -> R:
+        """Call a function through the breaker.
+
+        Args:
+            func: function that makes the remote call
+            *args: positional arguments for func
+            **kwargs: keyword arguments for func
+
+        Returns: value returned by func
+
+        """
+        probe = self._before_call()
+        try:
+            result = func(*args, **kwargs)
+        except self.failure_exceptions:
+            self._record_failure(probe)
+            raise
+        except BaseException:
+            # The server answered, even if the answer was not usable.
+            self._record_success(probe)
+            raise
+        if self.is_failure_result(result):
+            self._record_failure(probe)
+        else:
+            self._record_success(probe)
+        return result
+
+
+class HostGuard:
+    """Circuit breaker and in-flight request limit for each host."""
+
+    def __init__(
+        self,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT_PER_HOST,
+        breaker_factory: Callable[[str], CircuitBreaker] = CircuitBreaker,
+    ) -> None:
+        """Create a new guard.
+
+        Args:
+            max_in_flight: maximum number of requests sent to the same host
+                at the same time
+            breaker_factory: creates the circuit breaker for a host
+        """
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.max_in_flight = max_in_flight
+        self._breaker_factory = breaker_factory
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _get_host_state(
+        self, host: str
+    ) -> Tuple[CircuitBreaker, threading.BoundedSemaphore]:
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = self._breaker_factory(host)
+                self._semaphores[host] = threading.BoundedSemaphore(
+                    self.max_in_flight
+                )
+            return self._breakers[host], self._semaphores[host]
+
+    def get_breaker(self, url: str) -> CircuitBreaker:
+        """Get the circuit breaker of the host of a url."""
+        return self._get_host_state(urlsplit(url).netloc)[0]
+
+    def call(self, url: str, func: Callable[..., R], *args, **kwargs) -> R:
+        """Make a remote call to the host of a url.
+
+        Args:
+            url: url the call is made to
+            func: function that makes the remote call
+            *args: positional arguments for func
+            **kwargs: keyword arguments for func
+
+        Returns: value returned by func
+
+        """
+        breaker, semaphore = self._get_host_state(urlsplit(url).netloc)
+
+        def _limited_call() -> R:
+            with semaphore:
+                return func(*args, **kwargs)
+
+        return breaker.call(_limited_call)
+
+
+class Endpoint:
+    """Replica of a remote server and how well it has been responding."""
+
+    def __init__(self, url: str) -> None:
+        """Create a new endpoint.
+
+        Args:
+            url: base url of the replica
+        """
+        self.url = url
+        self.latency: Optional[float] = None
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.unhealthy_until = 0.0
+
+    def __repr__(self) -> str:
+        """Get the representation of the endpoint."""
+        return f"Endpoint({self.url!r})"
+
+
+class EndpointBalancer:
+    """Spread requests across replicas of the same remote server.
+
+    Each request goes to the endpoint expected to answer first, based on a
+    moving average of its latency and the number of requests it is already
+    answering. Until the latency of endpoints is known, requests are spread
+    evenly between them.
+
+    An endpoint that fails a request is unhealthy for a cooldown, and so is
+    one whose circuit breaker is not closed. Unhealthy endpoints are only
+    used when every endpoint is unhealthy.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        guard: HostGuard,
+        cooldown: float = DEFAULT_UNHEALTHY_COOLDOWN,
+        smoothing: float = DEFAULT_LATENCY_SMOOTHING,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create a new balancer.
+
+        Args:
+            urls: base urls of the replicas, in order of preference
+            guard: guard the requests to the endpoints go through, used to
+                check their circuit breakers
+            cooldown: seconds an endpoint is unhealthy after a failure
+            smoothing: weight of the latest latency in the moving average,
+                between 0 and 1
+            clock: function returning the current time in seconds
+        """
+        if not urls:
+            raise ValueError("At least one endpoint is required")
+        if not 0 < smoothing <= 1:
+            raise ValueError("smoothing must be between 0 and 1")
+        self.endpoints: List[Endpoint] = [Endpoint(url) for url in urls]
+        self.guard = guard
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def is_healthy(self, endpoint: Endpoint) -> bool:
+        """Check if an endpoint can be used without waiting on a failure."""
+        return (
+            endpoint.unhealthy_until <= self._clock()
+            and self.guard.get_breaker(endpoint.url).state
+            == CircuitBreaker.CLOSED
+        )
+
+    def _gave_up_on(self, endpoint: Endpoint) -> bool:
+        return (
+            self.guard.get_breaker(endpoint.url).state
+            == CircuitBreaker.ABORTED
+        )
+
+    def is_aborted(self) -> bool:
+        """Check if the circuit breaker of every endpoint gave up."""
+        return all(self._gave_up_on(endpoint) for endpoint in self.endpoints)
+
+    def acquire(self, exclude: Collection[str] = ()) -> Endpoint:
+        """Pick the endpoint for a request and count it as in flight.
+
+        Every call must be followed by a call to release.
+
+        Args:
+            exclude: urls of endpoints to avoid, such as those that already
+                failed the request. They are only picked if every endpoint
+                is excluded. Endpoints whose circuit breaker gave up are
+                always picked last.
+
+        Returns: endpoint to send the request to
+
+        """
+        with self._lock:
+            ranked = min(
+                enumerate(self.endpoints),
+                key=lambda indexed: (
+                    self._gave_up_on(indexed[1]),
+                    indexed[1].url in exclude,
+                    not self.is_healthy(indexed[1]),
+                    (indexed[1].latency or 0.0) * (indexed[1].in_flight + 1),
+                    indexed[1].in_flight,
+                    indexed[0],
+                ),
+            )
+            endpoint = ranked[1]
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(
+        self, endpoint: Endpoint, latency: Optional[float] = None
+    ) -> None:
+        """Record the outcome of a request sent to an endpoint.
+
+        Args:
+            endpoint: endpoint returned by acquire
+            latency: seconds the endpoint took to answer, or None if the
+                request failed
+        """
+        with self._lock:
+            endpoint.in_flight -= 1
+            if latency is None:
+                endpoint.failures += 1
+                endpoint.unhealthy_until = self._clock() + self.cooldown
+                if len(self.endpoints) > 1:
+                    logger.warning(
+                        "%s failed a request. Preferring other endpoints for "
+                        "%.1f second(s).",
+                        endpoint.url,
+                        self.cooldown,
+                    )
+                return
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.smoothing * (
+                    latency - endpoint.latency
+                )
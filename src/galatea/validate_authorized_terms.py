@@ -1,20 +1,56 @@
 """Validate authorized terms."""
 
 import abc
+import asyncio
 import collections.abc
+import contextlib
+import csv
+import dataclasses
+import json
 import logging
+import math
 import pathlib
+import random
 import time
-from typing import Dict, Callable, Iterator, TypeVar, Generic, Iterable
+import typing
+from typing import (
+    AsyncIterator,
+    Dict,
+    Callable,
+    Iterator,
+    TypeVar,
+    Generic,
+    Iterable,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    Type,
+    Union,
+)
 from urllib.parse import quote
 
 import requests
 
+from galatea import aio, remote
 from galatea.tsv import iter_tsv_file, get_tsv_dialect
 
-__all__ = ["validate_authorized_terms"]
+__all__ = [
+    "avalidate",
+    "get_async_name_check",
+    "validate_authorized_terms",
+    "sample_authorized_terms",
+    "parse_sample_size",
+    "SampleSize",
+    "InvalidRateEstimate",
+    "TermCheckResult",
+]
 
 API_REQUEST_RATE_LIMIT_IN_SECONDS = 0.1
+DEFAULT_SAMPLE_SEED = 0
+DEFAULT_CONFIDENCE_Z_SCORE = 1.96
+DEFAULT_REQUEST_TIMEOUT = (5.0, 30.0)
+DEFAULT_MAX_CONCURRENCY = 4
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -85,6 +121,26 @@ class NameCheck(CachedApiCheck):
         return super().get_data(self._get_url(key))
 
 
+def get_guarded_request_strategy(
+    guard: remote.HostGuard,
+    timeout: Tuple[float, float] = DEFAULT_REQUEST_TIMEOUT,
+) -> Callable[[str], requests.Response]:
+    """Get a request strategy that goes through a host guard.
+
+    Args:
+        guard: circuit breaker and in-flight request limit for each host
+        timeout: connect and read timeout of each request in seconds
+
+    Returns: function that requests a url
+
+    """
+
+    def request(url: str) -> requests.Response:
+        return guard.call(url, requests.get, url, timeout=timeout)
+
+    return request
+
+
 def check_terms(name: str, cache: CachedApiCheck) -> bool:
     return cache.get_data(name).status_code == 200
 
@@ -143,28 +199,577 @@ class IterTerms(collections.abc.Iterable):
                     yield row.line_number, field_name, cleaned_string
 
 
-def validate_authorized_terms(source: pathlib.Path) -> None:
-    """Validate Authorized terms.
+def get_default_terms_to_check(source: pathlib.Path) -> IterTerms:
+    terms_to_check = IterTerms(source)
+    terms_to_check.field_names.add("260$a")
+    terms_to_check.field_names.add("264$a")
+    return terms_to_check
+
+
+@dataclasses.dataclass(frozen=True)
+class TermCheckResult:
+    """Result of checking a single term against the authority.
+
+    authorized is None when the authority could not be reached for the term.
+    """
+
+    line_number: int
+    field_name: str
+    term: str
+    authorized: Optional[bool]
+    cached: bool
+    latency: float
+
+    @property
+    def status(self) -> str:
+        """Status of the term as used in reports."""
+        if self.authorized is None:
+            return "unavailable"
+        return "authorized" if self.authorized else "unauthorized"
+
+    @property
+    def source(self) -> str:
+        """Where the result came from as used in reports."""
+        return "cached" if self.cached else "fetched"
+
+
+def iter_checked_terms(
+    terms: Iterable[Tuple[int, str, str]],
+    checker: NameCheck,
+    timer: Callable[[], float] = time.perf_counter,
+    failure_exceptions: Tuple[
+        Type[BaseException], ...
+    ] = remote.DEFAULT_FAILURE_EXCEPTIONS,
+) -> Iterator[TermCheckResult]:
+    """Check terms against the authority, respecting the API rate limit.
+
+    A term that fails with one of failure_exceptions is reported as
+    unavailable and the next term is checked. Once the circuit breaker of the
+    authority gives up, remote.CircuitOpenError stops the iteration.
 
     Args:
-        source: Marc tsv file to validate
+        terms: line number, field name and term to check
+        checker: cached name checker
+        timer: clock used to measure the latency of each check
+        failure_exceptions: exceptions that mark a single term as unavailable
+
+    Yields: result of each check
 
     """
-    logger.info("validating authorized terms")
-    checker = NameCheck()
-    terms_to_check = IterTerms(source)
-    terms_to_check.field_names.add("260$a")
-    terms_to_check.field_names.add("264$a")
     for (
         line_number,
         field_name,
         value,
     ) in optional_rate_limited_iterator(
-        terms_to_check,
+        terms,
         bypass_sleep_func=lambda results: results[2] in checker,
     ):
-        result = check_terms(value, checker)
-        if result is False:
-            logger.info(
-                f'Line: {line_number} | Field: "{field_name}" | "{value}" is not an authorized term.'
+        cached = value in checker
+        start = timer()
+        authorized: Optional[bool]
+        try:
+            authorized = check_terms(value, checker)
+        except failure_exceptions as error:
+            log_unavailable_term(line_number, field_name, value, error)
+            authorized = None
+        yield TermCheckResult(
+            line_number=line_number,
+            field_name=field_name,
+            term=value,
+            authorized=authorized,
+            cached=cached,
+            latency=timer() - start,
+        )
+
+
+def log_unauthorized_term(line_number: int, field_name: str, value: str):
+    logger.info(
+        'Line: %d | Field: "%s" | "%s" is not an authorized term.',
+        line_number,
+        field_name,
+        value,
+    )
+
+
+def log_unavailable_term(
+    line_number: int, field_name: str, value: str, error: BaseException
+):
+    logger.warning(
+        'Line: %d | Field: "%s" | unable to check "%s": %s',
+        line_number,
+        field_name,
+        value,
+        error,
+    )
+
+
+# ===================================================================
+# Reports
+
+
+class ValidationReportWriter(abc.ABC):
+    """Write the result of every term checked to a file as it happens."""
+
+    fields = ["line", "field", "term", "status", "source", "latency"]
+    buffer_size = 1024 * 64
+
+    def __init__(self, fp: TextIO) -> None:
+        self._fp = fp
+
+    @classmethod
+    @contextlib.contextmanager
+    def open(cls, path: pathlib.Path) -> Iterator["ValidationReportWriter"]:
+        """Open a report file for writing."""
+        with path.open(
+            "w", encoding="utf-8", newline="", buffering=cls.buffer_size
+        ) as fp:
+            writer = cls(fp)
+            writer.write_header()
+            yield writer
+
+    @staticmethod
+    def to_record(
+        result: TermCheckResult,
+    ) -> Dict[str, Union[str, int, float]]:
+        return {
+            "line": result.line_number,
+            "field": result.field_name,
+            "term": result.term,
+            "status": result.status,
+            "source": result.source,
+            "latency": f"{result.latency:.6f}",
+        }
+
+    def write_header(self) -> None:
+        """Write anything needed before the first result."""
+
+    @abc.abstractmethod
+    def write(self, result: TermCheckResult) -> None:
+        """Write a single result to the report."""
+
+
+class TSVValidationReportWriter(ValidationReportWriter):
+    def __init__(self, fp: TextIO) -> None:
+        super().__init__(fp)
+        self._writer = csv.DictWriter(
+            fp, fieldnames=self.fields, dialect="excel-tab"
+        )
+
+    def write_header(self) -> None:
+        self._writer.writeheader()
+
+    def write(self, result: TermCheckResult) -> None:
+        self._writer.writerow(self.to_record(result))
+
+
+class JSONLinesValidationReportWriter(ValidationReportWriter):
+    def write(self, result: TermCheckResult) -> None:
+        record = self.to_record(result)
+        record["latency"] = round(result.latency, 6)
+        self._fp.write(json.dumps(record, ensure_ascii=False))
+        self._fp.write("\n")
+
+
+JSON_LINES_REPORT_SUFFIXES = {".jsonl", ".ndjson", ".json"}
+
+
+def get_report_writer_type(
+    path: pathlib.Path,
+) -> Type[ValidationReportWriter]:
+    """Pick the report format based on the file extension."""
+    if path.suffix.lower() in JSON_LINES_REPORT_SUFFIXES:
+        return JSONLinesValidationReportWriter
+    return TSVValidationReportWriter
+
+
+@contextlib.contextmanager
+def open_validation_report(
+    path: Optional[pathlib.Path],
+) -> Iterator[Optional[ValidationReportWriter]]:
+    """Open a validation report if a path is given.
+
+    Args:
+        path: report file. Files ending with .jsonl, .ndjson or .json are
+            written as JSON Lines, everything else as tsv.
+
+    Yields: report writer or None if no path is given
+
+    """
+    if path is None:
+        yield None
+        return
+    with get_report_writer_type(path).open(path) as writer:
+        yield writer
+    logger.info("Wrote validation report to %s", path)
+
+
+def validate_authorized_terms(
+    source: pathlib.Path, report: Optional[pathlib.Path] = None
+) -> None:
+    """Validate Authorized terms.
+
+    Args:
+        source: Marc tsv file to validate
+        report: optional file to write the result of every term checked to.
+
+    """
+    logger.info("validating authorized terms")
+    checker = NameCheck(get_guarded_request_strategy(remote.HostGuard()))
+    with open_validation_report(report) as report_writer:
+        for result in iter_checked_terms(
+            get_default_terms_to_check(source), checker
+        ):
+            if report_writer is not None:
+                report_writer.write(result)
+            if result.authorized is False:
+                log_unauthorized_term(
+                    result.line_number, result.field_name, result.term
+                )
+
+
+def get_async_name_check(
+    guard: Optional[remote.HostGuard] = None,
+    timeout: Tuple[float, float] = DEFAULT_REQUEST_TIMEOUT,
+) -> aio.AsyncStrategy[bool]:
+    """Get the default async strategy checking a name against id.loc.gov.
+
+    Requests are sent with requests in worker threads, through a host guard
+    shared by every check.
+
+    Args:
+        guard: circuit breaker and in-flight request limit for each host.
+            Defaults to a new one.
+        timeout: connect and read timeout of each request in seconds
+
+    Returns: coroutine function checking if a name is authorized
+
+    """
+    request = get_guarded_request_strategy(
+        guard or remote.HostGuard(), timeout=timeout
+    )
+
+    def check(name: str) -> bool:
+        # Only the url is needed from NameCheck, not its cache.
+        return request(NameCheck._get_url(name)).status_code == 200
+
+    return aio.to_async_strategy(check)
+
+
+async def avalidate(
+    source: pathlib.Path,
+    check: Optional[aio.AsyncStrategy[bool]] = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    rate_limit: float = API_REQUEST_RATE_LIMIT_IN_SECONDS,
+    timer: Callable[[], float] = time.perf_counter,
+    failure_exceptions: Tuple[
+        Type[BaseException], ...
+    ] = remote.DEFAULT_FAILURE_EXCEPTIONS,
+) -> AsyncIterator[TermCheckResult]:
+    """Validate authorized terms from an event loop.
+
+    The asyncio counterpart of validate_authorized_terms. Terms are checked
+    as tasks on the running loop, so many validations can share the same
+    loop. Each distinct term is only checked once, and the checks still
+    start at least rate_limit seconds apart. As with iter_checked_terms, a
+    term failing with one of failure_exceptions is reported as unavailable.
+
+    Args:
+        source: Marc tsv file to validate
+        check: coroutine function checking if a term is authorized, such as
+            one using an async HTTP client. Defaults to
+            get_async_name_check().
+        max_concurrency: maximum number of terms checked at the same time
+        rate_limit: minimum number of seconds between the start of two
+            checks
+        timer: clock used to measure the latency of each check
+        failure_exceptions: exceptions that mark a single term as unavailable
+
+    Yields: result of each term, in the order of the file
+
+    """
+    logger.info("validating authorized terms")
+    name_check = check or get_async_name_check()
+    limiter = aio.AsyncRateLimiter(rate_limit)
+
+    async def _timed_check(
+        term: str,
+    ) -> Tuple[Union[bool, BaseException], float]:
+        await limiter.wait()
+        start = timer()
+        try:
+            authorized: Union[bool, BaseException] = await name_check(term)
+        except failure_exceptions as error:
+            authorized = error
+        return authorized, timer() - start
+
+    checked_terms = set()
+    prefetched_terms = aio.aiter_with_prefetched(
+        get_default_terms_to_check(source),
+        key=lambda term: term[2],
+        fetch=_timed_check,
+        max_concurrency=max_concurrency,
+    )
+    async with contextlib.aclosing(prefetched_terms):
+        async for (
+            line_number,
+            field_name,
+            value,
+        ), pending in prefetched_terms:
+            outcome, latency = typing.cast(
+                "asyncio.Future[Tuple[Union[bool, BaseException], float]]",
+                pending,
+            ).result()
+            cached = value in checked_terms
+            checked_terms.add(value)
+            if isinstance(outcome, BaseException):
+                log_unavailable_term(line_number, field_name, value, outcome)
+            result = TermCheckResult(
+                line_number=line_number,
+                field_name=field_name,
+                term=value,
+                authorized=(
+                    None if isinstance(outcome, BaseException) else outcome
+                ),
+                cached=cached,
+                latency=0.0 if cached else latency,
             )
+            if result.authorized is False:
+                log_unauthorized_term(
+                    result.line_number, result.field_name, result.term
+                )
+            yield result
+
+
+# ===================================================================
+# Sampling
+
+
+@dataclasses.dataclass(frozen=True)
+class SampleSize:
+    """Size of a sample, either as a fixed count or as a percentage."""
+
+    count: Optional[int] = None
+    percent: Optional[float] = None
+
+    def resolve(self, population_size: int) -> int:
+        """Get the number of items to sample from a population."""
+        if self.count is not None:
+            return min(self.count, population_size)
+        if self.percent is not None:
+            return min(
+                population_size,
+                max(1, math.ceil(population_size * self.percent / 100)),
+            )
+        return population_size
+
+
+def parse_sample_size(value: str) -> SampleSize:
+    """Parse a sample size from a string.
+
+    Args:
+        value: either a whole number of terms, such as "500", or a
+            percentage of the distinct terms, such as "5%".
+
+    Returns: sample size
+
+    """
+    value = value.strip()
+    try:
+        if value.endswith("%"):
+            percent = float(value[:-1])
+            if not 0 < percent <= 100:
+                raise ValueError(
+                    f"sample percentage must be between 0 and 100: {value}"
+                )
+            return SampleSize(percent=percent)
+        count = int(value)
+    except ValueError as error:
+        raise ValueError(f"invalid sample size: {value!r}") from error
+    if count < 1:
+        raise ValueError(f"sample size must be at least 1: {value}")
+    return SampleSize(count=count)
+
+
+def iter_unique_terms(
+    terms: Iterable[Tuple[int, str, str]],
+) -> Iterator[Tuple[int, str, str]]:
+    """Iterate over terms, skipping any term value already seen."""
+    seen = set()
+    for line_number, field_name, value in terms:
+        if value in seen:
+            continue
+        seen.add(value)
+        yield line_number, field_name, value
+
+
+def reservoir_sample(
+    iterable: Iterable[T], size: int, seed: int = DEFAULT_SAMPLE_SEED
+) -> Tuple[List[T], int]:
+    """Take a uniform random sample from an iterable in a single pass.
+
+    Args:
+        iterable: items to sample from
+        size: maximum number of items in the sample
+        seed: seed for the random number generator, so that the same input
+            always produces the same sample
+
+    Returns: the sample, in the order the items were seen, and the total
+        number of items in the iterable.
+
+    """
+    rng = random.Random(seed)
+    reservoir: List[Tuple[int, T]] = []
+    total = 0
+    for total, item in enumerate(iterable, start=1):
+        if len(reservoir) < size:
+            reservoir.append((total, item))
+            continue
+        replace_index = rng.randrange(total)
+        if replace_index < size:
+            reservoir[replace_index] = (total, item)
+    return [item for _, item in sorted(reservoir, key=lambda x: x[0])], total
+
+
+@dataclasses.dataclass(frozen=True)
+class InvalidRateEstimate:
+    """Estimated rate of unauthorized terms based on a sample."""
+
+    invalid: int
+    sample_size: int
+    population_size: int
+    lower: float
+    upper: float
+    z_score: float = DEFAULT_CONFIDENCE_Z_SCORE
+
+    @property
+    def rate(self) -> float:
+        """Rate of unauthorized terms found in the sample."""
+        if self.sample_size == 0:
+            return 0.0
+        return self.invalid / self.sample_size
+
+    def __str__(self) -> str:
+        """Summarize the estimate."""
+        return (
+            f"Estimated invalid rate: {self.rate:.1%} "
+            f"({self.lower:.1%} - {self.upper:.1%} at z={self.z_score}) "
+            f"based on {self.invalid} unauthorized term(s) out of "
+            f"{self.sample_size} sampled from {self.population_size} "
+            f"distinct term(s)."
+        )
+
+
+def estimate_invalid_rate(
+    invalid: int,
+    sample_size: int,
+    population_size: int,
+    z_score: float = DEFAULT_CONFIDENCE_Z_SCORE,
+) -> InvalidRateEstimate:
+    """Estimate the invalid rate of the population from a sample.
+
+    Uses the Wilson score interval, narrowed with the finite population
+    correction because the sample is drawn without replacement.
+
+    Args:
+        invalid: number of unauthorized terms in the sample
+        sample_size: number of terms sampled
+        population_size: number of distinct terms the sample was taken from
+        z_score: z score of the confidence level. Defaults to 95%.
+
+    Returns: estimate of the invalid rate
+
+    """
+    if sample_size == 0:
+        return InvalidRateEstimate(
+            invalid=0,
+            sample_size=0,
+            population_size=population_size,
+            lower=0.0,
+            upper=1.0,
+            z_score=z_score,
+        )
+    proportion = invalid / sample_size
+    if population_size > 1:
+        correction = (population_size - sample_size) / (population_size - 1)
+    else:
+        correction = 0.0
+    z_squared = z_score**2
+    denominator = 1 + z_squared / sample_size
+    center = (proportion + z_squared / (2 * sample_size)) / denominator
+    margin = (
+        z_score
+        * math.sqrt(
+            correction * proportion * (1 - proportion) / sample_size
+            + z_squared / (4 * sample_size**2)
+        )
+        / denominator
+    )
+    if correction == 0.0:
+        # The entire population was checked, so there is no uncertainty.
+        center, margin = proportion, 0.0
+    return InvalidRateEstimate(
+        invalid=invalid,
+        sample_size=sample_size,
+        population_size=population_size,
+        lower=max(0.0, center - margin),
+        upper=min(1.0, center + margin),
+        z_score=z_score,
+    )
+
+
+def sample_authorized_terms(
+    source: pathlib.Path,
+    sample_size: SampleSize,
+    seed: int = DEFAULT_SAMPLE_SEED,
+    report: Optional[pathlib.Path] = None,
+) -> InvalidRateEstimate:
+    """Estimate how many authorized terms are invalid using a sample.
+
+    Only a random sample of the distinct terms found in the tsv file are
+    checked against the authority.
+
+    Args:
+        source: Marc tsv file to validate
+        sample_size: how many of the distinct terms to check
+        seed: seed used to pick the sample
+        report: optional file to write the result of every sampled term to.
+
+    Returns: estimate of the invalid rate
+
+    """
+    logger.info("sampling authorized terms")
+    terms_to_check = get_default_terms_to_check(source)
+    if sample_size.count is not None:
+        size = sample_size.count
+    else:
+        size = sample_size.resolve(
+            sum(1 for _ in iter_unique_terms(terms_to_check))
+        )
+    sample, population_size = reservoir_sample(
+        iter_unique_terms(terms_to_check), size, seed=seed
+    )
+    logger.debug(
+        "checking %d term(s) sampled from %d distinct term(s)",
+        len(sample),
+        population_size,
+    )
+    checker = NameCheck(get_guarded_request_strategy(remote.HostGuard()))
+    invalid = 0
+    unavailable = 0
+    with open_validation_report(report) as report_writer:
+        for result in iter_checked_terms(sample, checker):
+            if report_writer is not None:
+                report_writer.write(result)
+            if result.authorized is None:
+                unavailable += 1
+            elif result.authorized is False:
+                invalid += 1
+                log_unauthorized_term(
+                    result.line_number, result.field_name, result.term
+                )
+    # Terms that could not be checked say nothing about the invalid rate.
+    estimate = estimate_invalid_rate(
+        invalid, len(sample) - unavailable, population_size
+    )
+    logger.info(str(estimate))
+    return estimate
@@ -0,0 +1,208 @@
+"""XML backends used to parse and search MARCXML records.
+
+lxml is used when it is installed, since it parses records and filters
+their fields by tag in C. Otherwise, the standard library's
+xml.etree.ElementTree is used.
+
+Elements from either backend have the same ElementTree API, so the rest of
+galatea works with both. Errors parsing a document are always raised as
+xml.etree.ElementTree.ParseError.
+
+Added in version 0.7.0.
+
+"""
+
+import abc
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from xml.etree import ElementTree as ET
+
+from galatea.utils import GalateaException
+
+try:
+    from lxml import etree as lxml_etree  # type: ignore[import-untyped]
+except ImportError:  # pragma: no cover
+    lxml_etree = None
+
+__all__ = [
+    "ElementTreeBackend",
+    "LxmlBackend",
+    "XmlBackend",
+    "XmlBackendNotAvailableError",
+    "available_backends",
+    "backend_for",
+    "fromstring",
+    "get_backend",
+    "tostring",
+]
+
+
+class XmlBackendNotAvailableError(GalateaException):
+    """XML backend requested is not installed or does not exist."""
+
+    def __init__(self, name: str, *args) -> None:
+        """Create a new exception for an unavailable backend."""
+        super().__init__(*args)
+        self.name = name
+
+    def __str__(self) -> str:
+        """Print string."""
+        return (
+            f'XML backend "{self.name}" is not available. Available '
+            f"backends: {', '.join(available_backends())}"
+        )
+
+
+class XmlBackend(abc.ABC):
+    """Library used to parse, serialize and search XML."""
+
+    name = ""
+
+    @abc.abstractmethod
+    def fromstring(self, content: bytes) -> ET.Element:
+        """Parse a document from its raw bytes.
+
+        Raises:
+            xml.etree.ElementTree.ParseError: if the document is not valid
+        """
+
+    @abc.abstractmethod
+    def tostring(self, element: ET.Element) -> bytes:
+        """Serialize an element as UTF-8 with an XML declaration."""
+
+    @abc.abstractmethod
+    def iter_tags(
+        self, element: ET.Element, tags: Sequence[str]
+    ) -> Iterator[ET.Element]:
+        """Iterate in document order over the elements with any of the tags.
+
+        Args:
+            element: element to search, included in the search itself
+            tags: tags in Clark notation, such as "{namespace}datafield"
+        """
+
+
+class ElementTreeBackend(XmlBackend):
+    """Backend using the standard library's xml.etree.ElementTree."""
+
+    name = "etree"
+
+    def fromstring(self, content: bytes) -> ET.Element:
+        """Parse a document from its raw bytes."""
+        return ET.fromstring(content)
+
+    def tostring(self, element: ET.Element) -> bytes:
+        """Serialize an element as UTF-8 with an XML declaration."""
+        return ET.tostring(element, encoding="utf-8")
+
+    def iter_tags(
+        self, element: ET.Element, tags: Sequence[str]
+    ) -> Iterator[ET.Element]:
+        """Iterate in document order over the elements with any of the tags.
+
+        ElementTree can only filter by a single tag, so the element is
+        walked once and the tags are checked here.
+        """
+        if len(tags) == 1:
+            yield from element.iter(tags[0])
+            return
+        wanted = frozenset(tags)
+        for child in element.iter():
+            if child.tag in wanted:
+                yield child
+
+
+class LxmlBackend(XmlBackend):
+    """Backend using lxml.
+
+    Raises:
+        XmlBackendNotAvailableError: if lxml is not installed
+    """
+
+    name = "lxml"
+
+    def __init__(self) -> None:
+        """Create a new lxml backend."""
+        if lxml_etree is None:
+            raise XmlBackendNotAvailableError(self.name)
+
+    def fromstring(self, content: bytes) -> ET.Element:
+        """Parse a document from its raw bytes."""
+        try:
+            return lxml_etree.fromstring(content)
+        except lxml_etree.XMLSyntaxError as error:
+            parse_error = ET.ParseError(str(error))
+            parse_error.position = error.position
+            raise parse_error from error
+
+    def tostring(self, element: ET.Element) -> bytes:
+        """Serialize an element as UTF-8 with an XML declaration."""
+        return lxml_etree.tostring(
+            element, encoding="utf-8", xml_declaration=True, with_tail=False
+        )
+
+    def iter_tags(
+        self, element: ET.Element, tags: Sequence[str]
+    ) -> Iterator[ET.Element]:
+        """Iterate in document order over the elements with any of the tags.
+
+        lxml filters the tags itself, so elements with other tags are never
+        created as Python objects.
+        """
+        return element.iter(*tags)
+
+
+_BACKEND_TYPES = {
+    backend.name: backend for backend in (LxmlBackend, ElementTreeBackend)
+}
+_backends: Dict[str, XmlBackend] = {}
+
+
+def available_backends() -> List[str]:
+    """Get the names of the XML backends installed, preferred first."""
+    return [
+        name
+        for name in _BACKEND_TYPES
+        if name != LxmlBackend.name or lxml_etree is not None
+    ]
+
+
+def get_backend(name: Optional[str] = None) -> XmlBackend:
+    """Get an XML backend.
+
+    Args:
+        name: name of the backend, such as "lxml" or "etree". Defaults to
+            lxml if it is installed and ElementTree if not.
+
+    Returns: XML backend
+
+    """
+    if name is None:
+        name = available_backends()[0]
+    backend = _backends.get(name)
+    if backend is None:
+        backend_type = _BACKEND_TYPES.get(name)
+        if backend_type is None:
+            raise XmlBackendNotAvailableError(name)
+        backend = _backends[name] = backend_type()
+    return backend
+
+
+def backend_for(element: Any) -> XmlBackend:
+    """Get the XML backend that created an element."""
+    if lxml_etree is not None and isinstance(element, lxml_etree._Element):
+        return get_backend(LxmlBackend.name)
+    return get_backend(ElementTreeBackend.name)
+
+
+def fromstring(content: bytes) -> ET.Element:
+    """Parse a document from its raw bytes with the default backend.
+
+    Raises:
+        xml.etree.ElementTree.ParseError: if the document is not valid
+    """
+    return get_backend().fromstring(content)
+
+
+def tostring(element: ET.Element) -> bytes:
+    """Serialize an element from any backend as UTF-8."""
+    return backend_for(element).tostring(element)
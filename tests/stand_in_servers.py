@@ -0,0 +1,239 @@
+"""Local HTTP servers standing in for the remote services used by galatea.
+
+Each server runs in a background thread on a free local port, so tests can
+exercise real connections, concurrency, retries and throughput without a
+network. Faults can be injected to make a server slow, fail with 503 or
+throttle with 429, and are drawn from a seeded random generator so runs are
+repeatable.
+"""
+
+import abc
+import collections
+import http.server
+import random
+import threading
+import time
+import urllib.parse
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import requests
+
+MARC_SLIM_XML_NAMESPACE = "http://www.loc.gov/MARC21/slim"
+ID_LOC_GOV = "https://id.loc.gov"
+
+
+def make_marc_record(mmsid: str, title: str = "Bacon") -> str:
+    return (
+        f'<record xmlns="{MARC_SLIM_XML_NAMESPACE}">'
+        f'<controlfield tag="001">{mmsid}</controlfield>'
+        f'<datafield ind1="0" ind2="0" tag="245">'
+        f'<subfield code="a">{title}</subfield>'
+        f"</datafield>"
+        f"</record>"
+    )
+
+
+class Reply(NamedTuple):
+    status: int
+    body: bytes = b""
+    headers: Dict[str, str] = {}
+
+
+class StandInServer(abc.ABC):
+    """HTTP server running in a background thread on a free local port.
+
+    Args:
+        latency: seconds every response is delayed by
+        jitter: up to this many extra seconds are added to the latency of
+            each response at random
+        error_rate: share of requests answered with 503 Service Unavailable
+        throttle_rate: share of requests answered with 429 Too Many
+            Requests and a Retry-After header
+        retry_after: seconds given in the Retry-After header of a 429
+        seed: seed of the random generator used to inject faults
+    """
+
+    content_type = "application/xml"
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: int = 1,
+        seed: int = 0,
+    ) -> None:
+        if not 0 <= error_rate + throttle_rate <= 1:
+            raise ValueError(
+                "error_rate and throttle_rate must add up to at most 1"
+            )
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.requests: List[str] = []
+        self.statuses: collections.Counter[int] = collections.Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, which Nagle's
+            # algorithm would hold back waiting for an acknowledgement.
+            disable_nagle_algorithm = True
+
+            def do_GET(self) -> None:
+                reply = stand_in.reply(self.path)
+                self.send_response(reply.status)
+                self.send_header("Content-Type", stand_in.content_type)
+                self.send_header("Content-Length", str(len(reply.body)))
+                for name, value in reply.headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(reply.body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), Handler
+        )
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @abc.abstractmethod
+    def handle(self, path: str) -> Reply:
+        """Answer a request that was not turned into an injected fault."""
+
+    def reply(self, path: str) -> Reply:
+        with self._lock:
+            self.requests.append(path)
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            roll = self._random.random()
+        if delay:
+            time.sleep(delay)
+        if roll < self.throttle_rate:
+            reply = Reply(429, headers={"Retry-After": str(self.retry_after)})
+        elif roll < self.throttle_rate + self.error_rate:
+            reply = Reply(503)
+        else:
+            reply = self.handle(path)
+        with self._lock:
+            self.statuses[reply.status] += 1
+        return reply
+
+    def __enter__(self) -> "StandInServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class GetMarcStandInServer(StandInServer):
+    """GetMARC server serving records from memory.
+
+    Implements ``/api/record?mms_id=``. A comma separated list of MMS IDs
+    returns the records found as a MARCXML collection.
+    """
+
+    def __init__(
+        self, records: Optional[Dict[str, str]] = None, **faults
+    ) -> None:
+        super().__init__(**faults)
+        self.records = dict(records or {})
+        self.record_requests: collections.Counter[str] = collections.Counter()
+
+    def handle(self, path: str) -> Reply:
+        parsed = urllib.parse.urlsplit(path)
+        if parsed.path != "/api/record":
+            return Reply(404)
+        query = urllib.parse.parse_qs(parsed.query)
+        mmsids = [
+            mmsid
+            for value in query.get("mms_id", [])
+            for mmsid in value.split(",")
+        ]
+        with self._lock:
+            self.record_requests.update(mmsids)
+        if len(mmsids) == 1:
+            record = self.records.get(mmsids[0])
+            if record is None:
+                return Reply(404)
+            return Reply(200, record.encode("utf-8"))
+        found = "".join(
+            self.records[mmsid] for mmsid in mmsids if mmsid in self.records
+        )
+        return Reply(
+            200,
+            (
+                f'<collection xmlns="{MARC_SLIM_XML_NAMESPACE}">{found}'
+                f"</collection>"
+            ).encode("utf-8"),
+        )
+
+
+class LocNamesStandInServer(StandInServer):
+    """id.loc.gov name authorities serving a fixed set of terms.
+
+    Implements ``/authorities/names/label/<term>`` the way id.loc.gov does.
+    A known term redirects to its authority, which answers 200, and an
+    unknown term answers 404. Use ``request`` as the requesting strategy of
+    galatea so that its id.loc.gov urls are sent to this server instead.
+    """
+
+    content_type = "text/html"
+    label_path = "/authorities/names/label/"
+
+    def __init__(self, terms: Iterable[str] = (), **faults) -> None:
+        super().__init__(**faults)
+        self.authorities = {
+            term: f"n{number:08d}" for number, term in enumerate(terms, 1)
+        }
+        self.label_requests: collections.Counter[str] = collections.Counter()
+
+    def handle(self, path: str) -> Reply:
+        parsed = urllib.parse.urlsplit(path)
+        if parsed.path.startswith(self.label_path):
+            term = urllib.parse.unquote(parsed.path[len(self.label_path) :])
+            with self._lock:
+                self.label_requests[term] += 1
+            authority = self.authorities.get(term)
+            if authority is None:
+                return Reply(404)
+            location = f"/authorities/names/{authority}.html"
+            return Reply(
+                303,
+                headers={
+                    "Location": location,
+                    "X-Uri": f"{ID_LOC_GOV}/authorities/names/{authority}",
+                },
+            )
+        if parsed.path.removesuffix(".html").removeprefix(
+            "/authorities/names/"
+        ) in set(self.authorities.values()):
+            return Reply(200, b"<html></html>")
+        return Reply(404)
+
+    def localize(self, url: str) -> str:
+        """Point an id.loc.gov url at this server."""
+        if url.startswith(ID_LOC_GOV):
+            return f"{self.url}{url[len(ID_LOC_GOV) :]}"
+        return url
+
+    def request(self, url: str, **kwargs) -> requests.Response:
+        return requests.get(self.localize(url), **kwargs)
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+
+import pytest
+
+from galatea import aio
+
+
+def prefetch(items, fetch, **kwargs):
+    async def run():
+        return [
+            (item, None if future is None else future.result())
+            async for item, future in aio.aiter_with_prefetched(
+                items, key=lambda item: item, fetch=fetch, **kwargs
+            )
+        ]
+
+    return asyncio.run(run())
+
+
+class TestAiterWithPrefetched:
+    def test_each_key_fetched_once(self):
+        fetched = []
+
+        async def fetch(key):
+            fetched.append(key)
+            return key.upper()
+
+        assert prefetch(["a", "b", None, "a"], fetch, max_concurrency=2) == [
+            ("a", "A"),
+            ("b", "B"),
+            (None, None),
+            ("a", "A"),
+        ]
+        assert fetched == ["a", "b"]
+
+    def test_released_after_last_use(self):
+        fetched = []
+
+        async def fetch(key):
+            fetched.append(key)
+            return key
+
+        prefetch(
+            ["a", "b", "c", "d", "a"],
+            fetch,
+            max_concurrency=1,
+            key_counts={"a": 1, "b": 1, "c": 1, "d": 1},
+        )
+        assert fetched == ["a", "b", "c", "d", "a"]
+
+    def test_errors_kept_in_future(self):
+        async def fetch(key):
+            raise KeyError(key)
+
+        async def run():
+            async for _, future in aio.aiter_with_prefetched(
+                ["a"], key=lambda item: item, fetch=fetch, max_concurrency=1
+            ):
+                return future.exception()
+
+        assert isinstance(asyncio.run(run()), KeyError)
+
+    def test_invalid_concurrency(self):
+        async def fetch(key):
+            return key
+
+        with pytest.raises(ValueError):
+            prefetch(["a"], fetch, max_concurrency=0)
+
+
+def test_to_async_strategy_runs_in_thread():
+    async def run():
+        strategy = aio.to_async_strategy(lambda key: threading.get_ident())
+        return await strategy("spam")
+
+    assert asyncio.run(run()) != threading.get_ident()
+
+
+def test_rate_limiter_spaces_out_requests(monkeypatch):
+    clock = [0.0]
+    sleeps = []
+    original_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        sleeps.append(delay)
+        clock[0] += delay
+        await original_sleep(0)
+
+    async def run():
+        limiter = aio.AsyncRateLimiter(0.5, clock=lambda: clock[0])
+        for _ in range(3):
+            await limiter.wait()
+
+    monkeypatch.setattr(aio.asyncio, "sleep", sleep)
+    asyncio.run(run())
+    assert sleeps == [0.5, 0.5]
@@ -28,6 +28,21 @@ def test_clean_tsv(monkeypatch):
     write_tsv_file.assert_called_once()
 
 
+def test_clean_tsv_delta_output(tmp_path):
+    source = tmp_path / "source.tsv"
+    source.write_text(
+        "1\t650\t651$v\n991\tPork.\tMaps\n992\t\tMaps.\n",
+        encoding="utf-8",
+    )
+    delta_file = tmp_path / "changes.tsv"
+    clean_tsv.clean_tsv(source, delta_file, delta_output=True)
+    assert delta_file.read_text(encoding="utf-8").splitlines() == [
+        "line\tidentifier\tcolumn\told\tnew",
+        "2\t991\t650\tPork.\tPork",
+        "3\t992\t651$v\tMaps.\tMaps",
+    ]
+
+
 @pytest.fixture
 def marc_entry():
     return {
@@ -1,14 +1,22 @@
 import argparse
 import logging
+import pathlib
 from unittest.mock import Mock, create_autospec, ANY
 
 import pytest
 
 import galatea.cli
 import galatea.clean_tsv
+import galatea.delta
+import galatea.lookup_table
+import galatea.marc_files
 import galatea.merge_data
+import galatea.merge_journal
+import galatea.remote
 import galatea.utils
 
+import stand_in_servers
+
 
 @pytest.mark.parametrize(
     "args, function_name",
@@ -41,10 +49,43 @@ def test_clean_tsv_command_calls_clean_tsv(monkeypatch):
         ),
     )
     clean_tsv.assert_called_once_with(
-        source="spam.tsv", dest="bacon.tsv", row_diff_report_generator=ANY
+        source="spam.tsv",
+        dest="bacon.tsv",
+        row_diff_report_generator=ANY,
+        delta_output=False,
     )
 
 
+def test_clean_tsv_command_with_delta(monkeypatch):
+    clean_tsv = create_autospec(galatea.clean_tsv.clean_tsv)
+    monkeypatch.setattr(galatea.clean_tsv, "clean_tsv", clean_tsv)
+    galatea.cli.clean_tsv_command(
+        argparse.Namespace(
+            source_tsv="spam.tsv",
+            output_tsv=None,
+            delta="spam.delta.tsv",
+        ),
+    )
+    clean_tsv.assert_called_once_with(
+        source="spam.tsv",
+        dest="spam.delta.tsv",
+        row_diff_report_generator=ANY,
+        delta_output=True,
+    )
+
+
+def test_clean_tsv_output_and_delta_are_exclusive():
+    with pytest.raises(SystemExit):
+        galatea.cli.get_arg_parser().parse_args([
+            "clean-tsv",
+            "spam.tsv",
+            "--output",
+            "bacon.tsv",
+            "--delta",
+            "spam.delta.tsv",
+        ])
+
+
 def test_clean_tsv_command_w_no_output_calls_clean_tsv_inplace(monkeypatch):
     clean_tsv = create_autospec(galatea.clean_tsv.clean_tsv)
     monkeypatch.setattr(galatea.clean_tsv, "clean_tsv", clean_tsv)
@@ -55,7 +96,10 @@ def test_clean_tsv_command_w_no_output_calls_clean_tsv_inplace(monkeypatch):
         ),
     )
     clean_tsv.assert_called_once_with(
-        source="spam.tsv", dest="spam.tsv", row_diff_report_generator=ANY
+        source="spam.tsv",
+        dest="spam.tsv",
+        row_diff_report_generator=ANY,
+        delta_output=False,
     )
 
 
@@ -95,7 +139,7 @@ def test_authority_check_command(monkeypatch):
         validate_authorized_terms,
     )
     galatea.cli.authority_check_command(args)
-    validate_authorized_terms.assert_called_once_with("dummy.tsv")
+    validate_authorized_terms.assert_called_once_with("dummy.tsv", report=None)
 
 
 @pytest.mark.parametrize(
@@ -104,6 +148,13 @@ def test_authority_check_command(monkeypatch):
         (galatea.utils.CommandFinishedWithException, 1),
         (galatea.merge_data.ExperimentalFeatureError(source="spam"), 1),
         (galatea.merge_data.BadMappingFileError(source_file=Mock()), 1),
+        (
+            galatea.merge_journal.JournalMismatchError(
+                journal_file=Mock(), reason="spam"
+            ),
+            1,
+        ),
+        (galatea.remote.CircuitOpenError(name="spam", failures=5), 1),
     ],
 )
 def test_merge_from_getmarc_exit_with_errors(
@@ -124,3 +175,336 @@ def test_merge_from_getmarc_exit_with_errors(
         exit_strategy=exit_strategy,
     )
     exit_strategy.assert_called_once_with(expected_exit_value)
+
+
+def test_authority_check_command_with_sample(monkeypatch):
+    sample_size = galatea.validate_authorized_terms.SampleSize(count=10)
+    args = argparse.Namespace(source_tsv="dummy.tsv", sample=sample_size)
+    sample_authorized_terms = Mock(name="sample_authorized_terms")
+    monkeypatch.setattr(
+        galatea.validate_authorized_terms,
+        "sample_authorized_terms",
+        sample_authorized_terms,
+    )
+    galatea.cli.authority_check_command(args)
+    sample_authorized_terms.assert_called_once_with(
+        "dummy.tsv", sample_size, seed=ANY, report=None
+    )
+
+
+def test_authorized_terms_check_parses_sample():
+    args = galatea.cli.get_arg_parser().parse_args([
+        "authorized-terms",
+        "check",
+        "spam.tsv",
+        "--sample",
+        "5%",
+    ])
+    assert args.sample == galatea.validate_authorized_terms.SampleSize(
+        percent=5
+    )
+
+
+def test_authority_check_command_exits_when_server_unavailable(monkeypatch):
+    monkeypatch.setattr(
+        galatea.validate_authorized_terms,
+        "validate_authorized_terms",
+        Mock(side_effect=galatea.remote.CircuitOpenError("id.loc.gov", 5)),
+    )
+    with pytest.raises(SystemExit) as error:
+        galatea.cli.authority_check_command(
+            argparse.Namespace(source_tsv="dummy.tsv")
+        )
+    assert error.value.code == 1
+
+
+def record_file_args(**kwargs):
+    kwargs.setdefault("output_tsv_file", None)
+    kwargs.setdefault("merge_data_command", "from-marcxml")
+    return argparse.Namespace(
+        metadata_tsv_file="spam.tsv",
+        mapping_file="mapping.toml",
+        record_file=pathlib.Path("records.xml"),
+        index_file=None,
+        resume=False,
+        enable_experimental_features=False,
+        verbosity=0,
+        **kwargs,
+    )
+
+
+def test_merge_from_record_file_inplace_by_default(monkeypatch):
+    merge_from_record_file = Mock()
+    monkeypatch.setattr(
+        galatea.cli.merge_data,
+        "merge_from_record_file",
+        merge_from_record_file,
+    )
+    galatea.cli.merge_record_file_data_command(record_file_args())
+    assert (
+        merge_from_record_file.call_args.kwargs["output_metadata_tsv_file"]
+        == "spam.tsv"
+    )
+
+
+@pytest.mark.parametrize(
+    "command, expected_class",
+    [
+        ("from-marcxml", galatea.marc_files.MarcXmlRecordFile),
+        ("from-mrc", galatea.marc_files.Iso2709RecordFile),
+    ],
+)
+def test_merge_from_record_file_format(monkeypatch, command, expected_class):
+    merge_from_record_file = Mock()
+    monkeypatch.setattr(
+        galatea.cli.merge_data,
+        "merge_from_record_file",
+        merge_from_record_file,
+    )
+    galatea.cli.merge_record_file_data_command(
+        record_file_args(merge_data_command=command)
+    )
+    assert isinstance(
+        merge_from_record_file.call_args.kwargs["record_file"], expected_class
+    )
+
+
+@pytest.mark.parametrize(
+    "thrown_exception",
+    [
+        galatea.utils.CommandFinishedWithException,
+        galatea.merge_data.ExperimentalFeatureError(source="spam"),
+        galatea.marc_files.BadRecordFileError(
+            source_file=Mock(), reason="spam"
+        ),
+    ],
+)
+def test_merge_from_record_file_exit_with_errors(
+    monkeypatch, thrown_exception
+):
+    monkeypatch.setattr(
+        galatea.cli.merge_data,
+        "merge_from_record_file",
+        Mock(side_effect=thrown_exception),
+    )
+    exit_strategy = Mock()
+    galatea.cli.merge_record_file_data_command(
+        record_file_args(output_tsv_file="output.tsv"),
+        exit_strategy=exit_strategy,
+    )
+    exit_strategy.assert_called_once_with(1)
+
+
+def test_merge_from_tsv_exits_with_missing_key_column(monkeypatch):
+    monkeypatch.setattr(
+        galatea.cli.merge_data,
+        "merge_from_tsv",
+        Mock(
+            side_effect=galatea.lookup_table.MissingKeyColumnError(
+                pathlib.Path("lookup.tsv"), "MMS Id"
+            )
+        ),
+    )
+    exit_strategy = Mock()
+    galatea.cli.merge_tsv_data_command(
+        argparse.Namespace(
+            metadata_tsv_file=pathlib.Path("spam.tsv"),
+            output_tsv_file=None,
+            mapping_file=pathlib.Path("mapping.toml"),
+            lookup_file=pathlib.Path("lookup.tsv"),
+            enable_experimental_features=False,
+            resume=False,
+            max_rows_in_memory=10,
+        ),
+        exit_strategy=exit_strategy,
+    )
+    exit_strategy.assert_called_once_with(1)
+
+
+def test_merge_from_tsv_with_delta(monkeypatch):
+    merge_from_tsv = Mock()
+    monkeypatch.setattr(
+        galatea.cli.merge_data, "merge_from_tsv", merge_from_tsv
+    )
+    args = galatea.cli.get_arg_parser().parse_args([
+        "merge-data",
+        "from-tsv",
+        "spam.tsv",
+        "mapping.toml",
+        __file__,
+        "--delta",
+        "spam.delta.tsv",
+    ])
+    galatea.cli.merge_tsv_data_command(args)
+    assert merge_from_tsv.call_args.kwargs["output_metadata_tsv_file"] == (
+        pathlib.Path("spam.delta.tsv")
+    )
+    assert merge_from_tsv.call_args.kwargs["delta_output"] is True
+
+
+def test_merge_from_getmarc_output_defaults_to_inplace():
+    args = galatea.cli.get_arg_parser().parse_args([
+        "merge-data",
+        "from-getmarc",
+        "merge",
+        "spam.tsv",
+        "mapping.toml",
+    ])
+    assert galatea.cli.get_merge_output_file(args) == pathlib.Path("spam.tsv")
+
+
+def test_merge_from_getmarc_replicas(tmp_path):
+    args = galatea.cli.get_arg_parser().parse_args([
+        "merge-data",
+        "from-getmarc",
+        "merge",
+        "--getmarc-server",
+        "https://getmarc1.example.com,https://getmarc2.example.com",
+        "--cache-dir",
+        str(tmp_path),
+        "spam.tsv",
+        "mapping.toml",
+    ])
+    with galatea.cli.get_marc_client_from_args(args) as client:
+        assert client.servers == [
+            "https://getmarc1.example.com",
+            "https://getmarc2.example.com",
+        ]
+    cache = galatea.cli.get_record_cache_from_args(args)
+    assert cache.server == "https://getmarc1.example.com"
+
+
+@pytest.mark.parametrize("cache_mode", ["--refresh", "--offline"])
+def test_merge_from_getmarc_cache_mode_requires_cache_dir(
+    monkeypatch, capsys, cache_mode
+):
+    merge_from_getmarc = Mock()
+    monkeypatch.setattr(
+        galatea.cli.merge_data, "merge_from_getmarc", merge_from_getmarc
+    )
+    args = galatea.cli.get_arg_parser().parse_args([
+        "merge-data",
+        "from-getmarc",
+        "merge",
+        "--getmarc-server",
+        "https://getmarc.example.com",
+        cache_mode,
+        "spam.tsv",
+        "mapping.toml",
+    ])
+    exit_strategy = Mock()
+    galatea.cli.merge_get_marc_data_command(args, exit_strategy=exit_strategy)
+    exit_strategy.assert_called_once_with(1)
+    merge_from_getmarc.assert_not_called()
+    assert "--cache-dir" in capsys.readouterr().err
+
+
+def test_merge_from_getmarc_requires_server(monkeypatch, capsys):
+    merge_from_getmarc = Mock()
+    monkeypatch.setattr(
+        galatea.cli.merge_data, "merge_from_getmarc", merge_from_getmarc
+    )
+    args = galatea.cli.get_arg_parser().parse_args([
+        "merge-data",
+        "from-getmarc",
+        "merge",
+        "spam.tsv",
+        "mapping.toml",
+    ])
+    args.getmarc_server = None
+    exit_strategy = Mock()
+    galatea.cli.merge_get_marc_data_command(args, exit_strategy=exit_strategy)
+    exit_strategy.assert_called_once_with(1)
+    merge_from_getmarc.assert_not_called()
+    assert "--getmarc-server" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("ttl", ["0", "-1"])
+def test_merge_from_getmarc_cache_ttl_must_be_positive(ttl):
+    with pytest.raises(SystemExit):
+        galatea.cli.get_arg_parser().parse_args([
+            "merge-data",
+            "from-getmarc",
+            "merge",
+            "--cache-ttl",
+            ttl,
+            "spam.tsv",
+            "mapping.toml",
+        ])
+
+
+@pytest.mark.parametrize(
+    "thrown_exception",
+    [
+        galatea.delta.BadDeltaFileError(source="spam.delta.tsv", reason="x"),
+        galatea.delta.DeltaConflictError(
+            galatea.delta.CellChange(2, "991", "245", "old", "new"), "spam"
+        ),
+    ],
+)
+def test_apply_delta_exit_with_errors(monkeypatch, thrown_exception):
+    monkeypatch.setattr(
+        galatea.cli.delta, "apply_delta", Mock(side_effect=thrown_exception)
+    )
+    exit_strategy = Mock()
+    galatea.cli.apply_delta_command(
+        argparse.Namespace(
+            source_tsv=pathlib.Path("spam.tsv"),
+            delta_file=pathlib.Path("spam.delta.tsv"),
+            output_tsv=None,
+        ),
+        exit_strategy=exit_strategy,
+    )
+    exit_strategy.assert_called_once_with(1)
+
+
+def test_merge_from_getmarc_only_parses_mapped_fields(tmp_path, monkeypatch):
+    monkeypatch.setattr(galatea.cli, "startup_tasks", [])
+    monkeypatch.setattr(
+        galatea.merge_data.tsv, "get_tsv_dialect", lambda _: "excel-tab"
+    )
+    input_file = tmp_path / "input.tsv"
+    input_file.write_text(
+        "Uniform Title\tBibliographic Identifier\n\t991\n", encoding="utf-8"
+    )
+    mapping_file = tmp_path / "mapping.toml"
+    mapping_file.write_text(
+        "[mappings]\n"
+        'identifier_key = "Bibliographic Identifier"\n'
+        "\n"
+        "[[mapping]]\n"
+        'key = "Uniform Title"\n'
+        'matching_marc_fields = ["245$a"]\n'
+        'delimiter = "||"\n'
+        'existing_data = "replace"\n',
+        encoding="utf-8",
+    )
+    record = stand_in_servers.make_marc_record("991", "Spam").replace(
+        "</record>",
+        '<datafield ind1=" " ind2="0" tag="650">'
+        '<subfield code="a">Eggs</subfield>'
+        "</datafield></record>",
+    )
+    parsed = []
+    parse_record_fields = galatea.cli.getmarc.parse_record_fields
+
+    def spy(mmsid, content, tags=None):
+        record = parse_record_fields(mmsid, content, tags)
+        parsed.append(sorted(record.datafields))
+        return record
+
+    monkeypatch.setattr(galatea.cli.getmarc, "parse_record_fields", spy)
+    with stand_in_servers.GetMarcStandInServer({"991": record}) as server:
+        galatea.cli.main([
+            "merge-data",
+            "from-getmarc",
+            "merge",
+            "--getmarc-server",
+            server.url,
+            str(input_file),
+            str(mapping_file),
+        ])
+    assert parsed == [["245"]]
+    assert input_file.read_text(encoding="utf-8").splitlines()[1:] == [
+        "Spam\t991"
+    ]
@@ -83,3 +83,11 @@ class TestJSONConfigStrategy:
         config_format = config.JSONConfigStrategy()
         config_data = config_format.deserialize(start_data)
         assert config_data.get_marc_server_url == "some_url"
+
+    def test_server_url_list_round_trip(self):
+        config_format = config.JSONConfigStrategy()
+        urls = ["https://getmarc1.example.com", "https://getmarc2.example.com"]
+        config_data = config_format.deserialize(
+            config_format.serialize(config.Config(get_marc_server_url=urls))
+        )
+        assert config_data.get_marc_server_url == urls
@@ -0,0 +1,161 @@
+import io
+
+import pytest
+
+from galatea import delta
+
+TABLE = (
+    "Bibliographic Identifier\tTitle\tSubjects\n"
+    "991\t\tCooking\n"
+    "992\tEggs\t\n"
+    "993\tBacon\tBreakfast\n"
+)
+
+
+def read_changes(text):
+    return list(delta.read_changes_fp(io.StringIO(text)))
+
+
+def write_changes(changes):
+    fp = io.StringIO(newline="")
+    delta.write_changes_fp(fp, changes)
+    return fp.getvalue()
+
+
+def apply(table, changes_text):
+    output = io.StringIO(newline="")
+    applied = delta.apply_delta_fp(
+        io.StringIO(table, newline=""),
+        io.StringIO(changes_text, newline=""),
+        output,
+    )
+    return applied, output.getvalue().replace("\r\n", "\n")
+
+
+class TestIterCellChanges:
+    def test_only_changed_cells(self):
+        original = {"id": "991", "Title": "", "Subjects": "Cooking"}
+        changed = {"id": "991", "Title": "Spam", "Subjects": "Cooking"}
+        assert list(delta.iter_cell_changes(2, original, changed)) == [
+            delta.CellChange(2, "991", "Title", "", "Spam")
+        ]
+
+    def test_empty_and_none_are_the_same(self):
+        original = {"id": "991", "Title": ""}
+        assert (
+            list(
+                delta.iter_cell_changes(
+                    2, original, {"id": "991", "Title": None}
+                )
+            )
+            == []
+        )
+
+    def test_identifier_key(self):
+        original = {"Title": "Eggs", "MMS Id": "992"}
+        changed = {"Title": "Spam", "MMS Id": "992"}
+        assert [
+            change.identifier
+            for change in delta.iter_cell_changes(
+                3, original, changed, identifier_key="MMS Id"
+            )
+        ] == ["992"]
+
+
+class TestReadChanges:
+    def test_round_trip(self):
+        changes = [
+            delta.CellChange(2, "991", "Title", "", "Spam\tand eggs"),
+            delta.CellChange(4, "993", "Subjects", "Breakfast", ""),
+        ]
+        assert read_changes(write_changes(changes)) == changes
+
+    def test_empty_file_has_no_changes(self):
+        assert read_changes("") == []
+
+    def test_wrong_columns(self):
+        with pytest.raises(delta.BadDeltaFileError):
+            read_changes("line\tcolumn\tnew\n2\tTitle\tSpam\n")
+
+    def test_out_of_order(self):
+        with pytest.raises(delta.BadDeltaFileError):
+            read_changes(
+                write_changes([
+                    delta.CellChange(3, "992", "Title", "Eggs", "Spam"),
+                    delta.CellChange(2, "991", "Title", "", "Spam"),
+                ])
+            )
+
+    def test_invalid_line(self):
+        with pytest.raises(delta.BadDeltaFileError):
+            read_changes("line\tidentifier\tcolumn\told\tnew\nx\t\t\t\t\n")
+
+
+class TestApplyDelta:
+    def test_apply(self):
+        applied, table = apply(
+            TABLE,
+            write_changes([
+                delta.CellChange(2, "991", "Title", "", "Spam"),
+                delta.CellChange(4, "993", "Title", "Bacon", "Ham"),
+                delta.CellChange(4, "993", "Subjects", "Breakfast", ""),
+            ]),
+        )
+        assert applied == 3
+        assert table == (
+            "Bibliographic Identifier\tTitle\tSubjects\n"
+            "991\tSpam\tCooking\n"
+            "992\tEggs\t\n"
+            "993\tHam\t\n"
+        )
+
+    def test_conflict(self):
+        with pytest.raises(delta.DeltaConflictError) as error:
+            apply(
+                TABLE,
+                write_changes([
+                    delta.CellChange(3, "992", "Title", "Spam", "Ham")
+                ]),
+            )
+        assert error.value.current == "Eggs"
+
+    @pytest.mark.parametrize(
+        "change",
+        [
+            delta.CellChange(9, "999", "Title", "", "Spam"),
+            delta.CellChange(2, "991", "Date", "", "1999"),
+        ],
+    )
+    def test_change_not_in_table(self, change):
+        with pytest.raises(delta.BadDeltaFileError):
+            apply(TABLE, write_changes([change]))
+
+    def test_apply_in_place(self, tmp_path):
+        table_file = tmp_path / "table.tsv"
+        table_file.write_text(TABLE, encoding="utf-8")
+        delta_file = tmp_path / "changes.tsv"
+        delta_file.write_text(
+            write_changes([delta.CellChange(3, "992", "Title", "Eggs", "")]),
+            encoding="utf-8",
+        )
+        assert delta.apply_delta(table_file, delta_file) == 1
+        assert table_file.read_text(encoding="utf-8").splitlines()[2] == (
+            "992\t\t"
+        )
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "changes.tsv",
+            "table.tsv",
+        ]
+
+    def test_table_left_alone_on_conflict(self, tmp_path):
+        table_file = tmp_path / "table.tsv"
+        table_file.write_text(TABLE, encoding="utf-8")
+        delta_file = tmp_path / "changes.tsv"
+        delta_file.write_text(
+            write_changes([delta.CellChange(3, "992", "Title", "Ham", "")]),
+            encoding="utf-8",
+        )
+        with pytest.raises(delta.DeltaConflictError):
+            delta.apply_delta(table_file, delta_file)
+        assert table_file.read_text(encoding="utf-8") == TABLE
+        assert len(list(tmp_path.iterdir())) == 2
@@ -0,0 +1,392 @@
+import concurrent.futures
+import time
+from unittest.mock import Mock
+
+import pytest
+import requests
+
+from galatea import getmarc
+
+import stand_in_servers
+
+SAMPLE_RECORD = (
+    b'<?xml version="1.0" encoding="UTF-8"?>'
+    b'<record xmlns="http://www.loc.gov/MARC21/slim">'
+    b'<controlfield tag="001">99123</controlfield>'
+    b"</record>"
+)
+
+
+def response(status_code=200, content=SAMPLE_RECORD):
+    result = requests.Response()
+    result.status_code = status_code
+    result._content = content
+    return result
+
+
+@pytest.fixture
+def session():
+    return Mock(spec=requests.Session, headers={})
+
+
+def create_client(session, **kwargs):
+    kwargs.setdefault("sleep", Mock(name="sleep"))
+    return getmarc.GetMarcClient("https://spamserver/", session, **kwargs)
+
+
+def test_get_record_parses_bytes(session):
+    session.get.return_value = response()
+    record = create_client(session).get_record("99123")
+    assert record.tag == "{http://www.loc.gov/MARC21/slim}record"
+
+
+def test_requests_gzip(session):
+    create_client(session)
+    assert "gzip" in session.headers["Accept-Encoding"]
+
+
+def test_request_has_timeouts(session):
+    session.get.return_value = response()
+    create_client(session, connect_timeout=1, read_timeout=2).get_record("1")
+    session.get.assert_called_once_with(
+        "https://spamserver/api/record?mms_id=1", timeout=(1, 2)
+    )
+
+
+def test_retries_server_errors_with_backoff(session):
+    session.get.side_effect = [response(503), response(502), response()]
+    sleep = Mock()
+    client = create_client(session, backoff_factor=0.5, sleep=sleep)
+    client.get_record("99123")
+    assert [call.args[0] for call in sleep.call_args_list] == [0.5, 1.0]
+    assert client.attempts["99123"] == 3
+
+
+def test_retries_connection_errors(session):
+    session.get.side_effect = [requests.ConnectionError(), response()]
+    client = create_client(session)
+    client.get_record("99123")
+    assert client.attempts["99123"] == 2
+
+
+def test_gives_up_after_max_retries(session):
+    session.get.return_value = response(500)
+    client = create_client(session, max_retries=2)
+    with pytest.raises(getmarc.GetMarcRetrievalError):
+        client.get_record("99123")
+    assert client.total_attempts == 3
+
+
+def test_client_error_not_retried(session):
+    session.get.return_value = response(404)
+    client = create_client(session)
+    with pytest.raises(getmarc.GetMarcRetrievalError):
+        client.get_record("99123")
+    assert client.total_attempts == 1
+
+
+def test_invalid_xml(session):
+    session.get.return_value = response(content=b"<record>")
+    with pytest.raises(getmarc.GetMarcRetrievalError):
+        create_client(session).get_record("99123")
+
+
+def test_empty_mmsid(session):
+    with pytest.raises(getmarc.InvalidAPIRequestError):
+        create_client(session).get_record(" ")
+
+
+@pytest.mark.parametrize(
+    "servers",
+    [
+        "https://a.org/, https://b.org",
+        "https://a.org https://b.org https://a.org",
+        ["https://a.org/", "https://b.org"],
+    ],
+)
+def test_parse_server_urls(servers):
+    assert getmarc.parse_server_urls(servers) == [
+        "https://a.org",
+        "https://b.org",
+    ]
+
+
+def test_parse_server_urls_empty():
+    with pytest.raises(ValueError):
+        getmarc.parse_server_urls(" , ")
+
+
+class TestFailover:
+    @staticmethod
+    def create_client(session, **kwargs):
+        kwargs.setdefault("sleep", Mock(name="sleep"))
+        return getmarc.GetMarcClient(
+            "https://a.org,https://b.org", session, **kwargs
+        )
+
+    def test_fails_over_without_waiting(self, session):
+        session.get.side_effect = lambda url, timeout: (
+            response(503) if url.startswith("https://a.org") else response()
+        )
+        sleep = Mock()
+        client = self.create_client(session, sleep=sleep)
+        client.get_record("1")
+        client.get_record("2")
+        sleep.assert_not_called()
+        assert client.attempts == {"1": 2, "2": 1}
+        assert [call.args[0] for call in session.get.call_args_list] == [
+            "https://a.org/api/record?mms_id=1",
+            "https://b.org/api/record?mms_id=1",
+            "https://b.org/api/record?mms_id=2",
+        ]
+
+    def test_retries_with_backoff_once_every_server_failed(self, session):
+        session.get.return_value = response(500)
+        sleep = Mock()
+        client = self.create_client(session, max_retries=2, sleep=sleep)
+        with pytest.raises(getmarc.GetMarcRetrievalError):
+            client.get_record("1")
+        assert client.total_attempts == 4
+        assert [call.args[0] for call in sleep.call_args_list] == [0.5, 1.0]
+
+    def test_stops_when_every_server_gave_up(self, session):
+        session.get.side_effect = requests.ConnectionError()
+        guard = getmarc.remote.HostGuard(
+            breaker_factory=lambda name: getmarc.remote.CircuitBreaker(
+                name, failure_threshold=1, reset_timeout=0
+            )
+        )
+        client = self.create_client(session, guard=guard, max_retries=10)
+        with pytest.raises(getmarc.remote.CircuitOpenError):
+            client.get_record("1")
+
+
+def record(mmsid):
+    return getmarc.ET.fromstring(stand_in_servers.make_marc_record(mmsid))
+
+
+def test_split_collection():
+    collection = getmarc.ET.fromstring(
+        f'<collection xmlns="{stand_in_servers.MARC_SLIM_XML_NAMESPACE}">'
+        f"{stand_in_servers.make_marc_record('1')}"
+        f"{stand_in_servers.make_marc_record('2')}"
+        f"</collection>"
+    )
+    assert sorted(getmarc.split_collection(collection)) == ["1", "2"]
+
+
+def test_split_collection_single_record():
+    assert list(getmarc.split_collection(record("1"))) == ["1"]
+
+
+class TestBatchingRecordStrategy:
+    def test_fetches_planned_records_in_batches(self):
+        fetch_batch = Mock(
+            side_effect=lambda mmsids: {
+                mmsid: record(mmsid) for mmsid in mmsids
+            }
+        )
+        strategy = getmarc.BatchingRecordStrategy(fetch_batch, batch_size=2)
+        strategy.expect(["1", "2", "3"])
+        for mmsid in ["1", "2", "3"]:
+            assert strategy(mmsid).find(".//*[@tag='001']").text == mmsid
+        assert [call.args[0] for call in fetch_batch.call_args_list] == [
+            ["1", "2"],
+            ["3"],
+        ]
+        assert strategy.batches == 2
+
+    def test_record_missing_from_batch(self):
+        strategy = getmarc.BatchingRecordStrategy(
+            lambda mmsids: {"1": record("1")}, batch_size=2
+        )
+        strategy.expect(["1", "2"])
+        strategy("1")
+        with pytest.raises(getmarc.GetMarcRetrievalError):
+            strategy("2")
+
+    def test_skips_records_not_to_fetch(self):
+        fetch_batch = Mock(
+            side_effect=lambda mmsids: {
+                mmsid: record(mmsid) for mmsid in mmsids
+            }
+        )
+        strategy = getmarc.BatchingRecordStrategy(
+            fetch_batch, batch_size=3, should_fetch=lambda mmsid: mmsid != "2"
+        )
+        strategy.expect(["1", "2", "3"])
+        strategy("1")
+        fetch_batch.assert_called_once_with(["1", "3"])
+
+    def test_batch_error_raised_for_every_record(self):
+        strategy = getmarc.BatchingRecordStrategy(
+            Mock(side_effect=getmarc.GetMarcRetrievalError("1, 2")),
+            batch_size=2,
+        )
+        strategy.expect(["1", "2"])
+        with pytest.raises(getmarc.GetMarcRetrievalError):
+            strategy("1")
+        with pytest.raises(getmarc.GetMarcRetrievalError):
+            strategy("2")
+
+    def test_invalid_batch_size(self):
+        with pytest.raises(ValueError):
+            getmarc.BatchingRecordStrategy(Mock(), batch_size=0)
+
+
+class TestRecordFieldParser:
+    def test_keeps_every_field_by_default(self):
+        record = getmarc.RecordFieldParser()("99123", SAMPLE_RECORD)
+        assert record.controlfields == {"001": "99123"}
+
+    def test_keep(self):
+        parser = getmarc.RecordFieldParser()
+        parser.keep(["245"])
+        record = parser(
+            "1", stand_in_servers.make_marc_record("1").encode("utf-8")
+        )
+        assert record.get_values("245", "a") == ["Bacon"]
+        parser.keep(["650"])
+        record = parser(
+            "1", stand_in_servers.make_marc_record("1").encode("utf-8")
+        )
+        assert record.datafields == {}
+
+    def test_invalid_response(self):
+        with pytest.raises(getmarc.GetMarcRetrievalError):
+            getmarc.RecordFieldParser()("99123", b"<record>")
+
+    def test_parse_collection(self):
+        content = (
+            f'<collection xmlns="{stand_in_servers.MARC_SLIM_XML_NAMESPACE}">'
+            f"{stand_in_servers.make_marc_record('1', 'Spam')}"
+            f"{stand_in_servers.make_marc_record('2', 'Eggs')}"
+            f"</collection>"
+        ).encode("utf-8")
+        records = getmarc.RecordFieldParser(["245"]).parse_collection(
+            "1, 2", content
+        )
+        assert {
+            mmsid: record.get_values("245", "a")
+            for mmsid, record in records.items()
+        } == {"1": ["Spam"], "2": ["Eggs"]}
+
+    def test_parse_invalid_collection(self):
+        with pytest.raises(getmarc.GetMarcRetrievalError):
+            getmarc.RecordFieldParser().parse_collection(
+                "1, 2", b"<collection>"
+            )
+
+    def test_used_by_client(self, session):
+        session.get.return_value = response()
+        client = create_client(session, parse=getmarc.RecordFieldParser())
+        assert client.get_record("99123").controlfields["001"] == "99123"
+
+
+class TestGetRecordsFromStandInServer:
+    @pytest.fixture
+    def server(self):
+        records = {
+            mmsid: stand_in_servers.make_marc_record(mmsid)
+            for mmsid in ["1", "2", "3"]
+        }
+        with stand_in_servers.GetMarcStandInServer(records) as server:
+            yield server
+
+    def test_get_records_in_one_request(self, server):
+        with getmarc.GetMarcClient(server.url) as client:
+            records = client.get_records(["1", "2", "3"])
+        assert sorted(records) == ["1", "2", "3"]
+        assert len(server.requests) == 1
+
+    def test_get_records_leaves_out_missing(self, server):
+        with getmarc.GetMarcClient(server.url) as client:
+            records = client.get_records(["1", "404"])
+        assert list(records) == ["1"]
+
+    def test_get_records_with_field_parser(self, server, monkeypatch):
+        monkeypatch.setattr(
+            getmarc,
+            "parse_record",
+            Mock(side_effect=AssertionError("whole record parsed")),
+        )
+        parser = getmarc.RecordFieldParser(["650"])
+        with getmarc.GetMarcClient(server.url, parse=parser) as client:
+            records = client.get_records(["1", "2"])
+        assert sorted(records) == ["1", "2"]
+        assert records["1"].controlfields["001"] == "1"
+        assert records["1"].datafields == {}
+
+    def test_get_records_empty_mmsid(self, server):
+        with getmarc.GetMarcClient(server.url) as client:
+            with pytest.raises(getmarc.InvalidAPIRequestError):
+                client.get_records(["1", " "])
+
+
+class TestReplicas:
+    records = {
+        str(mmsid): stand_in_servers.make_marc_record(str(mmsid))
+        for mmsid in range(20)
+    }
+
+    def test_slow_replica_gets_fewer_requests(self):
+        with (
+            stand_in_servers.GetMarcStandInServer(self.records) as fast,
+            stand_in_servers.GetMarcStandInServer(
+                self.records, latency=0.2
+            ) as slow,
+            getmarc.GetMarcClient([slow.url, fast.url]) as client,
+            concurrent.futures.ThreadPoolExecutor(4) as executor,
+        ):
+            records = list(executor.map(client.get_record, self.records))
+        assert len(records) == len(self.records)
+        assert len(slow.requests) + len(fast.requests) == len(self.records)
+        assert len(slow.requests) < len(fast.requests)
+
+    def test_fails_over_to_replica_that_is_up(self):
+        with stand_in_servers.GetMarcStandInServer() as down:
+            down_url = down.url
+        with (
+            stand_in_servers.GetMarcStandInServer(self.records) as up,
+            getmarc.GetMarcClient([down_url, up.url]) as client,
+        ):
+            for mmsid in ["1", "2", "3"]:
+                assert client.get_record(mmsid) is not None
+        assert client.attempts == {"1": 2, "2": 1, "3": 1}
+        assert len(up.requests) == 3
+
+
+class TestFaultInjection:
+    records = {
+        str(mmsid): stand_in_servers.make_marc_record(str(mmsid))
+        for mmsid in range(20)
+    }
+
+    def test_injected_errors_are_retried(self):
+        with (
+            stand_in_servers.GetMarcStandInServer(
+                self.records, error_rate=0.3, seed=1
+            ) as server,
+            getmarc.GetMarcClient(
+                server.url, max_retries=10, backoff_factor=0
+            ) as client,
+        ):
+            for mmsid in self.records:
+                client.get_record(mmsid)
+        assert server.statuses[503] > 0
+        assert server.statuses[200] == len(self.records)
+        assert client.total_attempts == len(server.requests)
+
+    def test_concurrent_requests_overlap_latency(self):
+        latency = 0.05
+        with (
+            stand_in_servers.GetMarcStandInServer(
+                self.records, latency=latency
+            ) as server,
+            getmarc.GetMarcClient(server.url) as client,
+            concurrent.futures.ThreadPoolExecutor(8) as executor,
+        ):
+            start = time.perf_counter()
+            list(executor.map(client.get_record, self.records))
+            elapsed = time.perf_counter() - start
+        assert elapsed < len(self.records) * latency / 2
@@ -0,0 +1,79 @@
+import pytest
+
+from galatea import lookup_table
+
+SAMPLE_LOOKUP_TSV = (
+    "MMS Id\tTitle\tSubject\n"
+    "991\tSpam\tCooking\n"
+    "992\tEggs\tBreakfast\n"
+    "991\tDuplicate\tIgnored\n"
+    "\tNo key\tIgnored\n"
+)
+
+
+@pytest.fixture
+def lookup_file(tmp_path):
+    path = tmp_path / "lookup.tsv"
+    path.write_text(SAMPLE_LOOKUP_TSV, encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize("max_rows_in_memory", [100, 1])
+def test_load_lookup_table(lookup_file, max_rows_in_memory):
+    with lookup_table.load_lookup_table(
+        lookup_file, "MMS Id", max_rows_in_memory=max_rows_in_memory
+    ) as table:
+        assert len(table) == 2
+        assert table.get("992")["Title"] == "Eggs"
+        assert table.get("404") is None
+
+
+def test_first_row_wins(lookup_file):
+    with lookup_table.load_lookup_table(lookup_file, "MMS Id") as table:
+        assert table.get("991")["Title"] == "Spam"
+        assert table.duplicate_keys == 1
+
+
+def test_uses_sqlite_when_too_big(lookup_file):
+    with lookup_table.load_lookup_table(
+        lookup_file, "MMS Id", max_rows_in_memory=2
+    ) as table:
+        assert isinstance(table, lookup_table.SqliteLookupTable)
+        assert table.get("991")["Subject"] == "Cooking"
+        database_file = table.database_file
+        assert database_file.exists()
+    assert not database_file.exists()
+
+
+@pytest.mark.parametrize(
+    "max_rows_in_memory, expected_class",
+    [
+        (4, lookup_table.InMemoryLookupTable),
+        (3, lookup_table.SqliteLookupTable),
+    ],
+)
+def test_rows_at_limit_kept_in_memory(
+    lookup_file, max_rows_in_memory, expected_class
+):
+    with lookup_table.load_lookup_table(
+        lookup_file, "MMS Id", max_rows_in_memory=max_rows_in_memory
+    ) as table:
+        assert isinstance(table, expected_class)
+        assert len(table) == 2
+
+
+def test_small_table_kept_in_memory(lookup_file):
+    with lookup_table.load_lookup_table(lookup_file, "MMS Id") as table:
+        assert isinstance(table, lookup_table.InMemoryLookupTable)
+
+
+def test_csv_file(tmp_path):
+    path = tmp_path / "lookup.csv"
+    path.write_text('\ufeffMMS Id,Title\n991,"Spam, eggs"\n', encoding="utf-8")
+    with lookup_table.load_lookup_table(path, "MMS Id") as table:
+        assert table.get("991")["Title"] == "Spam, eggs"
+
+
+def test_missing_key_column(lookup_file):
+    with pytest.raises(lookup_table.MissingKeyColumnError):
+        lookup_table.load_lookup_table(lookup_file, "Bib Id")
@@ -0,0 +1,142 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from galatea import marc
+
+SAMPLE_RECORD = """
+<record xmlns="http://www.loc.gov/MARC21/slim">
+    <controlfield tag="001">99123</controlfield>
+    <datafield ind1="1" ind2="0" tag="245">
+        <subfield code="a">Spam :</subfield>
+        <subfield code="b">a study /</subfield>
+    </datafield>
+    <datafield ind1=" " ind2="0" tag="650">
+        <subfield code="a">Toll roads</subfield>
+        <subfield code="z">Ireland</subfield>
+        <subfield code="z">Dublin</subfield>
+    </datafield>
+    <datafield ind1=" " ind2="0" tag="650">
+        <subfield code="a">Tolls</subfield>
+        <subfield code="z"> </subfield>
+    </datafield>
+</record>
+"""
+
+
+@pytest.fixture
+def index():
+    return marc.MarcRecordIndex(ET.fromstring(SAMPLE_RECORD))
+
+
+class TestMarcRecordIndex:
+    def test_datafields_grouped_by_tag(self, index):
+        assert [len(fields) for fields in index.datafields.values()] == [1, 2]
+
+    def test_indicators(self, index):
+        field = index.get_datafields("245")[0]
+        assert (field.ind1, field.ind2) == ("1", "0")
+
+    def test_controlfields(self, index):
+        assert index.controlfields == {"001": "99123"}
+
+    def test_get_values_strips_and_skips_empty(self, index):
+        assert index.get_values("650", "z") == ["Ireland", "Dublin"]
+
+    def test_get_values_missing_tag(self, index):
+        assert index.get_values("700", "a") == []
+
+    def test_organize_with_code_and_value(self, index):
+        assert index.organize_with_code_and_value()["650"][1] == [
+            {"code": "a", "value": "Tolls"},
+            {"code": "z", "value": " "},
+        ]
+
+    def test_organize_one_code_per_subfield(self, index):
+        assert index.organize_one_code_per_subfield()["245"] == [
+            {"a": "Spam :", "b": "a study /"}
+        ]
+
+    def test_record_walked_once(self, monkeypatch):
+        element = ET.fromstring(SAMPLE_RECORD)
+        calls = []
+        index = marc.MarcRecordIndex(element)
+        original_build = index._build
+
+        def build():
+            calls.append(True)
+            original_build()
+
+        monkeypatch.setattr(index, "_build", build)
+        index.get_values("245", "a")
+        index.get_values("650", "a")
+        index.organize_with_code_and_value()
+        assert len(calls) == 1
+
+    def test_from_fields(self):
+        index = marc.MarcRecordIndex.from_fields([
+            marc.DataField(tag="245", subfields=(("a", "Spam"),))
+        ])
+        assert index.get_values("245", "a") == ["Spam"]
+
+
+def test_as_record_index_reuses_index(index):
+    assert marc.as_record_index(index) is index
+
+
+class TestParseMarcFields:
+    def test_only_wanted_datafields_kept(self):
+        index = marc.parse_marc_fields(SAMPLE_RECORD.encode("utf-8"), ["650"])
+        assert list(index.datafields) == ["650"]
+        assert index.get_values("650", "a") == ["Toll roads", "Tolls"]
+
+    def test_controlfields_always_kept(self):
+        index = marc.parse_marc_fields(SAMPLE_RECORD.encode("utf-8"), [])
+        assert index.datafields == {}
+        assert index.controlfields == {"001": "99123"}
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+    def test_same_as_full_tree(self, index, chunk_size):
+        parsed = marc.parse_marc_fields(
+            SAMPLE_RECORD.encode("utf-8"), chunk_size=chunk_size
+        )
+        assert parsed.datafields == index.datafields
+        assert parsed.controlfields == index.controlfields
+
+    def test_invalid_record(self):
+        with pytest.raises(ET.ParseError):
+            marc.parse_marc_fields(b"<record><datafield></record>")
+
+
+class TestParseMarcCollectionFields:
+    @pytest.fixture
+    def collection(self):
+        return (
+            f'<collection xmlns="{marc.MARC_SLIM_XML_NAMESPACE}">'
+            f"{SAMPLE_RECORD}{SAMPLE_RECORD.replace('99123', '99124')}"
+            f"</collection>"
+        ).encode("utf-8")
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+    def test_each_record_indexed(self, index, collection, chunk_size):
+        parsed = marc.parse_marc_collection_fields(
+            collection, chunk_size=chunk_size
+        )
+        assert [record.controlfields["001"] for record in parsed] == [
+            "99123",
+            "99124",
+        ]
+        assert all(record.datafields == index.datafields for record in parsed)
+
+    def test_only_wanted_datafields_kept(self, collection):
+        parsed = marc.parse_marc_collection_fields(collection, ["650"])
+        assert [list(record.datafields) for record in parsed] == [
+            ["650"],
+            ["650"],
+        ]
+
+    def test_single_record(self, index):
+        (parsed,) = marc.parse_marc_collection_fields(
+            SAMPLE_RECORD.encode("utf-8")
+        )
+        assert parsed.datafields == index.datafields
@@ -0,0 +1,220 @@
+import contextlib
+import os
+import pathlib
+import sqlite3
+import xml.etree.ElementTree as ET
+from unittest.mock import Mock
+
+import pytest
+
+from galatea import marc_files
+
+SAMPLE_COLLECTION = """<?xml version="1.0" encoding="UTF-8"?>
+<marc:collection xmlns:marc="http://www.loc.gov/MARC21/slim">
+<marc:record>
+<marc:controlfield tag="001">991</marc:controlfield>
+<marc:datafield ind1="0" ind2="0" tag="245">
+<marc:subfield code="a">Café</marc:subfield>
+</marc:datafield>
+</marc:record>
+<marc:record>
+<marc:controlfield tag="001">992</marc:controlfield>
+<marc:datafield ind1="0" ind2="0" tag="245">
+<marc:subfield code="a">Bacon</marc:subfield>
+</marc:datafield>
+</marc:record>
+<record xmlns="http://www.loc.gov/MARC21/slim">
+<controlfield tag="001">993</controlfield>
+<datafield ind1="0" ind2="0" tag="245">
+<subfield code="a">Eggs</subfield>
+</datafield>
+</record>
+<marc:record>
+<marc:datafield ind1="0" ind2="0" tag="245">
+<marc:subfield code="a">No identifier</marc:subfield>
+</marc:datafield>
+</marc:record>
+</marc:collection>
+"""
+
+
+def get_title(record):
+    return record.find(
+        ".//{http://www.loc.gov/MARC21/slim}subfield[@code='a']"
+    ).text
+
+
+@pytest.fixture
+def collection_file(tmp_path):
+    path = tmp_path / "records.xml"
+    path.write_text(SAMPLE_COLLECTION, encoding="utf-8")
+    return path
+
+
+class TestMarcXmlRecordFile:
+    def test_indexes_records_by_001(self, collection_file):
+        with marc_files.MarcXmlRecordFile(collection_file) as records:
+            assert sorted(records.index) == ["991", "992", "993"]
+
+    @pytest.mark.parametrize(
+        "mmsid, expected_title",
+        [("991", "Café"), ("992", "Bacon"), ("993", "Eggs")],
+    )
+    def test_get_record(self, collection_file, mmsid, expected_title):
+        with marc_files.MarcXmlRecordFile(collection_file) as records:
+            record = records(mmsid)
+        assert record.tag == "{http://www.loc.gov/MARC21/slim}record"
+        assert get_title(record) == expected_title
+
+    def test_missing_record(self, collection_file):
+        with marc_files.MarcXmlRecordFile(collection_file) as records:
+            with pytest.raises(marc_files.RecordNotInFileError):
+                records("404")
+
+    def test_index_saved_next_to_file(self, collection_file):
+        with marc_files.MarcXmlRecordFile(collection_file):
+            pass
+        assert collection_file.with_name("records.xml.index").exists()
+
+    def test_saved_index_reused(self, collection_file, monkeypatch):
+        with marc_files.MarcXmlRecordFile(collection_file):
+            pass
+        build = Mock(side_effect=AssertionError("index rebuilt"))
+        monkeypatch.setattr(marc_files, "build_marcxml_index", build)
+        with marc_files.MarcXmlRecordFile(collection_file) as records:
+            assert get_title(records("992")) == "Bacon"
+
+    def test_index_rebuilt_when_file_changes(self, collection_file):
+        with marc_files.MarcXmlRecordFile(collection_file):
+            pass
+        collection_file.write_text(
+            SAMPLE_COLLECTION.replace("Bacon", "Spam and bacon"),
+            encoding="utf-8",
+        )
+        stat = collection_file.stat()
+        os.utime(
+            collection_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9)
+        )
+        with marc_files.MarcXmlRecordFile(collection_file) as records:
+            assert get_title(records("992")) == "Spam and bacon"
+            assert get_title(records("993")) == "Eggs"
+
+    def test_invalid_xml(self, tmp_path):
+        source = tmp_path / "records.xml"
+        source.write_text("<collection><record>", encoding="utf-8")
+        with pytest.raises(marc_files.BadRecordFileError):
+            marc_files.MarcXmlRecordFile(source).open()
+        assert list(tmp_path.iterdir()) == [source]
+
+    def test_index_kept_in_sqlite(self, collection_file):
+        with marc_files.MarcXmlRecordFile(collection_file):
+            pass
+        index_file = collection_file.with_name("records.xml.index")
+        with contextlib.closing(sqlite3.connect(index_file)) as connection:
+            count = connection.execute(
+                "SELECT COUNT(*) FROM records"
+            ).fetchone()[0]
+        assert count == 3
+
+    def test_old_index_rebuilt(self, collection_file):
+        index_file = collection_file.with_name("records.xml.index")
+        index_file.write_text('{"version": 1, "records": {}}')
+        with marc_files.MarcXmlRecordFile(collection_file) as records:
+            assert get_title(records("992")) == "Bacon"
+        assert marc_files.RecordFileIndex.load(index_file, "marcxml")
+
+    def test_index_in_temporary_file_when_not_writable(
+        self, collection_file, tmp_path
+    ):
+        index_file = tmp_path / "missing" / "records.xml.index"
+        with marc_files.MarcXmlRecordFile(
+            collection_file, index_file=index_file
+        ) as records:
+            assert get_title(records("993")) == "Eggs"
+        assert not index_file.parent.exists()
+
+    def test_duplicate_record_uses_first(self, tmp_path):
+        source = tmp_path / "records.xml"
+        source.write_text(
+            SAMPLE_COLLECTION.replace(">992<", ">991<"), encoding="utf-8"
+        )
+        with marc_files.MarcXmlRecordFile(source) as records:
+            assert len(records) == 2
+            assert get_title(records("991")) == "Café"
+
+    def test_record_parses_like_standalone(self, collection_file):
+        with marc_files.MarcXmlRecordFile(collection_file) as records:
+            record = records("993")
+        expected = ET.fromstring(SAMPLE_COLLECTION.encode("utf-8"))[2]
+        expected.tail = None
+        assert ET.tostring(record) == ET.tostring(expected)
+
+
+SAMPLE_MRC_FILE = pathlib.Path(__file__).parent / "data" / "sample_records.mrc"
+
+
+@pytest.fixture
+def mrc_file(tmp_path):
+    path = tmp_path / "records.mrc"
+    path.write_bytes(SAMPLE_MRC_FILE.read_bytes())
+    return path
+
+
+class TestIso2709RecordFile:
+    def test_indexes_records_by_001(self, mrc_file):
+        with marc_files.Iso2709RecordFile(mrc_file) as records:
+            assert sorted(records.index) == [
+                "991234",
+                "995678",
+                "999999",
+            ]
+
+    @pytest.mark.parametrize(
+        "mmsid, expected_title",
+        [
+            ("991234", "Café au lait"),
+            ("995678", "Bacon"),
+            ("999999", "Ni ĥao 你好"),
+        ],
+    )
+    def test_get_record(self, mrc_file, mmsid, expected_title):
+        with marc_files.Iso2709RecordFile(mrc_file) as records:
+            record = records(mmsid)
+        assert record.get_values("245", "a") == [expected_title]
+        assert record.controlfields["001"] == mmsid
+
+    def test_repeated_fields(self, mrc_file):
+        with marc_files.Iso2709RecordFile(mrc_file) as records:
+            record = records("995678")
+        assert record.get_values("650", "a") == ["Pork", "Eggs"]
+        assert record.get_datafields("650")[0].ind2 == "0"
+
+    def test_missing_record(self, mrc_file):
+        with marc_files.Iso2709RecordFile(mrc_file) as records:
+            with pytest.raises(marc_files.RecordNotInFileError):
+                records("404")
+
+    def test_line_breaks_between_records(self, tmp_path):
+        source = tmp_path / "records.mrc"
+        source.write_bytes(
+            SAMPLE_MRC_FILE.read_bytes().replace(b"\x1d", b"\x1d\n")
+        )
+        with marc_files.Iso2709RecordFile(source) as records:
+            assert len(records) == 3
+            assert records("999999").get_values("245", "c") == ["by Spam"]
+
+    def test_truncated_file(self, tmp_path):
+        source = tmp_path / "records.mrc"
+        source.write_bytes(SAMPLE_MRC_FILE.read_bytes()[:-10])
+        with pytest.raises(marc_files.BadRecordFileError):
+            marc_files.Iso2709RecordFile(source).open()
+
+    def test_index_not_shared_with_marcxml(self, mrc_file):
+        with marc_files.Iso2709RecordFile(mrc_file):
+            pass
+        assert (
+            marc_files.RecordFileIndex.load(
+                mrc_file.with_name("records.mrc.index"), "marcxml"
+            )
+            is None
+        )
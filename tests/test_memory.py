@@ -0,0 +1,174 @@
+"""Peak memory of the commands on generated tables, checked with tracemalloc.
+
+Each command runs on a small and a large table. Its peak memory must stay
+within a budget made of a fixed part and a part for each row. Streaming
+modes have no budget for each row, so their peak memory must not grow with
+the number of rows.
+"""
+
+import dataclasses
+import gc
+import logging
+import pathlib
+import tracemalloc
+from typing import Callable, Dict
+
+import pytest
+
+from benchmarks import synthetic
+from galatea import clean_tsv, marc_files, merge_data, resolve_authorized_terms
+
+import stand_in_servers
+
+SMALL_TABLE = 100
+LARGE_TABLE = 400
+KiB = 1024
+MiB = 1024 * KiB
+# Allocations that come and go, such as buffers, make the peak memory of
+# two runs differ a little even if nothing is kept.
+NOISE = 64 * KiB
+
+
+@dataclasses.dataclass
+class MemoryBudget:
+    base: int
+    per_row: int
+
+    def for_rows(self, rows: int) -> int:
+        return self.base + self.per_row * rows
+
+
+@dataclasses.dataclass
+class Inputs:
+    folder: pathlib.Path
+    getmarc_server: str
+
+    @property
+    def tsv_file(self) -> pathlib.Path:
+        return self.folder / "table.tsv"
+
+    @property
+    def output_file(self) -> pathlib.Path:
+        return self.folder / "output.tsv"
+
+
+def peak_memory(func: Callable[[], None]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_clean_tsv(inputs: Inputs) -> None:
+    clean_tsv.clean_tsv(inputs.tsv_file, inputs.output_file)
+
+
+def run_clean_tsv_delta(inputs: Inputs) -> None:
+    clean_tsv.clean_tsv(inputs.tsv_file, inputs.output_file, delta_output=True)
+
+
+def run_resolve_authorized_terms(inputs: Inputs) -> None:
+    resolve_authorized_terms.resolve_authorized_terms(
+        inputs.tsv_file,
+        inputs.folder / "transformations.tsv",
+        inputs.output_file,
+    )
+
+
+def run_merge_from_record_file(inputs: Inputs) -> None:
+    merge_data.merge_from_record_file(
+        inputs.tsv_file,
+        inputs.output_file,
+        inputs.folder / "mapping.toml",
+        marc_files.MarcXmlRecordFile(inputs.folder / "records.xml"),
+    )
+
+
+def run_merge_from_getmarc(inputs: Inputs) -> None:
+    merge_data.merge_from_getmarc(
+        inputs.tsv_file,
+        inputs.output_file,
+        inputs.folder / "mapping.toml",
+        inputs.getmarc_server,
+        max_concurrency=4,
+    )
+
+
+# A row of the generated tables takes about 1.5 KiB once read. Commands
+# that hold the whole table, as clean_tsv and resolve_authorized_terms do
+# unless they write a delta, are allowed about twice that for each row.
+# Merges write rows as they go and only keep a few hundred bytes for each
+# distinct record, such as its place in the record file or the number of
+# rows using it.
+COMMANDS = {
+    "clean_tsv": (run_clean_tsv, MemoryBudget(1 * MiB, 3 * KiB)),
+    "clean_tsv_delta": (run_clean_tsv_delta, MemoryBudget(1 * MiB, 0)),
+    "resolve_authorized_terms": (
+        run_resolve_authorized_terms,
+        MemoryBudget(1 * MiB, 4 * KiB),
+    ),
+    "merge_from_record_file": (
+        run_merge_from_record_file,
+        MemoryBudget(1 * MiB, 1 * KiB),
+    ),
+    "merge_from_getmarc": (
+        run_merge_from_getmarc,
+        MemoryBudget(1 * MiB, 1 * KiB),
+    ),
+}
+
+
+@pytest.fixture(autouse=True)
+def no_logging():
+    # Log records kept by pytest would count against the commands.
+    logging.disable(logging.WARNING)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+@pytest.fixture(scope="module")
+def tables(tmp_path_factory):
+    records = {}
+    folders = {}
+    for rows in (SMALL_TABLE, LARGE_TABLE):
+        table = synthetic.SyntheticTable(rows)
+        folder = tmp_path_factory.mktemp(f"{rows}_rows")
+        synthetic.write_tsv(folder / "table.tsv", table)
+        synthetic.write_marcxml(folder / "records.xml", table.mmsids())
+        with marc_files.MarcXmlRecordFile(folder / "records.xml"):
+            pass
+        synthetic.write_mapping_file(folder / "mapping.toml")
+        synthetic.write_transformation_file(
+            folder / "transformations.tsv", table, terms=20
+        )
+        records.update(
+            (mmsid, stand_in_servers.make_marc_record(mmsid))
+            for mmsid in table.mmsids()
+        )
+        folders[rows] = folder
+    with stand_in_servers.GetMarcStandInServer(records) as server:
+        yield {
+            rows: Inputs(folder, server.url)
+            for rows, folder in folders.items()
+        }
+
+
+@pytest.mark.parametrize("command", list(COMMANDS))
+def test_peak_memory_within_budget(command, tables: Dict[int, Inputs]):
+    run, budget = COMMANDS[command]
+    # Caches filled on first use, such as compiled patterns, are not part
+    # of the peak memory of later runs.
+    run(tables[SMALL_TABLE])
+    small = peak_memory(lambda: run(tables[SMALL_TABLE]))
+    large = peak_memory(lambda: run(tables[LARGE_TABLE]))
+    assert small <= budget.for_rows(SMALL_TABLE)
+    assert large <= budget.for_rows(LARGE_TABLE)
+    assert large - small <= (
+        budget.per_row * (LARGE_TABLE - SMALL_TABLE) + NOISE
+    ), (
+        f"{command} used {(large - small) // (LARGE_TABLE - SMALL_TABLE)} "
+        f"more bytes for each row, over a budget of {budget.per_row}"
+    )
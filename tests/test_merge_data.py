@@ -1,9 +1,12 @@
+import asyncio
+import collections
 import csv
 import io
 import os
 import pathlib
 import sys
-import xml
+import threading
+import time
 
 from galatea.merge_data import GetMarcRetrievalError
 
@@ -11,13 +14,15 @@ if sys.version_info >= (3, 11):
     import tomllib
 else:
     import tomli as tomllib
-from unittest.mock import MagicMock, ANY, Mock, PropertyMock
+from unittest.mock import MagicMock, ANY, Mock
 import xml.etree.ElementTree as ET
 import pytest
 
 from jinja2 import Template
 
 from galatea import merge_data
+
+import stand_in_servers
 from galatea.utils import GalateaException, CommandFinishedWithException
 
 
@@ -187,6 +192,11 @@ def test_merge_from_getmarc_uses_row_merge_data_strategy(monkeypatch):
         ANY,
         "excel-tab",
         False,
+        max_concurrency=1,
+        jinja_bytecode_cache_dir=None,
+        start_after_line=0,
+        on_records_planned=None,
+        on_mapping_planned=ANY,
     )
 
 
@@ -203,14 +213,18 @@ def test_merge_from_getmarc_uses_write_merge_data_strategy(monkeypatch):
         output_metadata_tsv_file,
         mapping_file,
         "spamserver",
-        Mock(name="row_merge_data_strategy", return_value=[{"some": "data"}]),
+        Mock(
+            name="row_merge_data_strategy",
+            return_value=[merge_data.MergedRow(2, {"some": "data"})],
+        ),
         write_to_file_strategy,
     )
 
     write_to_file_strategy.assert_called_once_with(
-        [{"some": "data"}],
+        ANY,
         "excel-tab",
-        output_metadata_tsv_file.open("rb").__enter__(),
+        output_metadata_tsv_file.with_name().open("w").__enter__(),
+        write_header=True,
     )
 
 
@@ -269,7 +283,7 @@ identifier_key = "Bibliographic Identifier"
 key = "Uniform Title"
 matching_marc_fields = []
 delimiter = "||"
-existing_data = "keep"
+existing_data = "replace"
 
 [[mapping]]
 key = "Some Other Mapping not found in the tsv"
@@ -290,20 +304,30 @@ existing_data = "keep"
         )
 
 
-def test_merge_from_getmarc_raise_CommandFinishedWithException(monkeypatch):
+def test_merge_from_getmarc_raise_CommandFinishedWithException(
+    monkeypatch, tmp_path
+):
+    input_metadata_tsv_file = tmp_path / "input.tsv"
+    input_metadata_tsv_file.write_text("")
+    mapping_file = tmp_path / "mapping.toml"
+    mapping_file.write_text("")
+    monkeypatch.setattr(
+        merge_data.tsv, "get_tsv_dialect", Mock(return_value="excel-tab")
+    )
     with pytest.raises(CommandFinishedWithException) as error:
-        monkeypatch.setattr(
-            merge_data.tsv, "get_tsv_dialect", Mock(return_value="excel-tab")
-        )
         merge_data.merge_from_getmarc(
-            input_metadata_tsv_file=MagicMock(),
-            output_metadata_tsv_file=MagicMock(),
-            mapping_file=MagicMock(),
+            input_metadata_tsv_file=input_metadata_tsv_file,
+            output_metadata_tsv_file=tmp_path / "output.tsv",
+            mapping_file=mapping_file,
             get_marc_server="dummy",
             row_merge_data_strategy=Mock(
-                side_effect=merge_data.NonFatalMergingRowError()
+                return_value=[
+                    merge_data.MergedRow(
+                        2, {"spam": "bacon"}, failed_identifier="spam_id"
+                    )
+                ]
             ),
-            write_to_file_strategy=Mock(),
+            retry_policy=merge_data.RetryPolicy(rounds=0),
         )
     assert "Unable to complete merge data from" in str(error.value)
 
@@ -659,7 +683,7 @@ def test_serialize_with_jinja_template_type_error_raise_serialization_error(
 
 
 def test_get_matching_marc_data():
-    request_strategy = Mock(return_value=Mock(text="<spam></spam>"))
+    request_strategy = Mock(return_value=Mock(content=b"<spam></spam>"))
     merge_data.get_matching_marc_data(
         mmsid="12344556677",
         get_marc_server="https://spamserver",
@@ -680,10 +704,7 @@ def test_get_matching_marc_data_empty_mmsid_raises_exception():
 
 
 def test_get_matching_marc_data_parse_error_raises_GetMarcRetrevialError():
-    response = MagicMock(name="Response")
-    type(response).text = PropertyMock(
-        side_effect=xml.etree.ElementTree.ParseError
-    )
+    response = Mock(name="Response", content=b"<record>not closed")
 
     request_strategy = Mock(return_value=response)
 
@@ -917,9 +938,11 @@ def test_row_merge_data_strategy_bad_mapping_data_source(fs):
     with pytest.raises(merge_data.BadMappingFileError) as error:
         merge_data.merge_from_getmarc(
             input_metadata_tsv_file=input_metadata_tsv_file,
-            output_metadata_tsv_file=Mock(),
+            output_metadata_tsv_file=pathlib.Path(
+                os.path.join("fake_data", "output.tsv")
+            ),
             mapping_file=mapping_file,
-            get_marc_server=Mock(),
+            get_marc_server="https://spamserver",
         )
     assert error.value.source == mapping_file
 
@@ -942,11 +965,13 @@ def test_row_merge_data_strategy_bad_mapping_data_details(fs):
     with pytest.raises(merge_data.BadMappingFileError) as error:
         merge_data.merge_from_getmarc(
             input_metadata_tsv_file=input_metadata_tsv_file,
-            output_metadata_tsv_file=Mock(),
+            output_metadata_tsv_file=pathlib.Path(
+                os.path.join("fake_data", "output.tsv")
+            ),
             mapping_file=pathlib.Path(
                 os.path.join("fake_data", "mapping_file.toml")
             ),
-            get_marc_server=Mock(),
+            get_marc_server="https://spamserver",
         )
     assert error.value.details is not None
 
@@ -1001,3 +1026,1140 @@ class TestNonFatalMergingRowError:
         with pytest.raises(merge_data.NonFatalMergingRowError) as e:
             raise merge_data.NonFatalMergingRowError(recovered_data=data)
         assert e.value.recovered_data == data
+
+
+class TestIterWithPrefetchedRecords:
+    def test_sequential_fetches_when_needed(self):
+        fetch = Mock(side_effect=lambda key: f"record {key}")
+        results = merge_data.iter_with_prefetched_records(
+            ["a", "b"], record_key=lambda item: item, fetch=fetch
+        )
+        item, record = next(results)
+        assert (item, record.result()) == ("a", "record a")
+        fetch.assert_called_once_with("a")
+
+    def test_items_without_key_have_no_record(self):
+        results = merge_data.iter_with_prefetched_records(
+            ["a", ""],
+            record_key=lambda item: item or None,
+            fetch=lambda key: key,
+            max_concurrency=4,
+        )
+        assert [record is None for _, record in results] == [False, True]
+
+    def test_exceptions_are_raised_from_result(self):
+        results = merge_data.iter_with_prefetched_records(
+            ["a"],
+            record_key=lambda item: item,
+            fetch=Mock(side_effect=merge_data.GetMarcRetrievalError("a")),
+        )
+        _, record = next(results)
+        with pytest.raises(merge_data.GetMarcRetrievalError):
+            record.result()
+
+    def test_concurrent_fetches_keep_order_and_limit(self):
+        lock = threading.Lock()
+        in_flight = 0
+        max_in_flight = 0
+
+        def fetch(key):
+            nonlocal in_flight, max_in_flight
+            with lock:
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+            time.sleep(0.001 * (key % 3))
+            with lock:
+                in_flight -= 1
+            return key
+
+        results = merge_data.iter_with_prefetched_records(
+            range(50),
+            record_key=lambda item: item,
+            fetch=fetch,
+            max_concurrency=3,
+        )
+        assert [record.result() for _, record in results] == list(range(50))
+        assert max_in_flight <= 3
+
+    def test_invalid_max_concurrency(self):
+        with pytest.raises(ValueError):
+            next(
+                merge_data.iter_with_prefetched_records(
+                    ["a"], lambda item: item, lambda key: key, 0
+                )
+            )
+
+
+def test_merge_data_from_getmarc_concurrent_keeps_row_order():
+    mapping_file_contents = b"""
+[mappings]
+identifier_key = "Bibliographic Identifier"
+
+[[mapping]]
+key = "Uniform Title"
+matching_marc_fields = ["120a"]
+delimiter = "||"
+existing_data = "replace"
+"""
+    metadata_tsv_file_contents = "\n".join(
+        ['"Uniform Title"\t"Bibliographic Identifier"']
+        + [f'""\t"{i}"' for i in range(20)]
+    )
+
+    def get_marc_server_strategy(mmsid):
+        time.sleep(0.001 * (int(mmsid) % 3))
+        return ET.fromstring(
+            SAMPLE_ALMA_RECORD.replace("Bacon", f"Title {mmsid}")
+        )
+
+    rows = merge_data.merge_data_from_getmarc(
+        io.BytesIO(mapping_file_contents),
+        input_metadata_tsv_fp=io.StringIO(metadata_tsv_file_contents),
+        get_marc_server_strategy=get_marc_server_strategy,
+        dialect="excel-tab",
+        max_concurrency=4,
+    )
+    assert [row["Uniform Title"] for row in rows] == [
+        f"Title {i}" for i in range(20)
+    ]
+
+
+def test_merge_data_from_getmarc_offline_missing_record_is_non_fatal():
+    with pytest.raises(merge_data.NonFatalMergingRowError) as error:
+        merge_data.merge_data_from_getmarc(
+            io.BytesIO(SAMPLE_MAPPING_FILE_CONTENTS),
+            input_metadata_tsv_fp=io.StringIO(
+                SAMPLE_METADATA_TSV_FILE_CONTENTS
+            ),
+            get_marc_server_strategy=Mock(
+                side_effect=merge_data.record_cache.RecordNotCachedError(
+                    "dummy_id"
+                )
+            ),
+            dialect="excel-tab",
+        )
+    assert len(error.value.recovered_data) == 1
+
+
+def test_merge_from_getmarc_offline_requires_cache():
+    with pytest.raises(ValueError):
+        merge_data.merge_from_getmarc(
+            input_metadata_tsv_file=MagicMock(),
+            output_metadata_tsv_file=MagicMock(),
+            mapping_file=MagicMock(),
+            get_marc_server="dummy",
+            offline=True,
+        )
+
+
+class TestIterWithPrefetchedRecordsMemo:
+    @pytest.mark.parametrize("max_concurrency", [1, 3])
+    def test_each_key_fetched_once(self, max_concurrency):
+        fetch = Mock(side_effect=lambda key: f"record {key}")
+        results = merge_data.iter_with_prefetched_records(
+            ["a", "b", "a", "a", "b"],
+            record_key=lambda item: item,
+            fetch=fetch,
+            max_concurrency=max_concurrency,
+        )
+        assert [record.result() for _, record in results] == [
+            "record a",
+            "record b",
+            "record a",
+            "record a",
+            "record b",
+        ]
+        assert fetch.call_count == 2
+
+    def test_record_released_after_last_use(self):
+        fetch = Mock(side_effect=lambda key: f"record {key}")
+        results = merge_data.iter_with_prefetched_records(
+            ["a", "a", "b", "a"],
+            record_key=lambda item: item,
+            fetch=fetch,
+            key_counts={"a": 2, "b": 1},
+        )
+        list(results)
+        # The last "a" is fetched again because the count said it was
+        # only needed twice.
+        assert [c.args[0] for c in fetch.call_args_list] == ["a", "b", "a"]
+
+
+def test_merge_data_from_getmarc_fetches_repeated_ids_once(caplog):
+    metadata_tsv_file_contents = """
+"Uniform Title"	"Bibliographic Identifier"
+""	"id_1"
+""	"id_2"
+""	"id_1"
+""	"id_1"
+""".lstrip()
+    get_marc_server_strategy = Mock(
+        return_value=ET.fromstring(SAMPLE_ALMA_RECORD)
+    )
+    merge_data.merge_data_from_getmarc(
+        io.BytesIO(SAMPLE_MAPPING_FILE_CONTENTS),
+        input_metadata_tsv_fp=io.StringIO(metadata_tsv_file_contents),
+        get_marc_server_strategy=get_marc_server_strategy,
+        dialect="excel-tab",
+    )
+    assert get_marc_server_strategy.call_count == 2
+    assert "Found 2 distinct record(s) to merge for 4 row(s)." in caplog.text
+
+
+@pytest.mark.parametrize(
+    "row, existing_data, expected",
+    [
+        ({"Title": "spam", "Date": "1999"}, "keep", False),
+        ({"Title": "spam", "Date": ""}, "keep", True),
+        ({"Title": "spam", "Date": "1999"}, "replace", True),
+        ({"Title": "spam", "Date": "1999"}, "append", True),
+        ({"Other": ""}, "keep", False),
+    ],
+)
+def test_row_needs_record(row, existing_data, expected):
+    mapping = {
+        key: merge_data.MappingConfig(
+            key=key,
+            matching_keys=["120a"],
+            delimiter="||",
+            existing_data=existing_data,
+        )
+        for key in ["Title", "Date"]
+    }
+    assert merge_data.row_needs_record(row, mapping) is expected
+
+
+def test_merge_data_from_getmarc_skips_fetch_for_complete_rows(caplog):
+    metadata_tsv_file_contents = """
+"Uniform Title"	"Bibliographic Identifier"
+"spam"	"id_1"
+""	"id_2"
+""".lstrip()
+    get_marc_server_strategy = Mock(
+        return_value=ET.fromstring(SAMPLE_ALMA_RECORD)
+    )
+    rows = merge_data.merge_data_from_getmarc(
+        io.BytesIO(SAMPLE_MAPPING_FILE_CONTENTS),
+        input_metadata_tsv_fp=io.StringIO(metadata_tsv_file_contents),
+        get_marc_server_strategy=get_marc_server_strategy,
+        dialect="excel-tab",
+    )
+    get_marc_server_strategy.assert_called_once_with("id_2")
+    assert rows[0]["Uniform Title"] == "spam"
+    assert "1 skipped because every mapped column" in caplog.text
+
+
+@pytest.mark.parametrize(
+    "mapped_value, expected",
+    [
+        ("245$a", merge_data.MarcSelector(tag="245", subfield="a")),
+        ("245a", merge_data.MarcSelector(tag="245", subfield="a")),
+        ("650", merge_data.MarcSelector(tag="650", subfield=None)),
+        ("spam", None),
+        ("24$a", None),
+    ],
+)
+def test_parse_marc_selector(mapped_value, expected):
+    assert merge_data.parse_marc_selector(mapped_value) == expected
+
+
+class TestReadMappingPlan:
+    mapping_file_contents = b"""
+[mappings]
+identifier_key = "Bibliographic Identifier"
+
+[[mapping]]
+key = "Uniform Title"
+matching_marc_fields = ["120$a", "not a field", "040d"]
+delimiter = "||"
+existing_data = "keep"
+"""
+
+    def test_identifier_key(self):
+        plan = merge_data.read_mapping_plan(
+            io.BytesIO(self.mapping_file_contents)
+        )
+        assert plan.identifier_key == "Bibliographic Identifier"
+
+    def test_selectors_are_parsed(self, caplog):
+        plan = merge_data.read_mapping_plan(
+            io.BytesIO(self.mapping_file_contents)
+        )
+        assert plan.columns["Uniform Title"].selectors == (
+            merge_data.MarcSelector(tag="120", subfield="a"),
+            merge_data.MarcSelector(tag="040", subfield="d"),
+        )
+        assert '"not a field"' in caplog.text
+
+    def test_toml_loaded_once(self, monkeypatch):
+        load = Mock(wraps=merge_data.tomllib.load)
+        monkeypatch.setattr(merge_data.tomllib, "load", load)
+        merge_data.read_mapping_plan(io.BytesIO(self.mapping_file_contents))
+        load.assert_called_once()
+
+    def test_plan_is_immutable(self):
+        plan = merge_data.read_mapping_plan(
+            io.BytesIO(self.mapping_file_contents)
+        )
+        with pytest.raises(TypeError):
+            plan.columns["spam"] = None
+
+    def test_marc_tags(self):
+        plan = merge_data.read_mapping_plan(
+            io.BytesIO(self.mapping_file_contents)
+        )
+        assert plan.marc_tags == {"120", "040"}
+
+    def test_serialize(self):
+        plan = merge_data.read_mapping_plan(
+            io.BytesIO(self.mapping_file_contents)
+        )
+        assert plan.serialize(
+            ET.fromstring(SAMPLE_ALMA_RECORD),
+            plan.configs["Uniform Title"],
+            False,
+        ) == ("Bacon||TJC||OCLCQ||OCLCG||OCLCF||OCLCO||OCLCA")
+
+
+def test_merge_data_from_getmarc_shares_record_index_between_rows(
+    monkeypatch,
+):
+    metadata_tsv_file_contents = """
+"Uniform Title"	"Bibliographic Identifier"
+""	"id_1"
+""	"id_1"
+""".lstrip()
+    seen_records = []
+
+    def serialize(record, config, enable_experimental_features):
+        seen_records.append(record)
+        return "spam"
+
+    monkeypatch.setattr(
+        merge_data.MappingPlan,
+        "serialize",
+        lambda self, *args: serialize(*args),
+    )
+    merge_data.merge_data_from_getmarc(
+        io.BytesIO(SAMPLE_MAPPING_FILE_CONTENTS),
+        input_metadata_tsv_fp=io.StringIO(metadata_tsv_file_contents),
+        get_marc_server_strategy=Mock(
+            return_value=ET.fromstring(SAMPLE_ALMA_RECORD)
+        ),
+        dialect="excel-tab",
+    )
+    assert len(seen_records) == 2
+    assert isinstance(seen_records[0], merge_data.MarcRecordIndex)
+    assert seen_records[0] is seen_records[1]
+
+
+class TestJinjaTemplatePlan:
+    mapping_file_contents = b"""
+[mappings]
+identifier_key = "Bibliographic Identifier"
+
+[[mapping]]
+key = "Uniform Title"
+matching_marc_fields = ["040"]
+serialize_method = "jinja2template"
+jinja_template = "{% for field in fields['040'] %}{{ field[0]['value'] }}{% endfor %}"
+delimiter = "||"
+existing_data = "replace"
+"""
+
+    def test_template_compiled_when_mapping_is_loaded(self):
+        plan = merge_data.read_mapping_plan(
+            io.BytesIO(self.mapping_file_contents)
+        )
+        assert isinstance(
+            plan.columns["Uniform Title"].template, merge_data.jinja2.Template
+        )
+
+    def test_templates_use_every_tag(self):
+        plan = merge_data.read_mapping_plan(
+            io.BytesIO(self.mapping_file_contents)
+        )
+        assert plan.marc_tags is None
+
+    def test_template_not_compiled_per_row(self, monkeypatch):
+        plan = merge_data.read_mapping_plan(
+            io.BytesIO(self.mapping_file_contents)
+        )
+        monkeypatch.setattr(
+            merge_data.jinja2,
+            "Template",
+            Mock(side_effect=AssertionError("template compiled again")),
+        )
+        record = ET.fromstring(SAMPLE_ALMA_RECORD)
+        for _ in range(3):
+            assert (
+                plan.serialize(record, plan.configs["Uniform Title"], True)
+                == "PUL"
+            )
+
+    def test_bytecode_cache_written(self, tmp_path):
+        merge_data.read_mapping_plan(
+            io.BytesIO(self.mapping_file_contents),
+            jinja_bytecode_cache_dir=tmp_path / "jinja",
+        )
+        assert list((tmp_path / "jinja").iterdir())
+
+    def test_bad_template_reported_when_used(self):
+        plan = merge_data.read_mapping_plan(
+            io.BytesIO(
+                self.mapping_file_contents.replace(b"{% endfor %}", b"")
+            )
+        )
+        assert plan.columns["Uniform Title"].template is None
+        with pytest.raises(merge_data.jinja2.TemplateSyntaxError):
+            plan.serialize(
+                ET.fromstring(SAMPLE_ALMA_RECORD),
+                plan.configs["Uniform Title"],
+                True,
+            )
+
+
+def test_write_new_rows_to_file_without_header():
+    data = io.StringIO()
+    rows = [{"header1": "value1", "header2": "value2"}]
+    merge_data.write_new_rows_to_file(
+        rows, "excel-tab", data, write_header=False
+    )
+    assert data.getvalue().strip() == "value1\tvalue2"
+
+
+def fake_client(fetch):
+    return Mock(name="client", get_record=fetch, total_attempts=0)
+
+
+class TestStreamingMerge:
+    mapping_file_contents = b"""
+[mappings]
+identifier_key = "Bibliographic Identifier"
+
+[[mapping]]
+key = "Uniform Title"
+matching_marc_fields = ["120$a"]
+delimiter = "||"
+existing_data = "replace"
+"""
+
+    @pytest.fixture
+    def files(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(
+            merge_data.tsv, "get_tsv_dialect", lambda _: "excel-tab"
+        )
+        input_file = tmp_path / "input.tsv"
+        input_file.write_text(
+            "Uniform Title\tBibliographic Identifier\n"
+            + "".join(f"\tid_{i}\n" for i in range(1, 6)),
+            encoding="utf-8",
+        )
+        mapping_file = tmp_path / "mapping.toml"
+        mapping_file.write_bytes(self.mapping_file_contents)
+        return input_file, tmp_path / "output.tsv", mapping_file
+
+    def test_journal_removed_after_merge(self, files, monkeypatch):
+        input_file, output_file, mapping_file = files
+        merge_data.merge_from_getmarc(
+            input_file,
+            output_file,
+            mapping_file,
+            "spamserver",
+            client=fake_client(
+                lambda mmsid: ET.fromstring(SAMPLE_ALMA_RECORD)
+            ),
+        )
+        assert output_file.read_text(encoding="utf-8").count("Bacon") == 5
+        assert sorted(path.name for path in output_file.parent.iterdir()) == [
+            "input.tsv",
+            "mapping.toml",
+            "output.tsv",
+        ]
+
+    def test_resume_after_crash(self, files, monkeypatch):
+        input_file, output_file, mapping_file = files
+        fetched = []
+
+        def crashing_fetch(mmsid):
+            if mmsid == "id_4":
+                raise RuntimeError("network dropped")
+            fetched.append(mmsid)
+            return ET.fromstring(SAMPLE_ALMA_RECORD)
+
+        with pytest.raises(RuntimeError):
+            merge_data.merge_from_getmarc(
+                input_file,
+                output_file,
+                mapping_file,
+                "spamserver",
+                checkpoint_interval=1,
+                client=fake_client(crashing_fetch),
+            )
+        assert not output_file.exists()
+        journal = merge_data.merge_journal.MergeJournal(output_file)
+        assert journal.load().last_line_number == 4
+
+        def fetch(mmsid):
+            fetched.append(mmsid)
+            return ET.fromstring(SAMPLE_ALMA_RECORD)
+
+        fetched.clear()
+        merge_data.merge_from_getmarc(
+            input_file,
+            output_file,
+            mapping_file,
+            "spamserver",
+            resume=True,
+            client=fake_client(fetch),
+        )
+        assert fetched == ["id_4", "id_5"]
+        lines = output_file.read_text(encoding="utf-8").splitlines()
+        assert lines[0] == "Uniform Title\tBibliographic Identifier"
+        assert lines[1:] == [f"Bacon\tid_{i}" for i in range(1, 6)]
+        assert not journal.journal_file.exists()
+
+    def test_failed_identifiers_kept_in_journal(self, files, monkeypatch):
+        input_file, output_file, mapping_file = files
+
+        def fetch(mmsid):
+            if mmsid == "id_2":
+                raise GetMarcRetrievalError(mmsid)
+            if mmsid == "id_4":
+                raise RuntimeError("network dropped")
+            return ET.fromstring(SAMPLE_ALMA_RECORD)
+
+        with pytest.raises(RuntimeError):
+            merge_data.merge_from_getmarc(
+                input_file,
+                output_file,
+                mapping_file,
+                "spamserver",
+                checkpoint_interval=1,
+                client=fake_client(fetch),
+            )
+        journal = merge_data.merge_journal.MergeJournal(output_file)
+        assert journal.load().failed_identifiers == ["id_2"]
+
+    def test_resume_with_other_input_fails(self, files, tmp_path):
+        input_file, output_file, mapping_file = files
+        merge_data.merge_journal.MergeJournal(output_file).save(
+            merge_data.merge_journal.MergeCheckpoint(
+                input_file=str(tmp_path / "other.tsv")
+            )
+        )
+        with pytest.raises(merge_data.merge_journal.JournalMismatchError):
+            merge_data.merge_from_getmarc(
+                input_file,
+                output_file,
+                mapping_file,
+                "spamserver",
+                resume=True,
+            )
+
+    def test_failed_records_retried_after_merge(self, files):
+        input_file, output_file, mapping_file = files
+        attempts = collections.Counter()
+
+        def fetch(mmsid):
+            attempts[mmsid] += 1
+            if mmsid == "id_2" and attempts[mmsid] < 3:
+                raise GetMarcRetrievalError(mmsid)
+            return ET.fromstring(SAMPLE_ALMA_RECORD)
+
+        sleep = Mock(name="sleep")
+        merge_data.merge_from_getmarc(
+            input_file,
+            output_file,
+            mapping_file,
+            "spamserver",
+            client=fake_client(fetch),
+            retry_policy=merge_data.RetryPolicy(
+                rounds=3, backoff=1, sleep=sleep
+            ),
+        )
+        assert [call.args[0] for call in sleep.call_args_list] == [1, 2]
+        lines = output_file.read_text(encoding="utf-8").splitlines()
+        assert lines[1:] == [f"Bacon\tid_{i}" for i in range(1, 6)]
+        assert attempts["id_1"] == 1
+
+    def test_run_is_partial_when_retries_run_out(self, files):
+        input_file, output_file, mapping_file = files
+
+        def fetch(mmsid):
+            if mmsid == "id_2":
+                raise GetMarcRetrievalError(mmsid)
+            return ET.fromstring(SAMPLE_ALMA_RECORD)
+
+        with pytest.raises(CommandFinishedWithException):
+            merge_data.merge_from_getmarc(
+                input_file,
+                output_file,
+                mapping_file,
+                "spamserver",
+                client=fake_client(fetch),
+                retry_policy=merge_data.RetryPolicy(rounds=2, sleep=Mock()),
+            )
+        lines = output_file.read_text(encoding="utf-8").splitlines()
+        assert lines[2] == "\tid_2"
+
+    def test_shared_failed_identifier_reported_once(self, files, caplog):
+        input_file, output_file, mapping_file = files
+        input_file.write_text(
+            "Uniform Title\tBibliographic Identifier\n"
+            "\tid_2\n\tid_1\n\tid_2\n",
+            encoding="utf-8",
+        )
+
+        def fetch(mmsid):
+            if mmsid == "id_2":
+                raise GetMarcRetrievalError(mmsid)
+            return ET.fromstring(SAMPLE_ALMA_RECORD)
+
+        with pytest.raises(CommandFinishedWithException):
+            merge_data.merge_from_getmarc(
+                input_file,
+                output_file,
+                mapping_file,
+                "spamserver",
+                client=fake_client(fetch),
+                retry_policy=merge_data.RetryPolicy(rounds=0),
+            )
+        assert caplog.text.count("* id_2") == 1
+
+    def test_shared_failed_identifier_journaled_once(self, files):
+        input_file, output_file, mapping_file = files
+        input_file.write_text(
+            "Uniform Title\tBibliographic Identifier\n"
+            "\tid_2\n\tid_2\n\tid_4\n",
+            encoding="utf-8",
+        )
+
+        def fetch(mmsid):
+            if mmsid == "id_2":
+                raise GetMarcRetrievalError(mmsid)
+            raise RuntimeError("network dropped")
+
+        with pytest.raises(RuntimeError):
+            merge_data.merge_from_getmarc(
+                input_file,
+                output_file,
+                mapping_file,
+                "spamserver",
+                checkpoint_interval=1,
+                client=fake_client(fetch),
+            )
+        journal = merge_data.merge_journal.MergeJournal(output_file)
+        assert journal.load().failed_identifiers == ["id_2"]
+
+    def test_offline_records_not_retried(self, files, tmp_path):
+        input_file, output_file, mapping_file = files
+        sleep = Mock(name="sleep")
+        with pytest.raises(CommandFinishedWithException):
+            merge_data.merge_from_getmarc(
+                input_file,
+                output_file,
+                mapping_file,
+                "spamserver",
+                cache=merge_data.record_cache.MarcRecordCache(
+                    tmp_path / "cache", server="spamserver"
+                ),
+                offline=True,
+                retry_policy=merge_data.RetryPolicy(rounds=3, sleep=sleep),
+            )
+        sleep.assert_not_called()
+
+    def test_delta_output_with_retried_records(self, files, tmp_path):
+        input_file, output_file, mapping_file = files
+        attempts = collections.Counter()
+
+        def fetch(mmsid):
+            attempts[mmsid] += 1
+            if mmsid == "id_2" and attempts[mmsid] < 2:
+                raise GetMarcRetrievalError(mmsid)
+            return ET.fromstring(SAMPLE_ALMA_RECORD)
+
+        delta_file = tmp_path / "changes.tsv"
+        merge_data.merge_from_getmarc(
+            input_file,
+            delta_file,
+            mapping_file,
+            "spamserver",
+            client=fake_client(fetch),
+            retry_policy=merge_data.RetryPolicy(rounds=1, sleep=Mock()),
+            delta_output=True,
+        )
+        with delta_file.open(newline="", encoding="utf-8") as delta_fp:
+            changes = list(merge_data.delta.read_changes_fp(delta_fp))
+        assert changes == [
+            merge_data.delta.CellChange(
+                line, f"id_{line - 1}", "Uniform Title", "", "Bacon"
+            )
+            for line in range(2, 7)
+        ]
+        merge_data.delta.apply_delta(input_file, delta_file, output_file)
+        lines = output_file.read_text(encoding="utf-8").splitlines()
+        assert lines[1:] == [f"Bacon\tid_{i}" for i in range(1, 6)]
+
+
+class TestAsyncMerge:
+    @pytest.fixture
+    def files(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(
+            merge_data.tsv, "get_tsv_dialect", lambda _: "excel-tab"
+        )
+        input_file = tmp_path / "input.tsv"
+        input_file.write_text(
+            "Uniform Title\tBibliographic Identifier\n"
+            "\tid_1\n"
+            "\tid_2\n"
+            "\t\n"
+            "\tid_1\n",
+            encoding="utf-8",
+        )
+        mapping_file = tmp_path / "mapping.toml"
+        mapping_file.write_bytes(TestStreamingMerge.mapping_file_contents)
+        return input_file, mapping_file
+
+    @staticmethod
+    def merge(*args, **kwargs):
+        async def collect():
+            return [
+                row
+                async for row in merge_data.amerge_from_getmarc(
+                    *args, **kwargs
+                )
+            ]
+
+        return asyncio.run(collect())
+
+    def test_rows_in_order(self, files):
+        input_file, mapping_file = files
+        fetched = []
+
+        async def fetch(mmsid):
+            fetched.append(mmsid)
+            await asyncio.sleep(0.01 if mmsid == "id_1" else 0)
+            return ET.fromstring(SAMPLE_ALMA_RECORD)
+
+        rows = self.merge(
+            input_file, mapping_file, fetch=fetch, max_concurrency=4
+        )
+        assert [
+            (row.line_number, row.entry["Uniform Title"]) for row in rows
+        ] == [
+            (2, "Bacon"),
+            (3, "Bacon"),
+            (4, ""),
+            (5, "Bacon"),
+        ]
+        assert sorted(fetched) == ["id_1", "id_2"]
+
+    def test_failed_record(self, files):
+        input_file, mapping_file = files
+
+        async def fetch(mmsid):
+            if mmsid == "id_2":
+                raise GetMarcRetrievalError(mmsid)
+            return ET.fromstring(SAMPLE_ALMA_RECORD)
+
+        rows = self.merge(input_file, mapping_file, fetch=fetch)
+        assert [row.failed_identifier for row in rows] == [
+            None,
+            "id_2",
+            None,
+            None,
+        ]
+
+    def test_blocking_client_in_threads(self, files):
+        input_file, mapping_file = files
+        threads = set()
+
+        def get_record(mmsid):
+            threads.add(threading.get_ident())
+            return ET.fromstring(SAMPLE_ALMA_RECORD)
+
+        rows = self.merge(
+            input_file, mapping_file, client=fake_client(get_record)
+        )
+        assert rows[0].entry["Uniform Title"] == "Bacon"
+        assert threading.get_ident() not in threads
+
+    def test_requires_a_source(self, files):
+        input_file, mapping_file = files
+        with pytest.raises(ValueError):
+            self.merge(input_file, mapping_file)
+
+
+def test_merge_from_getmarc_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        merge_data.tsv, "get_tsv_dialect", lambda _: "excel-tab"
+    )
+    mmsids = [f"99{i}" for i in range(1, 8)]
+    input_file = tmp_path / "input.tsv"
+    input_file.write_text(
+        "Uniform Title\tBibliographic Identifier\n"
+        + "".join(f"\t{mmsid}\n" for mmsid in mmsids),
+        encoding="utf-8",
+    )
+    mapping_file = tmp_path / "mapping.toml"
+    mapping_file.write_text(
+        "[mappings]\n"
+        'identifier_key = "Bibliographic Identifier"\n'
+        "\n"
+        "[[mapping]]\n"
+        'key = "Uniform Title"\n'
+        'matching_marc_fields = ["245$a"]\n'
+        'delimiter = "||"\n'
+        'existing_data = "replace"\n',
+        encoding="utf-8",
+    )
+    output_file = tmp_path / "output.tsv"
+    records = {
+        mmsid: stand_in_servers.make_marc_record(mmsid, title=f"title {mmsid}")
+        for mmsid in mmsids
+    }
+    with stand_in_servers.GetMarcStandInServer(records) as server:
+        merge_data.merge_from_getmarc(
+            input_file,
+            output_file,
+            mapping_file,
+            server.url,
+            batch_size=3,
+        )
+    assert len(server.requests) == 3
+    assert output_file.read_text(encoding="utf-8").splitlines()[1:] == [
+        f"title {mmsid}\t{mmsid}" for mmsid in mmsids
+    ]
+
+
+def test_merge_from_getmarc_in_batches_only_parses_mapped_fields(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(
+        merge_data.tsv, "get_tsv_dialect", lambda _: "excel-tab"
+    )
+    input_file = tmp_path / "input.tsv"
+    input_file.write_text(
+        "Uniform Title\tBibliographic Identifier\n\t991\n\t992\n",
+        encoding="utf-8",
+    )
+    mapping_file = tmp_path / "mapping.toml"
+    mapping_file.write_text(
+        "[mappings]\n"
+        'identifier_key = "Bibliographic Identifier"\n'
+        "\n"
+        "[[mapping]]\n"
+        'key = "Uniform Title"\n'
+        'matching_marc_fields = ["245$a"]\n'
+        'delimiter = "||"\n'
+        'existing_data = "replace"\n',
+        encoding="utf-8",
+    )
+    output_file = tmp_path / "output.tsv"
+    records = {
+        mmsid: stand_in_servers.make_marc_record(mmsid, title=f"title {mmsid}")
+        for mmsid in ["991", "992"]
+    }
+    parsed_tags = []
+    parse_collection_fields = (
+        merge_data.getmarc.marc.parse_marc_collection_fields
+    )
+
+    def spy(content, tags=None, **kwargs):
+        parsed_tags.append(tags)
+        return parse_collection_fields(content, tags, **kwargs)
+
+    monkeypatch.setattr(
+        merge_data.getmarc.marc, "parse_marc_collection_fields", spy
+    )
+    monkeypatch.setattr(
+        merge_data.getmarc,
+        "parse_record",
+        Mock(side_effect=AssertionError("whole record parsed")),
+    )
+    with stand_in_servers.GetMarcStandInServer(records) as server:
+        merge_data.merge_from_getmarc(
+            input_file,
+            output_file,
+            mapping_file,
+            server.url,
+            batch_size=2,
+        )
+    assert parsed_tags == [frozenset({"245"})]
+    assert output_file.read_text(encoding="utf-8").splitlines()[1:] == [
+        "title 991\t991",
+        "title 992\t992",
+    ]
+
+
+def test_merge_from_getmarc_with_unreliable_server(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        merge_data.tsv, "get_tsv_dialect", lambda _: "excel-tab"
+    )
+    mmsids = [f"99{i}" for i in range(1, 21)]
+    input_file = tmp_path / "input.tsv"
+    input_file.write_text(
+        "Uniform Title\tBibliographic Identifier\n"
+        + "".join(f"\t{mmsid}\n" for mmsid in mmsids),
+        encoding="utf-8",
+    )
+    mapping_file = tmp_path / "mapping.toml"
+    mapping_file.write_text(
+        "[mappings]\n"
+        'identifier_key = "Bibliographic Identifier"\n'
+        "\n"
+        "[[mapping]]\n"
+        'key = "Uniform Title"\n'
+        'matching_marc_fields = ["245$a"]\n'
+        'delimiter = "||"\n'
+        'existing_data = "replace"\n',
+        encoding="utf-8",
+    )
+    output_file = tmp_path / "output.tsv"
+    records = {
+        mmsid: stand_in_servers.make_marc_record(mmsid, title=f"title {mmsid}")
+        for mmsid in mmsids
+    }
+    with stand_in_servers.GetMarcStandInServer(
+        records, latency=0.01, jitter=0.02, error_rate=0.2, seed=3
+    ) as server:
+        merge_data.merge_from_getmarc(
+            input_file,
+            output_file,
+            mapping_file,
+            server.url,
+            max_concurrency=4,
+            client=merge_data.getmarc.GetMarcClient(
+                server.url, max_retries=10, backoff_factor=0
+            ),
+        )
+    assert server.statuses[503] > 0
+    assert output_file.read_text(encoding="utf-8").splitlines()[1:] == [
+        f"title {mmsid}\t{mmsid}" for mmsid in mmsids
+    ]
+
+
+def test_merge_from_getmarc_only_parses_mapped_fields(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        merge_data.tsv, "get_tsv_dialect", lambda _: "excel-tab"
+    )
+    input_file = tmp_path / "input.tsv"
+    input_file.write_text(
+        "Uniform Title\tBibliographic Identifier\n\t991\n", encoding="utf-8"
+    )
+    mapping_file = tmp_path / "mapping.toml"
+    mapping_file.write_text(
+        "[mappings]\n"
+        'identifier_key = "Bibliographic Identifier"\n'
+        "\n"
+        "[[mapping]]\n"
+        'key = "Uniform Title"\n'
+        'matching_marc_fields = ["245$a"]\n'
+        'delimiter = "||"\n'
+        'existing_data = "replace"\n',
+        encoding="utf-8",
+    )
+    output_file = tmp_path / "output.tsv"
+    parsed = []
+    parse_marc_fields = merge_data.getmarc.marc.parse_marc_fields
+
+    def spy(content, tags=None):
+        parsed.append(tags)
+        return parse_marc_fields(content, tags)
+
+    monkeypatch.setattr(merge_data.getmarc.marc, "parse_marc_fields", spy)
+    records = {"991": stand_in_servers.make_marc_record("991", "Spam")}
+    with stand_in_servers.GetMarcStandInServer(records) as server:
+        merge_data.merge_from_getmarc(
+            input_file, output_file, mapping_file, server.url
+        )
+    assert parsed == [frozenset({"245"})]
+    assert output_file.read_text(encoding="utf-8").splitlines()[1:] == [
+        "Spam\t991"
+    ]
+
+
+def test_merge_from_marcxml(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        merge_data.tsv, "get_tsv_dialect", lambda _: "excel-tab"
+    )
+    input_file = tmp_path / "input.tsv"
+    input_file.write_text(
+        "Uniform Title\tBibliographic Identifier\n\t992\n\t991\n\t404\n",
+        encoding="utf-8",
+    )
+    mapping_file = tmp_path / "mapping.toml"
+    mapping_file.write_text(
+        "[mappings]\n"
+        'identifier_key = "Bibliographic Identifier"\n'
+        "\n"
+        "[[mapping]]\n"
+        'key = "Uniform Title"\n'
+        'matching_marc_fields = ["245$a"]\n'
+        'delimiter = "||"\n'
+        'existing_data = "replace"\n',
+        encoding="utf-8",
+    )
+    marcxml_file = tmp_path / "records.xml"
+    marcxml_file.write_text(
+        f'<collection xmlns="{stand_in_servers.MARC_SLIM_XML_NAMESPACE}">'
+        + stand_in_servers.make_marc_record("991", title="Spam")
+        + stand_in_servers.make_marc_record("992", title="Eggs")
+        + "</collection>",
+        encoding="utf-8",
+    )
+    output_file = tmp_path / "output.tsv"
+    with pytest.raises(CommandFinishedWithException):
+        merge_data.merge_from_marcxml(
+            input_file, output_file, mapping_file, marcxml_file
+        )
+    assert output_file.read_text(encoding="utf-8").splitlines()[1:] == [
+        "Eggs\t992",
+        "Spam\t991",
+        "\t404",
+    ]
+
+
+def test_merge_data_from_getmarc_with_mrc_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        merge_data.tsv, "get_tsv_dialect", lambda _: "excel-tab"
+    )
+    mapping_file_fp = io.BytesIO(
+        b"[mappings]\n"
+        b'identifier_key = "Bibliographic Identifier"\n'
+        b"\n"
+        b"[[mapping]]\n"
+        b'key = "Subjects"\n'
+        b'matching_marc_fields = ["650$a"]\n'
+        b'delimiter = "||"\n'
+        b'existing_data = "replace"\n'
+    )
+    input_fp = io.StringIO(
+        "Subjects\tBibliographic Identifier\n\t995678\n\t404\n"
+    )
+    mrc_file = pathlib.Path(__file__).parent / "data" / "sample_records.mrc"
+    with merge_data.marc_files.Iso2709RecordFile(
+        mrc_file, index_file=tmp_path / "sample_records.mrc.index"
+    ) as records:
+        rows = list(
+            merge_data.iter_merged_rows_from_getmarc(
+                mapping_file_fp, input_fp, records, "excel-tab"
+            )
+        )
+    assert rows[0].entry["Subjects"] == "Pork||Eggs"
+    assert rows[1].failed_identifier == "404"
+
+
+class TestJoinFromTsv:
+    mapping_file_contents = """
+[mappings]
+identifier_key = "Bibliographic Identifier"
+lookup_key = "MMS Id"
+
+[[mapping]]
+key = "Title"
+matching_columns = ["Title"]
+delimiter = "||"
+existing_data = "keep"
+
+[[mapping]]
+key = "Subjects"
+matching_columns = ["Subject", "Genre"]
+delimiter = "||"
+existing_data = "append"
+
+[[mapping]]
+key = "Date"
+matching_columns = ["Date"]
+delimiter = "||"
+existing_data = "replace"
+"""
+
+    @pytest.fixture
+    def files(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(
+            merge_data.tsv, "get_tsv_dialect", lambda _: "excel-tab"
+        )
+        input_file = tmp_path / "input.tsv"
+        input_file.write_text(
+            "Bibliographic Identifier\tTitle\tSubjects\tDate\n"
+            "991\t\tOld subject\t1900\n"
+            "992\tKept title\t\t\n"
+            "404\t\t\t\n",
+            encoding="utf-8",
+        )
+        mapping_file = tmp_path / "mapping.toml"
+        mapping_file.write_text(self.mapping_file_contents, encoding="utf-8")
+        lookup_file = tmp_path / "analytics.tsv"
+        lookup_file.write_text(
+            "MMS Id\tTitle\tSubject\tGenre\tDate\n"
+            "992\tEggs\tBreakfast\t\t2001\n"
+            "991\tSpam\tCooking\tFiction\t1999\n",
+            encoding="utf-8",
+        )
+        return input_file, mapping_file, lookup_file
+
+    def test_existing_data_semantics(self, files, tmp_path):
+        input_file, mapping_file, lookup_file = files
+        output_file = tmp_path / "output.tsv"
+        with pytest.raises(CommandFinishedWithException):
+            merge_data.merge_from_tsv(
+                input_file, output_file, mapping_file, lookup_file
+            )
+        assert output_file.read_text(encoding="utf-8").splitlines()[1:] == [
+            "991\tSpam\tOld subject||Cooking||Fiction\t1999",
+            "992\tKept title\tBreakfast\t2001",
+            "404\t\t\t",
+        ]
+
+    def test_delta_output(self, files, tmp_path):
+        input_file, mapping_file, lookup_file = files
+        delta_file = tmp_path / "changes.tsv"
+        with pytest.raises(CommandFinishedWithException):
+            merge_data.merge_from_tsv(
+                input_file,
+                delta_file,
+                mapping_file,
+                lookup_file,
+                delta_output=True,
+            )
+        assert delta_file.read_text(encoding="utf-8").splitlines() == [
+            "line\tidentifier\tcolumn\told\tnew",
+            "2\t991\tTitle\t\tSpam",
+            "2\t991\tSubjects\tOld subject\tOld subject||Cooking||Fiction",
+            "2\t991\tDate\t1900\t1999",
+            "3\t992\tSubjects\t\tBreakfast",
+            "3\t992\tDate\t\t2001",
+        ]
+
+    def test_lookup_on_disk(self, files, tmp_path):
+        input_file, mapping_file, lookup_file = files
+        in_memory = tmp_path / "in_memory.tsv"
+        on_disk = tmp_path / "on_disk.tsv"
+        for output_file, max_rows_in_memory in [
+            (in_memory, 100),
+            (on_disk, 1),
+        ]:
+            with pytest.raises(CommandFinishedWithException):
+                merge_data.merge_from_tsv(
+                    input_file,
+                    output_file,
+                    mapping_file,
+                    lookup_file,
+                    max_rows_in_memory=max_rows_in_memory,
+                )
+        assert on_disk.read_text() == in_memory.read_text()
+
+    def test_bad_mapping(self, files, tmp_path):
+        input_file, mapping_file, lookup_file = files
+        mapping_file.write_text(
+            self.mapping_file_contents.replace(
+                'matching_columns = ["Date"]', 'matching_columns = "Date"'
+            ),
+            encoding="utf-8",
+        )
+        with pytest.raises(merge_data.BadMappingFileError):
+            merge_data.merge_from_tsv(
+                input_file, tmp_path / "output.tsv", mapping_file, lookup_file
+            )
@@ -0,0 +1,38 @@
+import pytest
+
+from galatea import merge_journal
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return merge_journal.MergeJournal(tmp_path / "output.tsv")
+
+
+def test_load_without_journal(journal):
+    assert journal.load() is None
+
+
+def test_save_and_load(journal):
+    checkpoint = merge_journal.MergeCheckpoint(
+        input_file="input.tsv",
+        last_line_number=42,
+        output_offset=1024,
+        failed_identifiers=["99123"],
+    )
+    journal.save(checkpoint)
+    assert journal.load() == checkpoint
+
+
+def test_unreadable_journal(journal):
+    journal.journal_file.write_text("{not json", encoding="utf-8")
+    with pytest.raises(merge_journal.JournalMismatchError):
+        journal.load()
+
+
+def test_finish_moves_partial_output(journal):
+    journal.partial_output_file.write_text("spam", encoding="utf-8")
+    journal.save(merge_journal.MergeCheckpoint(input_file="input.tsv"))
+    journal.finish()
+    assert journal.output_file.read_text(encoding="utf-8") == "spam"
+    assert not journal.journal_file.exists()
+    assert not journal.partial_output_file.exists()
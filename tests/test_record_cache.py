@@ -0,0 +1,123 @@
+import datetime
+import gzip
+import xml.etree.ElementTree as ET
+from unittest.mock import Mock
+
+import pytest
+
+from galatea import record_cache
+
+SAMPLE_RECORD = """
+<record xmlns="http://www.loc.gov/MARC21/slim">
+<datafield ind1=" " ind2=" " tag="120">
+<subfield code="a">Bacon</subfield>
+</datafield>
+</record>
+""".strip()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return record_cache.MarcRecordCache(
+        tmp_path / "cache", server="https://spamserver"
+    )
+
+
+def get_subfield_text(record):
+    return record.find(
+        ".//{http://www.loc.gov/MARC21/slim}subfield[@code='a']"
+    ).text
+
+
+class TestMarcRecordCache:
+    def test_missing_record_is_none(self, cache):
+        assert cache.get("123") is None
+
+    def test_put_and_get(self, cache):
+        cache.put("123", ET.fromstring(SAMPLE_RECORD))
+        assert get_subfield_text(cache.get("123")) == "Bacon"
+
+    def test_records_are_compressed(self, cache):
+        cache.put("123", ET.fromstring(SAMPLE_RECORD))
+        with gzip.open(cache.path_for("123")) as fp:
+            assert b"Bacon" in fp.read()
+
+    def test_keyed_by_server(self, cache, tmp_path):
+        cache.put("123", ET.fromstring(SAMPLE_RECORD))
+        other = record_cache.MarcRecordCache(
+            tmp_path / "cache", server="https://eggserver"
+        )
+        assert other.get("123") is None
+
+    def test_trailing_slash_uses_same_server(self, cache, tmp_path):
+        cache.put("123", ET.fromstring(SAMPLE_RECORD))
+        other = record_cache.MarcRecordCache(
+            tmp_path / "cache", server="https://spamserver/"
+        )
+        assert other.get("123") is not None
+
+    def test_expired_record_is_none(self, tmp_path):
+        clock = Mock(return_value=0.0)
+        cache = record_cache.MarcRecordCache(
+            tmp_path,
+            server="https://spamserver",
+            ttl=datetime.timedelta(days=1),
+            clock=clock,
+        )
+        cache.put("123", ET.fromstring(SAMPLE_RECORD))
+        clock.return_value = cache.path_for("123").stat().st_mtime + 60
+        assert cache.get("123") is not None
+        clock.return_value += datetime.timedelta(days=1).total_seconds()
+        assert cache.get("123") is None
+
+    def test_no_ttl_never_expires(self, tmp_path):
+        cache = record_cache.MarcRecordCache(
+            tmp_path, server="spam", ttl=None, clock=Mock(return_value=1e12)
+        )
+        cache.put("123", ET.fromstring(SAMPLE_RECORD))
+        assert cache.get("123") is not None
+
+    def test_unreadable_record_is_none(self, cache):
+        path = cache.path_for("123")
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"not gzip data")
+        assert cache.get("123") is None
+
+    def test_mmsid_is_safe_file_name(self, cache):
+        assert cache.path_for("../123").parent == cache.server_dir
+
+
+class TestCachedRecordStrategy:
+    def test_fetches_and_stores_missing_records(self, cache):
+        fetch = Mock(return_value=ET.fromstring(SAMPLE_RECORD))
+        strategy = record_cache.CachedRecordStrategy(fetch, cache)
+        strategy("123")
+        strategy("123")
+        fetch.assert_called_once_with("123")
+        assert (strategy.hits, strategy.misses) == (1, 1)
+
+    def test_refresh_ignores_cache(self, cache):
+        cache.put("123", ET.fromstring(SAMPLE_RECORD))
+        fetch = Mock(
+            return_value=ET.fromstring(SAMPLE_RECORD.replace("Bacon", "Eggs"))
+        )
+        strategy = record_cache.CachedRecordStrategy(
+            fetch, cache, refresh=True
+        )
+        assert get_subfield_text(strategy("123")) == "Eggs"
+        assert get_subfield_text(cache.get("123")) == "Eggs"
+
+    def test_offline_raises_for_missing_record(self, cache):
+        fetch = Mock()
+        strategy = record_cache.CachedRecordStrategy(
+            fetch, cache, offline=True
+        )
+        with pytest.raises(record_cache.RecordNotCachedError):
+            strategy("123")
+        fetch.assert_not_called()
+
+    def test_refresh_and_offline_are_exclusive(self, cache):
+        with pytest.raises(ValueError):
+            record_cache.CachedRecordStrategy(
+                Mock(), cache, refresh=True, offline=True
+            )
@@ -0,0 +1,179 @@
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+import requests
+
+from galatea import remote
+
+
+def response(status_code):
+    result = requests.Response()
+    result.status_code = status_code
+    return result
+
+
+def failing_call():
+    raise requests.ConnectionError("server down")
+
+
+@pytest.fixture
+def breaker():
+    return remote.CircuitBreaker(
+        "spamserver",
+        failure_threshold=3,
+        reset_timeout=10,
+        clock=Mock(return_value=100.0),
+        sleep=Mock(name="sleep"),
+    )
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self, breaker):
+        for _ in range(3):
+            with pytest.raises(requests.ConnectionError):
+                breaker.call(failing_call)
+        assert breaker.state == breaker.OPEN
+
+    def test_success_resets_failures(self, breaker):
+        for _ in range(2):
+            with pytest.raises(requests.ConnectionError):
+                breaker.call(failing_call)
+        breaker.call(lambda: "ok")
+        assert breaker.consecutive_failures == 0
+
+    def test_server_errors_count_as_failures(self, breaker):
+        for _ in range(3):
+            breaker.call(lambda: response(503))
+        assert breaker.state == breaker.OPEN
+
+    def test_client_errors_are_not_failures(self, breaker):
+        for _ in range(3):
+            breaker.call(lambda: response(404))
+        assert breaker.state == breaker.CLOSED
+
+    def test_pauses_then_resumes_after_successful_probe(self, breaker):
+        for _ in range(3):
+            breaker.call(lambda: response(503))
+        assert breaker.call(lambda: "ok") == "ok"
+        breaker._sleep.assert_called_once_with(10)
+        assert breaker.state == breaker.CLOSED
+
+    def test_aborts_after_failed_probe(self, breaker):
+        for _ in range(3):
+            breaker.call(lambda: response(503))
+        with pytest.raises(requests.ConnectionError):
+            breaker.call(failing_call)
+        called = Mock()
+        with pytest.raises(remote.CircuitOpenError):
+            breaker.call(called)
+        called.assert_not_called()
+
+
+class TestHostGuard:
+    def test_breaker_per_host(self):
+        guard = remote.HostGuard()
+        assert guard.get_breaker("https://a.org/x") is guard.get_breaker(
+            "https://a.org/y"
+        )
+        assert guard.get_breaker("https://a.org") is not guard.get_breaker(
+            "https://b.org"
+        )
+
+    def test_limits_in_flight_requests_per_host(self):
+        guard = remote.HostGuard(max_in_flight=2)
+        lock = threading.Lock()
+        in_flight = []
+        peak = []
+        release = threading.Event()
+
+        def call():
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+            release.wait(1)
+            with lock:
+                in_flight.pop()
+
+        threads = [
+            threading.Thread(target=guard.call, args=("https://a.org", call))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert max(peak) == 2
+
+
+class TestEndpointBalancer:
+    @pytest.fixture
+    def clock(self):
+        return Mock(return_value=100.0)
+
+    @pytest.fixture
+    def balancer(self, clock):
+        return remote.EndpointBalancer(
+            ["https://a.org", "https://b.org"],
+            remote.HostGuard(),
+            cooldown=10,
+            smoothing=0.5,
+            clock=clock,
+        )
+
+    def test_spreads_requests_until_latency_known(self, balancer):
+        first = balancer.acquire()
+        second = balancer.acquire()
+        assert [first.url, second.url] == ["https://a.org", "https://b.org"]
+
+    def test_prefers_faster_endpoint(self, balancer):
+        slow, fast = balancer.endpoints
+        balancer.release(balancer.acquire(), latency=1.0)
+        balancer.release(balancer.acquire(), latency=0.1)
+        assert [slow.latency, fast.latency] == [1.0, 0.1]
+        chosen = [balancer.acquire() for _ in range(10)]
+        assert chosen.count(fast) == 9
+        assert chosen.count(slow) == 1
+
+    def test_latency_is_a_moving_average(self, balancer):
+        endpoint = balancer.endpoints[0]
+        endpoint.in_flight = 2
+        balancer.release(endpoint, latency=1.0)
+        balancer.release(endpoint, latency=3.0)
+        assert endpoint.latency == 2.0
+
+    def test_avoids_failed_endpoint_during_cooldown(self, balancer, clock):
+        failed = balancer.acquire()
+        balancer.release(failed)
+        assert failed.failures == 1
+        assert not balancer.is_healthy(failed)
+        assert balancer.acquire() is not failed
+        assert balancer.acquire() is not failed
+        clock.return_value = 110.0
+        assert balancer.is_healthy(failed)
+
+    def test_excluded_endpoints_used_last(self, balancer):
+        endpoint = balancer.acquire(exclude={"https://a.org"})
+        assert endpoint.url == "https://b.org"
+        balancer.release(endpoint)
+        assert (
+            balancer.acquire(exclude={"https://a.org", "https://b.org"}).url
+            == "https://a.org"
+        )
+
+    def test_aborted_when_every_breaker_gave_up(self, balancer):
+        breakers = [
+            balancer.guard.get_breaker(endpoint.url)
+            for endpoint in balancer.endpoints
+        ]
+        breakers[0].state = remote.CircuitBreaker.ABORTED
+        assert not balancer.is_aborted()
+        breakers[1].state = remote.CircuitBreaker.ABORTED
+        assert balancer.is_aborted()
+
+    def test_requires_endpoints(self):
+        with pytest.raises(ValueError):
+            remote.EndpointBalancer([], remote.HostGuard())
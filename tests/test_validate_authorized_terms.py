@@ -1,10 +1,17 @@
+import asyncio
+import collections
+import io
+import json
 import pathlib
+import time
 from unittest.mock import Mock, patch, mock_open
 
 import pytest
 import requests
 
-from galatea import validate_authorized_terms
+from galatea import aio, remote, validate_authorized_terms
+
+import stand_in_servers
 
 
 class TestCachedApiCheck:
@@ -167,3 +174,455 @@ class TestIterTerms:
             assert list(term_interator.iter_rows()) == [
                 {"264$a": "one", "264$b": "two"}
             ]
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("500", validate_authorized_terms.SampleSize(count=500)),
+        ("5%", validate_authorized_terms.SampleSize(percent=5.0)),
+        (" 12.5% ", validate_authorized_terms.SampleSize(percent=12.5)),
+    ],
+)
+def test_parse_sample_size(value, expected):
+    assert validate_authorized_terms.parse_sample_size(value) == expected
+
+
+@pytest.mark.parametrize("value", ["0", "-3", "spam", "0%", "101%"])
+def test_parse_sample_size_invalid(value):
+    with pytest.raises(ValueError):
+        validate_authorized_terms.parse_sample_size(value)
+
+
+@pytest.mark.parametrize(
+    "sample_size, population_size, expected",
+    [
+        (validate_authorized_terms.SampleSize(count=10), 100, 10),
+        (validate_authorized_terms.SampleSize(count=10), 3, 3),
+        (validate_authorized_terms.SampleSize(percent=5), 100, 5),
+        (validate_authorized_terms.SampleSize(percent=1), 10, 1),
+    ],
+)
+def test_sample_size_resolve(sample_size, population_size, expected):
+    assert sample_size.resolve(population_size) == expected
+
+
+def test_iter_unique_terms_skips_repeated_values():
+    terms = [(2, "260$a", "spam"), (3, "264$a", "spam"), (3, "264$a", "eggs")]
+    assert list(validate_authorized_terms.iter_unique_terms(terms)) == [
+        (2, "260$a", "spam"),
+        (3, "264$a", "eggs"),
+    ]
+
+
+class TestReservoirSample:
+    def test_same_seed_gives_same_sample(self):
+        first = validate_authorized_terms.reservoir_sample(range(1000), 10)
+        second = validate_authorized_terms.reservoir_sample(range(1000), 10)
+        assert first == second
+
+    def test_sample_size_and_total(self):
+        sample, total = validate_authorized_terms.reservoir_sample(
+            range(1000), 10
+        )
+        assert len(set(sample)) == 10 and total == 1000
+
+    def test_sample_keeps_source_order(self):
+        sample, _ = validate_authorized_terms.reservoir_sample(range(1000), 10)
+        assert sample == sorted(sample)
+
+    def test_small_population_returns_everything(self):
+        assert validate_authorized_terms.reservoir_sample("abc", 10) == (
+            ["a", "b", "c"],
+            3,
+        )
+
+
+class TestEstimateInvalidRate:
+    def test_interval_contains_rate(self):
+        estimate = validate_authorized_terms.estimate_invalid_rate(
+            invalid=20, sample_size=200, population_size=100_000
+        )
+        assert estimate.lower < estimate.rate == 0.1 < estimate.upper
+
+    def test_full_population_has_no_uncertainty(self):
+        estimate = validate_authorized_terms.estimate_invalid_rate(
+            invalid=3, sample_size=10, population_size=10
+        )
+        assert estimate.lower == estimate.upper == 0.3
+
+    def test_larger_sample_narrows_interval(self):
+        small = validate_authorized_terms.estimate_invalid_rate(
+            invalid=10, sample_size=100, population_size=100_000
+        )
+        large = validate_authorized_terms.estimate_invalid_rate(
+            invalid=100, sample_size=1000, population_size=100_000
+        )
+        assert (large.upper - large.lower) < (small.upper - small.lower)
+
+    def test_empty_sample(self):
+        estimate = validate_authorized_terms.estimate_invalid_rate(
+            invalid=0, sample_size=0, population_size=0
+        )
+        assert (estimate.rate, estimate.lower, estimate.upper) == (0, 0, 1)
+
+
+def test_sample_authorized_terms(monkeypatch):
+    terms = [(i, "264$a", f"term {i % 50}") for i in range(500)]
+    monkeypatch.setattr(
+        validate_authorized_terms.IterTerms,
+        "__iter__",
+        Mock(side_effect=lambda: iter(terms)),
+    )
+    check_terms = Mock(
+        name="check_terms", side_effect=lambda term, _: term != "term 7"
+    )
+    monkeypatch.setattr(validate_authorized_terms, "check_terms", check_terms)
+    monkeypatch.setattr(
+        validate_authorized_terms,
+        "optional_rate_limited_iterator",
+        lambda iterable, **_: iter(iterable),
+    )
+    estimate = validate_authorized_terms.sample_authorized_terms(
+        pathlib.Path("spam"), validate_authorized_terms.SampleSize(percent=10)
+    )
+    assert (estimate.sample_size, estimate.population_size) == (5, 50)
+    assert check_terms.call_count == 5
+
+
+def test_iter_checked_terms_records_source_and_latency(monkeypatch):
+    monkeypatch.setattr(
+        validate_authorized_terms,
+        "optional_rate_limited_iterator",
+        lambda iterable, **_: iter(iterable),
+    )
+    checker = validate_authorized_terms.NameCheck(
+        Mock(return_value=Mock(status_code=200))
+    )
+    results = list(
+        validate_authorized_terms.iter_checked_terms(
+            [(2, "260$a", "spam"), (3, "260$a", "spam")],
+            checker,
+            timer=Mock(side_effect=[1.0, 1.5, 2.0, 2.0]),
+        )
+    )
+    assert [(r.source, r.latency, r.status) for r in results] == [
+        ("fetched", 0.5, "authorized"),
+        ("cached", 0.0, "authorized"),
+    ]
+
+
+def test_iter_checked_terms_reports_unavailable_term(monkeypatch, caplog):
+    monkeypatch.setattr(
+        validate_authorized_terms,
+        "optional_rate_limited_iterator",
+        lambda iterable, **_: iter(iterable),
+    )
+    checker = validate_authorized_terms.NameCheck(
+        Mock(
+            side_effect=[
+                requests.exceptions.ConnectionError("no route"),
+                Mock(status_code=200),
+            ]
+        )
+    )
+    results = list(
+        validate_authorized_terms.iter_checked_terms(
+            [(2, "260$a", "spam"), (3, "260$a", "eggs")], checker
+        )
+    )
+    assert [(r.term, r.authorized, r.status) for r in results] == [
+        ("spam", None, "unavailable"),
+        ("eggs", True, "authorized"),
+    ]
+    assert 'unable to check "spam"' in caplog.text
+
+
+def test_sample_authorized_terms_leaves_out_unavailable(monkeypatch):
+    terms = [(i, "264$a", f"term {i}") for i in range(5)]
+    monkeypatch.setattr(
+        validate_authorized_terms.IterTerms,
+        "__iter__",
+        Mock(side_effect=lambda: iter(terms)),
+    )
+
+    def check_terms(term, _):
+        if term == "term 1":
+            raise requests.exceptions.ReadTimeout()
+        return term != "term 2"
+
+    monkeypatch.setattr(validate_authorized_terms, "check_terms", check_terms)
+    monkeypatch.setattr(
+        validate_authorized_terms,
+        "optional_rate_limited_iterator",
+        lambda iterable, **_: iter(iterable),
+    )
+    estimate = validate_authorized_terms.sample_authorized_terms(
+        pathlib.Path("spam"), validate_authorized_terms.SampleSize(count=5)
+    )
+    assert (estimate.invalid, estimate.sample_size) == (1, 4)
+
+
+@pytest.fixture
+def term_check_result():
+    return validate_authorized_terms.TermCheckResult(
+        line_number=2,
+        field_name="260$a",
+        term="Chicago, Ill.",
+        authorized=False,
+        cached=False,
+        latency=0.25,
+    )
+
+
+class TestValidationReportWriter:
+    def test_tsv(self, term_check_result):
+        fp = io.StringIO()
+        writer = validate_authorized_terms.TSVValidationReportWriter(fp)
+        writer.write_header()
+        writer.write(term_check_result)
+        assert fp.getvalue().splitlines() == [
+            "line\tfield\tterm\tstatus\tsource\tlatency",
+            "2\t260$a\tChicago, Ill.\tunauthorized\tfetched\t0.250000",
+        ]
+
+    def test_json_lines(self, term_check_result):
+        fp = io.StringIO()
+        writer = validate_authorized_terms.JSONLinesValidationReportWriter(fp)
+        writer.write_header()
+        writer.write(term_check_result)
+        assert json.loads(fp.getvalue()) == {
+            "line": 2,
+            "field": "260$a",
+            "term": "Chicago, Ill.",
+            "status": "unauthorized",
+            "source": "fetched",
+            "latency": 0.25,
+        }
+
+    @pytest.mark.parametrize(
+        "file_name, expected",
+        [
+            (
+                "report.jsonl",
+                validate_authorized_terms.JSONLinesValidationReportWriter,
+            ),
+            (
+                "report.tsv",
+                validate_authorized_terms.TSVValidationReportWriter,
+            ),
+        ],
+    )
+    def test_get_report_writer_type(self, file_name, expected):
+        assert (
+            validate_authorized_terms.get_report_writer_type(
+                pathlib.Path(file_name)
+            )
+            is expected
+        )
+
+
+def test_validate_authorized_terms_writes_report(monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        validate_authorized_terms.IterTerms,
+        "__iter__",
+        Mock(return_value=iter([(1, "abc", "efh"), (2, "abc", "ijk")])),
+    )
+    monkeypatch.setattr(
+        validate_authorized_terms,
+        "check_terms",
+        Mock(name="check_terms", side_effect=[True, False]),
+    )
+    report = tmp_path / "report.jsonl"
+    validate_authorized_terms.validate_authorized_terms(
+        pathlib.Path("spam"), report=report
+    )
+    assert [
+        json.loads(line)["status"] for line in report.read_text().splitlines()
+    ] == ["authorized", "unauthorized"]
+
+
+async def collect(async_iterator):
+    return [item async for item in async_iterator]
+
+
+def test_avalidate_checks_each_term_once(monkeypatch, caplog):
+    monkeypatch.setattr(
+        validate_authorized_terms.IterTerms,
+        "__iter__",
+        Mock(
+            return_value=iter([
+                (2, "260$a", "spam"),
+                (3, "260$a", "eggs"),
+                (4, "264$a", "spam"),
+            ])
+        ),
+    )
+    checked = []
+
+    async def check(term):
+        checked.append(term)
+        return term == "spam"
+
+    results = asyncio.run(
+        collect(
+            validate_authorized_terms.avalidate(
+                pathlib.Path("spam.tsv"), check=check, rate_limit=0
+            )
+        )
+    )
+    assert checked == ["spam", "eggs"]
+    assert [(r.line_number, r.status, r.source) for r in results] == [
+        (2, "authorized", "fetched"),
+        (3, "unauthorized", "fetched"),
+        (4, "authorized", "cached"),
+    ]
+    assert '"eggs" is not an authorized term' in caplog.text
+
+
+def test_avalidate_reports_unavailable_term(monkeypatch):
+    monkeypatch.setattr(
+        validate_authorized_terms.IterTerms,
+        "__iter__",
+        Mock(
+            return_value=iter([
+                (2, "260$a", "spam"),
+                (3, "260$a", "eggs"),
+            ])
+        ),
+    )
+
+    async def check(term):
+        if term == "spam":
+            raise requests.exceptions.ReadTimeout()
+        return True
+
+    results = asyncio.run(
+        collect(
+            validate_authorized_terms.avalidate(
+                pathlib.Path("spam.tsv"), check=check, rate_limit=0
+            )
+        )
+    )
+    assert [r.status for r in results] == ["unavailable", "authorized"]
+
+
+def test_avalidate_limits_concurrent_checks(monkeypatch):
+    monkeypatch.setattr(
+        validate_authorized_terms.IterTerms,
+        "__iter__",
+        Mock(
+            return_value=iter([(i, "260$a", f"term {i}") for i in range(10)])
+        ),
+    )
+    running = collections.Counter()
+
+    async def check(term):
+        running["now"] += 1
+        running["most"] = max(running["most"], running["now"])
+        await asyncio.sleep(0.001)
+        running["now"] -= 1
+        return True
+
+    results = asyncio.run(
+        collect(
+            validate_authorized_terms.avalidate(
+                pathlib.Path("spam.tsv"),
+                check=check,
+                max_concurrency=3,
+                rate_limit=0,
+            )
+        )
+    )
+    assert [r.line_number for r in results] == list(range(10))
+    assert running["most"] == 3
+
+
+class TestAgainstStandInServer:
+    terms = ["Chicago (Ill.)", "Twain, Mark, 1835-1910"]
+
+    def test_name_check_follows_redirect(self):
+        with stand_in_servers.LocNamesStandInServer(self.terms) as server:
+            check = validate_authorized_terms.NameCheck(server.request)
+            assert validate_authorized_terms.check_terms(self.terms[0], check)
+            assert not validate_authorized_terms.check_terms("Spam", check)
+        assert server.label_requests == {self.terms[0]: 1, "Spam": 1}
+
+    def test_throttled(self):
+        with stand_in_servers.LocNamesStandInServer(
+            self.terms, throttle_rate=1.0, retry_after=5
+        ) as server:
+            response = server.request(
+                validate_authorized_terms.NameCheck._get_url(self.terms[0])
+            )
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "5"
+
+    def test_avalidate_overlaps_slow_checks(self, monkeypatch):
+        terms = [f"term {i}" for i in range(8)]
+        monkeypatch.setattr(
+            validate_authorized_terms.IterTerms,
+            "__iter__",
+            Mock(
+                return_value=iter([
+                    (line_number, "260$a", term)
+                    for line_number, term in enumerate(terms * 2, 2)
+                ])
+            ),
+        )
+        latency = 0.05
+        with stand_in_servers.LocNamesStandInServer(
+            terms[:4], latency=latency
+        ) as server:
+
+            def check(name):
+                url = validate_authorized_terms.NameCheck._get_url(name)
+                return server.request(url).status_code == 200
+
+            start = time.perf_counter()
+            results = asyncio.run(
+                collect(
+                    validate_authorized_terms.avalidate(
+                        pathlib.Path("spam.tsv"),
+                        check=aio.to_async_strategy(check),
+                        max_concurrency=4,
+                        rate_limit=0,
+                    )
+                )
+            )
+            elapsed = time.perf_counter() - start
+        assert [result.authorized for result in results] == [
+            term in terms[:4] for term in terms * 2
+        ]
+        assert set(server.label_requests.values()) == {1}
+        assert elapsed < len(terms) * latency
+
+    def test_timeouts_stop_once_breaker_gives_up(self, monkeypatch):
+        monkeypatch.setattr(
+            validate_authorized_terms,
+            "optional_rate_limited_iterator",
+            lambda iterable, **_: iter(iterable),
+        )
+        guard = remote.HostGuard(
+            breaker_factory=lambda host: remote.CircuitBreaker(
+                host, failure_threshold=3, sleep=Mock()
+            )
+        )
+        terms = [(i, "260$a", f"term {i}") for i in range(6)]
+        results = []
+        with stand_in_servers.LocNamesStandInServer(latency=0.2) as server:
+
+            def request(url):
+                return guard.call(
+                    url, server.request, url, timeout=(1.0, 0.01)
+                )
+
+            checker = validate_authorized_terms.NameCheck(request)
+            with pytest.raises(remote.CircuitOpenError):
+                for result in validate_authorized_terms.iter_checked_terms(
+                    terms, checker
+                ):
+                    results.append(result)
+        # Three failures open the breaker and the probe after it fails too.
+        assert [result.status for result in results] == ["unavailable"] * 4
+        assert len(server.requests) == 4
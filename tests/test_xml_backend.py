@@ -0,0 +1,128 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from galatea import getmarc, marc, merge_data, record_cache, xml_backend
+
+SAMPLE_RECORD = """<?xml version="1.0" encoding="ISO-8859-1"?>
+<!-- exported for testing -->
+<marc:record xmlns:marc="http://www.loc.gov/MARC21/slim">
+<marc:leader>00000nam a2200000 a 4500</marc:leader>
+<marc:controlfield tag="001">991234</marc:controlfield>
+<?galatea ignored?>
+<marc:datafield ind1="1" ind2="0" tag="245">
+<marc:subfield code="a">Caf\xe9 :</marc:subfield>
+<!-- a comment between subfields -->
+<marc:subfield code="b">a study /</marc:subfield>
+<marc:subfield code="c">by Spam</marc:subfield>
+</marc:datafield>
+<marc:datafield ind1=" " ind2="0" tag="650">
+<marc:subfield code="a">Pork</marc:subfield>
+<marc:subfield code="z">Ireland</marc:subfield>
+</marc:datafield>
+<marc:datafield ind1=" " ind2="0" tag="650">
+<marc:subfield code="a">Eggs</marc:subfield>
+<marc:subfield code="a"> </marc:subfield>
+</marc:datafield>
+<marc:datafield ind1=" " ind2=" " tag="500">Plain text field</marc:datafield>
+</marc:record>
+""".encode("latin-1")
+
+SELECTORS = ["245$a", "245$b", "245", "650$a", "650$z", "500", "999$a"]
+
+
+@pytest.fixture(params=["etree", "lxml"])
+def backend(request):
+    if request.param == "lxml":
+        pytest.importorskip("lxml")
+    return xml_backend.get_backend(request.param)
+
+
+class TestBackends:
+    def test_fromstring_uses_declared_encoding(self, backend):
+        record = backend.fromstring(SAMPLE_RECORD)
+        assert marc.MarcRecordIndex(record).get_values("245", "a") == [
+            "Café :"
+        ]
+
+    def test_invalid_document_raises_parse_error(self, backend):
+        with pytest.raises(ET.ParseError) as error:
+            backend.fromstring(b"<record><datafield></record>")
+        assert error.value.position[0] == 1
+
+    def test_tostring_round_trip(self, backend):
+        record = backend.fromstring(SAMPLE_RECORD)
+        reparsed = ET.fromstring(backend.tostring(record))
+        assert (
+            marc.MarcRecordIndex(reparsed).datafields
+            == marc.MarcRecordIndex(record).datafields
+        )
+
+    def test_iter_tags_in_document_order(self, backend):
+        record = backend.fromstring(SAMPLE_RECORD)
+        tags = [
+            element.get("tag")
+            for element in backend.iter_tags(
+                record, (marc.MARC_DATAFIELD_TAG, marc.MARC_CONTROLFIELD_TAG)
+            )
+        ]
+        assert tags == ["001", "245", "650", "650", "500"]
+
+    @pytest.mark.parametrize("selector", SELECTORS)
+    def test_same_values_as_parse_marc_fields(self, backend, selector):
+        marc_selector = merge_data.parse_marc_selector(selector)
+        parsed = marc.parse_marc_fields(SAMPLE_RECORD, [marc_selector.tag])
+        assert parsed.get_values(
+            marc_selector.tag, marc_selector.subfield
+        ) == marc_selector.find_values(backend.fromstring(SAMPLE_RECORD))
+
+    def test_backend_for_element(self, backend):
+        record = backend.fromstring(SAMPLE_RECORD)
+        assert xml_backend.backend_for(record) is backend
+
+
+class TestParity:
+    """Both backends must give the same results for the same document."""
+
+    @pytest.fixture
+    def records(self):
+        pytest.importorskip("lxml")
+        return {
+            name: xml_backend.get_backend(name).fromstring(SAMPLE_RECORD)
+            for name in ("etree", "lxml")
+        }
+
+    def test_record_index(self, records):
+        etree_index = marc.MarcRecordIndex(records["etree"])
+        lxml_index = marc.MarcRecordIndex(records["lxml"])
+        assert lxml_index.datafields == etree_index.datafields
+        assert lxml_index.controlfields == etree_index.controlfields
+
+    @pytest.mark.parametrize("selector", SELECTORS)
+    def test_selector_values(self, records, selector):
+        marc_selector = merge_data.parse_marc_selector(selector)
+        assert marc_selector.find_values(
+            records["lxml"]
+        ) == marc_selector.find_values(records["etree"])
+
+
+class TestDefaultBackend:
+    def test_unknown_backend(self):
+        with pytest.raises(xml_backend.XmlBackendNotAvailableError):
+            xml_backend.get_backend("spam")
+
+    def test_preferred_backend_first(self):
+        assert xml_backend.available_backends()[-1] == "etree"
+        preferred = xml_backend.available_backends()[0]
+        assert xml_backend.get_backend().name == preferred
+        record = getmarc.parse_record("991234", SAMPLE_RECORD)
+        assert xml_backend.backend_for(record).name == preferred
+
+    def test_cache_round_trip(self, backend, tmp_path):
+        cache = record_cache.MarcRecordCache(
+            tmp_path / "cache", server="https://spamserver"
+        )
+        cache.put("991234", backend.fromstring(SAMPLE_RECORD))
+        assert marc.MarcRecordIndex(cache.get("991234")).get_values(
+            "650", "a"
+        ) == ["Pork", "Eggs"]